@@ -0,0 +1,71 @@
+import time
+import typing as t
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+from sessions import ConnectionStats, DNSCache
+
+
+class _TunedConnection:
+    """Mixin of urllib3 connections that counts them and resolves through a DNSCache.
+
+    The DNS and connect (TCP and TLS) phases are recorded in the Timing of the
+    request that opens the connection (`metrics.measuring`). Without a DNS
+    cache, the resolution is part of the connect phase.
+    """
+
+    stats: ConnectionStats
+    dns_cache: t.Optional[DNSCache] = None
+
+    def connect(self):
+        timing = metrics.current_timing()
+        start = time.perf_counter()
+        super().connect()
+        if timing is not None:
+            timing.connect = time.perf_counter() - start - (timing.dns or 0.0)
+
+    def _new_conn(self):
+        self.stats.add(opened=1)
+        if self.dns_cache is None:
+            return super()._new_conn()
+        # Only the address connected to changes; Host, SNI and certificate
+        # checks still use the original host name
+        host = self._dns_host
+        start = time.perf_counter()
+        self._dns_host = self.dns_cache.resolve(host, self.port)
+        timing = metrics.current_timing()
+        if timing is not None:
+            timing.dns = time.perf_counter() - start
+        try:
+            return super()._new_conn()
+        except OSError:
+            self.dns_cache.forget(host, self.port)
+            raise
+        finally:
+            self._dns_host = host
+
+
+class TunedAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests and connections and caches DNS results."""
+
+    def __init__(self, stats: ConnectionStats, dns_cache: t.Optional[DNSCache] = None, **kwargs):
+        self.stats = stats
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {"stats": self.stats, "dns_cache": self.dns_cache}
+        http_connection = type("TunedHTTPConnection", (_TunedConnection, HTTPConnection), attributes)
+        https_connection = type("TunedHTTPSConnection", (_TunedConnection, HTTPSConnection), attributes)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("TunedHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": http_connection}),
+            "https": type("TunedHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": https_connection}),
+        }
+
+    def send(self, request, *args, **kwargs):
+        self.stats.add(requests=1)
+        return super().send(request, *args, **kwargs)
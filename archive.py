@@ -0,0 +1,236 @@
+import glob
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import typing as t
+
+import utils
+
+# Bytes after which a shard is closed and a new one started
+SHARD_SIZE = 256 * 1024 * 1024
+
+# Size of a tar block (tarfile.BLOCKSIZE); tarfile is only loaded when writing
+BLOCK = 512
+
+
+class Entry(t.NamedTuple):
+    """Where a sprite lives inside the shards."""
+
+    shard: str
+    offset: int
+    size: int
+    sha256: t.Optional[str] = None
+
+
+class ArchiveIndex:
+    """(type, name) -> Entry, merged from the index of every shard writer.
+
+    Each writer appends one JSON line per sprite to its own `index-*.jsonl`,
+    stamped with the time it was written; the newest line wins, whichever
+    index it is in, so a sprite written again points to its newest copy.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.entries: t.Dict[t.Tuple[str, str], Entry] = {}
+        self._names: t.Dict[str, t.Set[str]] = {}
+        written: t.Dict[t.Tuple[str, str], int] = {}
+        for path in glob.glob(os.path.join(glob.escape(root), "index-*.jsonl")):
+            with open(path, mode="r") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # last line of a writer that was interrupted
+                    item = json.loads(line)
+                    key = item["type"], item["name"]
+                    if written.get(key, -1) > item["time"]:
+                        continue
+                    written[key] = item["time"]
+                    self.entries[key] = Entry(item["shard"], item["offset"], item["size"], item.get("sha256"))
+                    self._names.setdefault(item["type"], set()).add(item["name"])
+
+    def __contains__(self, key: t.Tuple[str, str]) -> bool:
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def files(self, type1: str) -> t.Set[str]:
+        """Names of the sprites of a type, like a directory listing."""
+        return self._names.get(type1, set())
+
+
+class ShardWriter:
+    """Appends sprites to size-bounded tar shards under root.
+
+    Shards and index are named after `prefix` (the process id by default) so
+    several processes can write to the same root. Every run starts a new shard;
+    temporaries of in-flight downloads live in `root/.partial`. It stands in
+    for the blob store in the pipeline: bodies are handed over with
+    `save_file` once complete.
+    """
+
+    PARTIAL_DIR = ".partial"
+
+    def __init__(self, root: str, shard_size: int = SHARD_SIZE, prefix: t.Optional[str] = None, fsync: bool = True):
+        self.root = root
+        self.shard_size = shard_size
+        self.prefix = prefix or str(os.getpid())
+        self.fsync = fsync
+        self.partial_dir = os.path.join(root, self.PARTIAL_DIR)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        existing = glob.glob(os.path.join(glob.escape(root), f"shard-{self.prefix}-*.tar"))
+        self._number = max((int(path.rsplit("-", 1)[1][:-4]) for path in existing), default=0)
+        self._shard: t.Optional[t.BinaryIO] = None
+        self._shard_name = ""
+        self._index = open(os.path.join(root, f"index-{self.prefix}.jsonl"), mode="a")
+        # Entries added by this writer, by (type, name)
+        self._added: t.Dict[t.Tuple[str, str], Entry] = {}
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def temp_path(self, dest: str) -> str:
+        """Temporary file where the body of a sprite is streamed before being added."""
+        return os.path.join(self.partial_dir, os.path.basename(utils.temp_path(dest)))
+
+    def _open_shard(self):
+        self._close_shard()
+        self._number += 1
+        self._shard_name = f"shard-{self.prefix}-{self._number:05d}.tar"
+        self._shard = open(os.path.join(self.root, self._shard_name), mode="wb")
+
+    def _close_shard(self):
+        if self._shard is None:
+            return
+        # End-of-archive marker: two zero blocks
+        self._shard.write(b"\0" * (2 * BLOCK))
+        self._shard.flush()
+        if self.fsync:
+            os.fsync(self._shard.fileno())
+        self._shard.close()
+        self._shard = None
+
+    def add_file(self, type1: str, name: str, src_path: str, sha256: t.Optional[str] = None) -> Entry:
+        """Append the file at src_path as `<type1>/<name>` and index it."""
+        import tarfile
+
+        size = os.path.getsize(src_path)
+        info = tarfile.TarInfo(f"{type1}/{name}")
+        info.size = size
+        info.mode = 0o644
+        header = info.tobuf(format=tarfile.GNU_FORMAT)
+        padding = -size % BLOCK
+        with self._lock:
+            if self._shard is None or self._shard.tell() + len(header) + size + padding > self.shard_size:
+                self._open_shard()
+            offset = self._shard.tell() + len(header)
+            self._shard.write(header)
+            with open(src_path, mode="rb") as src:
+                shutil.copyfileobj(src, self._shard)
+            self._shard.write(b"\0" * padding)
+            # The data must be readable before the index points to it
+            self._shard.flush()
+            entry = Entry(self._shard_name, offset, size, sha256)
+            self._write_index(type1, name, entry)
+        return entry
+
+    def _write_index(self, type1: str, name: str, entry: Entry):
+        """Point (type1, name) to an entry; caller holds the lock."""
+        # Nanoseconds, strictly increasing within a writer
+        self._written = max(self._written + 1, time.time_ns())
+        item = {
+            "type": type1, "name": name, "shard": entry.shard, "offset": entry.offset, "size": entry.size,
+            "time": self._written,
+        }
+        if entry.sha256 is not None:
+            item["sha256"] = entry.sha256
+        self._index.write(json.dumps(item) + "\n")
+        self._index.flush()
+        self._added[type1, name] = entry
+
+    def _key(self, dest: str) -> t.Tuple[str, str]:
+        type1, name = os.path.split(os.path.relpath(dest, self.root))
+        return type1, name
+
+    def save_file(self, url: str, tmp_path: str, digest: t.Optional[str], dest: str):
+        """Add a fully streamed body for the sprite at dest (`<root>/<type1>/<name>`)."""
+        type1, name = self._key(dest)
+        try:
+            self.add_file(type1, name, tmp_path, digest)
+        finally:
+            os.remove(tmp_path)
+
+    def link(self, src: str, dest: str):
+        """Index the sprite at dest as the same bytes as the one at src, added by this writer."""
+        with self._lock:
+            self._write_index(*self._key(dest), self._added[self._key(src)])
+
+    def link_known(self, url: str, dest: str) -> bool:
+        return False
+
+    def remember(self, url: str, digest: str):
+        pass
+
+    def forget(self, url: str):
+        pass
+
+    def close(self):
+        """Finish the current shard and the index."""
+        with self._lock:
+            self._close_shard()
+            if self._index.closed:
+                return
+            self._index.flush()
+            if self.fsync:
+                os.fsync(self._index.fileno())
+            self._index.close()
+
+    # The pipeline persists its outputs with `save_index` at the end of a run
+    save_index = close
+
+
+class ArchiveReader:
+    """Serves sprites out of the shards through read-only memory maps.
+
+    `get` returns a memoryview into the map, so no bytes are copied; views
+    must be released before the reader is closed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index = ArchiveIndex(root)
+        self._maps: t.Dict[str, mmap.mmap] = {}
+        self._lock = threading.Lock()
+
+    def _map(self, shard: str) -> mmap.mmap:
+        with self._lock:
+            m = self._maps.get(shard)
+            if m is None:
+                with open(os.path.join(self.root, shard), mode="rb") as f:
+                    m = self._maps[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return m
+
+    def get(self, type1: str, name: str) -> memoryview:
+        """Return the bytes of a sprite; KeyError if it is not archived."""
+        entry = self.index.entries[type1, name]
+        return memoryview(self._map(entry.shard))[entry.offset:entry.offset + entry.size]
+
+    def close(self):
+        with self._lock:
+            for m in self._maps.values():
+                m.close()
+            self._maps = {}
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def remove_partial_files(root: str):
+    """Remove the temporaries an interrupted run left in an archive root."""
+    for partial in glob.glob(os.path.join(glob.escape(root), ShardWriter.PARTIAL_DIR, "*.tmp")):
+        os.remove(partial)
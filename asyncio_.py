@@ -1,215 +1,388 @@
-import threading
-import time
-from concurrent.futures import ThreadPoolExecutor
-import requests
 import os
-import glob
-import csv
-import typing as t
-from utils import read_pokemons
+import time
 import asyncio
-import aiohttp  # La versión asíncrona de 'requests'
-from utils import read_pokemons
-import aiofiles
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import concurrency
+import metrics
+import pipeline
+import utils
 
 # --- Configuración ---
-CSV_FOLDER = "C:/Users/paula/Downloads/concurrent-downloads-master/concurrent-downloads-master/data"
-OUTPUT_FOLDER = 'output'
-MAX_WORKERS = 10 
+MAX_WORKERS = 32
+MAX_CONNECTIONS_PER_HOST = 16
+# Hilos que escriben en disco por cuenta del bucle de eventos
+WRITER_THREADS = 4
+# Cada cuánto se mide el retraso del bucle de eventos (segundos)
+LAG_INTERVAL = 0.05
 
 
 # Tercer metodo: asyncio
 
 # --- Lógica Asíncrona Principal --
-def read_pokemons(csv_paths):
+def trace_config(stats):
     """
-    Lee múltiples archivos CSV, convierte los nombres a minúsculas y los devuelve.
+    Mide la resolución DNS y la apertura de conexiones de cada petición, y
+    cuenta peticiones y conexiones abiertas en `stats`. El `Timing` de la
+    petición llega como `trace_request_ctx`.
     """
-    for csv_path in csv_paths:
-        try:
-            with open(csv_path, mode='r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # El test espera que los nombres de carpetas y archivos sean en minúsculas
-                    pokemon_name = row.get('Pokemon', '').lower()
-                    type_name = row.get('Type1', '').lower()
-                    sprite_url = row.get('Sprite', '').strip()
-
-                    if all([pokemon_name, type_name, sprite_url]):
-                        yield {
-                            'Pokemon': pokemon_name,
-                            'Type1': type_name,
-                            'Sprite': sprite_url
-                        }
-        except FileNotFoundError:
-            print(f"ADVERTENCIA: No se encontró el archivo {csv_path}. Omitiendo.")
-        except Exception as e:
-            print(f"Error al leer el archivo {csv_path}: {e}")
-
-async def download_image(session, output_dir, pokemon_data):
-    """
-    Descarga una sola imagen de forma asíncrona.
-    """
-    pokemon_name = pokemon_data['Pokemon']
-    folder_name = pokemon_data['Type1']
-    image_url = pokemon_data['Sprite']
+    async def on_request_start(session, ctx, params):
+        stats.add(requests=1)
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        ctx.trace_request_ctx.dns = time.perf_counter() - ctx.dns_start
+
+    async def on_connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connect_end(session, ctx, params):
+        ctx.trace_request_ctx.connect = time.perf_counter() - ctx.connect_start
+        stats.add(opened=1)
+
+    import aiohttp
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_dns_resolvehost_start.append(on_dns_start)
+    config.on_dns_resolvehost_end.append(on_dns_end)
+    config.on_connection_create_start.append(on_connect_start)
+    config.on_connection_create_end.append(on_connect_end)
+    return config
+
+
+class Writer:
+    """
+    Etapa de E/S del motor asíncrono: un pool acotado de hilos hace todas las
+    llamadas al sistema de archivos, así un disco lento nunca detiene el bucle
+    de eventos. Las descargas le envían los trozos a medida que llegan.
+    La contabilidad del trabajo (diario, filas fallidas, manifiesto, mensajes)
+    va a un único hilo aparte, que la hace en orden.
+    """
+
+    def __init__(self, threads=WRITER_THREADS):
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="writer")
+        self._reporter = ThreadPoolExecutor(1, thread_name_prefix="reporter")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def started(self, job, task):
+        """`job.started` fuera del bucle: escribe la tarea en el diario."""
+        return await asyncio.get_running_loop().run_in_executor(self._reporter, job.started, task)
 
+    async def report(self, job, result):
+        """`job.report` fuera del bucle: cuenta, registra e informa el resultado."""
+        await asyncio.get_running_loop().run_in_executor(self._reporter, job.report, result)
+
+    async def open(self, path):
+        return await self._call(open, path, "wb")
+
+    async def write(self, f, chunk):
+        await self._call(f.write, chunk)
+
+    async def commit(self, f, tmp_path, task, store, sha256, fsync):
+        """
+        Cierra el archivo temporal y lo lleva a su ruta final (o al almacén de
+        blobs). Devuelve el hash del blob si se usó el almacén.
+        """
+        return await self._call(_commit, f, tmp_path, task, store, sha256, fsync)
+
+    async def abort(self, f, tmp_path):
+        """Descarta un archivo temporal a medio escribir."""
+        await self._call(_abort, f, tmp_path)
+
+    async def link_known(self, task, store):
+        return await self._call(pipeline.link_known, task, store)
+
+    async def share(self, result, task, store):
+        """Enlaza el archivo de una descarga compartida (ver `pipeline.share`)."""
+        return await self._call(pipeline.share, result, task, store)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._reporter.shutdown(wait=True)
+
+
+def _commit(f, tmp_path, task, store, sha256, fsync):
     try:
-        # Crea la ruta de la carpeta (ej: output/grass)
-        folder_path = os.path.join(output_dir, folder_name)
-        # os.makedirs es síncrono, pero es rápido y seguro de usar aquí
-        os.makedirs(folder_path, exist_ok=True)
-
-        # Crea la ruta final de la imagen (ej: output/grass/bulbasaur.png)
-        image_path = os.path.join(folder_path, f"{pokemon_name}.png")
-
-        if not os.path.exists(image_path):
-            async with session.get(image_url, timeout=15) as response:
-                response.raise_for_status()
-                async with aiofiles.open(image_path, 'wb') as f:
-                    await f.write(await response.read())
-                print(f"Descargado: {pokemon_name}.png en '{folder_name}'")
-        else:
-            print(f"Omitido: {pokemon_name}.png ya existe.")
-            
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        f.close()
+    return pipeline.commit_file(tmp_path, task, store, sha256)
+
+
+def _abort(f, tmp_path):
+    f.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def monitor_lag(job, interval=LAG_INTERVAL):
+    """
+    Mide cuánto tarda el bucle de eventos en despertar respecto a lo pedido.
+    Si algo bloquea el bucle, el retraso crece; el máximo y el p99 quedan
+    como gauges en las métricas.
+    """
+    histogram = metrics.Histogram()
+    worst = 0.0
+    job.metrics.set_gauge("event_loop_lag_max_seconds", worst)
+    try:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - start - interval)
+            histogram.observe(lag)
+            worst = max(worst, lag)
+            job.metrics.set_gauge("event_loop_lag_max_seconds", worst)
+            job.metrics.set_gauge("event_loop_lag_p99_seconds", histogram.quantile(0.99))
+    except asyncio.CancelledError:
+        return worst
+
+
+async def stream_to_disk(chunks, headers, task, store, options, writer, timing, start):
+    """
+    Copia el cuerpo de una respuesta 200 (un iterador asíncrono de trozos) a un
+    archivo temporal y lo confirma al final; el cuerpo nunca está completo en
+    memoria.
+    """
+    hasher = hashlib.sha256() if pipeline.needs_hash(store, options) else None
+    head = b""
+    size = 0
+    tmp_path = pipeline.temp_path(task, store)
+    f = await writer.open(tmp_path)
+    timing.write = 0.0
+    try:
+        async for chunk in chunks:
+            if len(head) < len(utils.PNG_SIGNATURE):
+                head += chunk[:len(utils.PNG_SIGNATURE)]
+            if hasher is not None:
+                hasher.update(chunk)
+            size += len(chunk)
+            write_start = time.perf_counter()
+            await writer.write(f, chunk)
+            timing.write += time.perf_counter() - write_start
+        result = pipeline.check_response(task, 200, head, headers)
+        if result is not None:
+            await writer.abort(f, tmp_path)
+            return result._replace(timing=timing)
+        sha256 = hasher.hexdigest() if hasher is not None else None
+        write_start = time.perf_counter()
+        digest = await writer.commit(f, tmp_path, task, store, sha256, options.fsync)
+        timing.write += time.perf_counter() - write_start
+    except BaseException:
+        await asyncio.shield(writer.abort(f, tmp_path))
+        raise
+    timing.transfer = time.perf_counter() - start - timing.ttfb - timing.write
+    timing.total = time.perf_counter() - start
+    return pipeline.streamed(task, headers, size, sha256, options, digest, timing)
+
+
+async def throttled(chunks, rate_limiter, url):
+    """
+    Entrega los trozos de un cuerpo al ritmo que permite el limitador de tasa.
+    """
+    async for chunk in chunks:
+        await rate_limiter.consume_async(url, len(chunk))
+        yield chunk
+
+
+async def download_image(session, task, store, options, writer, budget, rate_limiter=None):
+    """
+    Descarga una sola imagen de forma asíncrona, midiendo cada fase. Todo el
+    acceso a disco pasa por `writer`, y solo `budget` cuerpos se transfieren
+    a la vez. Con un limitador de tasa, la petición espera su turno y el
+    cuerpo se lee sin pasar del ritmo permitido.
+    """
+    import aiohttp
+
+    try:
+        if store is not None and not task.exists:
+            result = await writer.link_known(task, store)
+            if result is not None:
+                return result
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(task.url)
+        timing = metrics.Timing()
+        start = time.perf_counter()
+        timeout = aiohttp.ClientTimeout(total=options.timeout)
+        async with session.get(
+            task.url, headers=task.headers, timeout=timeout, trace_request_ctx=timing
+        ) as response:
+            timing.ttfb = time.perf_counter() - start
+            if response.status == 200:
+                chunks = response.content.iter_chunked(options.buffer_size)
+                if rate_limiter is not None:
+                    chunks = throttled(chunks, rate_limiter, task.url)
+                async with budget:
+                    return await stream_to_disk(
+                        chunks, response.headers, task, store, options, writer, timing, start,
+                    )
+            content = await response.read()
+            timing.transfer = time.perf_counter() - start - timing.ttfb
+            timing.total = time.perf_counter() - start
+            result = pipeline.check_response(task, response.status, content, response.headers)
+            return result._replace(timing=timing)
+
+    except asyncio.TimeoutError as e:
+        return pipeline.Result(task, 'error', error=f"Tiempo agotado: {e}", overload=True, retryable=True)
     except aiohttp.ClientError as e:
-        print(f"❌ Error de red para {pokemon_name}: {e}")
+        return pipeline.Result(task, 'error', error=f"Error de red: {e}", retryable=True)
     except Exception as e:
-        print(f"❌ Error inesperado procesando a {pokemon_name}: {e}")
+        return pipeline.Result(task, 'error', error=f"Error inesperado: {e}")
+
+
+async def put_unless_stopped(queue, item, stopped):
+    """
+    Encola `item` en cuanto haya lugar, salvo que antes se marque `stopped`.
+    Devuelve si lo encoló.
+    """
+    if not queue.full():
+        queue.put_nowait(item)
+        return True
+    put = asyncio.ensure_future(queue.put(item))
+    stop = asyncio.ensure_future(stopped.wait())
+    done, pending = await asyncio.wait({put, stop}, return_when=asyncio.FIRST_COMPLETED)
+    for future in pending:
+        future.cancel()
+    return put in done
+
+
+def produce(loop, queue, job, workers, stopped):
+    """
+    Lee las tareas de forma perezosa y las encola. Corre en un hilo aparte
+    porque planificar lee los CSV y lista directorios; cada `put` espera
+    mientras la cola está llena (backpressure), y el hilo termina si el
+    bucle marca `stopped` porque los workers ya no la vacían.
+    """
+    def put(item):
+        return asyncio.run_coroutine_threadsafe(put_unless_stopped(queue, item, stopped), loop).result()
+
+    for task in job.tasks():
+        if not put(task):
+            return
+    # Una señal de fin por cada worker
+    for _ in range(workers):
+        if not put(None):
+            return
+
+
+async def feed(queue, job, workers, consumers):
+    """
+    Corre el productor junto a los workers hasta que todos terminan. Si un
+    worker o el productor fallan, el error se propaga y el productor se
+    detiene en vez de esperar para siempre una cola llena.
+    """
+    stopped = asyncio.Event()
+    producer = asyncio.ensure_future(
+        asyncio.to_thread(produce, asyncio.get_running_loop(), queue, job, workers, stopped)
+    )
+    try:
+        await asyncio.gather(producer, *consumers)
+    finally:
+        stopped.set()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def download_limited(session, task, job, limiter, writer, budget):
+    """
+    Un intento de descarga. Con el limitador adaptativo, espera un turno y le
+    informa del resultado.
+    """
+    if limiter is None:
+        return await download_image(session, task, job.store, job.options, writer, budget, job.rate_limiter)
+    token = await limiter.acquire()
+    result = await download_image(session, task, job.store, job.options, writer, budget, job.rate_limiter)
+    latency = result.timing.total if result.timing is not None else None
+    await limiter.release(token, latency, result.overload)
+    return result
+
+
+async def consume(queue, session, job, limiter, writer, budget):
+    """
+    Worker: toma tareas de la cola y las descarga, reintentando los fallos
+    transitorios, hasta recibir la señal de fin.
+    """
+    while True:
+        task = await queue.get()
+        try:
+            if task is None:
+                return
+            result = await writer.started(job, task)
+            if result is None:
+                result = await pipeline.fetch_once_async(job.flights, task, job.store, lambda: pipeline.with_retries_async(
+                    lambda: download_limited(session, task, job, limiter, writer, budget),
+                    task, job.retry_policy, job.breaker, job.deadline,
+                ), writer)
+            await writer.report(job, result)
+        finally:
+            queue.task_done()
+
+
+async def run_async(job):
+    """
+    Un productor alimenta una cola acotada y `workers` tareas la consumen, así la
+    memoria y los sockets abiertos no crecen con el tamaño de la entrada. Con
+    `adaptive`, solo descargan a la vez las tareas que permite el limitador.
+    El disco lo tocan solo el hilo productor y los hilos de `Writer`.
+    """
+    # aiohttp (la versión asíncrona de 'requests') se importa solo al usar este
+    # motor: el motor HTTP/2 reutiliza las funciones de este módulo sin él
+    import aiohttp
+
+    workers = job.options.workers or MAX_WORKERS
+    limiter = job.limiter(concurrency.AsyncLimiter, workers)
+    max_connections = job.options.max_connections or MAX_CONNECTIONS_PER_HOST
+    queue = asyncio.Queue(maxsize=2 * workers)
+    connector = aiohttp.TCPConnector(
+        limit=workers,
+        limit_per_host=max_connections,
+        force_close=not job.options.keep_alive,
+        ttl_dns_cache=job.options.dns_ttl or None,
+        use_dns_cache=job.options.dns_ttl > 0,
+    )
+    writer = Writer()
+    # Presupuesto de memoria: cada transferencia retiene hasta un trozo
+    budget = asyncio.Semaphore(job.buffers.capacity)
+    lag = asyncio.create_task(monitor_lag(job))
+    async with aiohttp.ClientSession(connector=connector, trace_configs=[trace_config(job.connections)]) as session:
+        consumers = [
+            asyncio.create_task(consume(queue, session, job, limiter, writer, budget))
+            for _ in range(workers)
+        ]
+        try:
+            await feed(queue, job, workers, consumers)
+        finally:
+            for task in consumers:
+                task.cancel()
+            writer.close()
+    lag.cancel()
+    worst = await lag
+    if job.options.verbose:
+        print(f"Retraso máximo del bucle de eventos: {worst * 1000:.1f} ms")
+    if limiter is not None:
+        print(f"Concurrencia adaptativa final: {limiter.limit} tareas")
+
+
+def run(job):
+    """
+    Ejecuta el bucle de eventos de asyncio para un trabajo.
+    """
+    asyncio.run(run_async(job))
+
 
-def main(output_dir, inputs):
+def main(output_dir, inputs, **options):
     """
     Función principal que coincide con la firma esperada por el archivo de prueba.
     """
-    # Creamos una función anidada para poder ejecutar el código asíncrono
-    # desde esta función síncrona que llama el test.
-    async def async_main():
-        pokemons_to_download = list(read_pokemons(inputs))
-        
-        async with aiohttp.ClientSession() as session:
-            # Creamos una lista de tareas (coroutines) para ejecutar
-            tasks = [
-                download_image(session, output_dir, data) 
-                for data in pokemons_to_download
-            ]
-            # Ejecutamos todas las tareas concurrentemente
-            await asyncio.gather(*tasks)
-
-    # Ejecutamos el bucle de eventos de asyncio
-    asyncio.run(async_main())
+    return pipeline.execute("async", output_dir, inputs, pipeline.Options(**options))
 
 # Este bloque te permite ejecutar el script directamente para probarlo
 if __name__ == "__main__":
-    # Asume que los datos están en una carpeta 'data'
-    INPUT_CSVS = [f"data/pokemon-gen{i}-data.csv" for i in range(1, 7)]
-    OUTPUT_DIR = OUTPUT_FOLDER
-    
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    print("Iniciando descarga con Asyncio...")
-    main(OUTPUT_DIR, INPUT_CSVS)
-    print("¡Proceso con Asyncio completado!")
-
-
-
-
-
-
-
-# def read_pokemons(csv_paths):
-#     """
-#     Generador que lee los archivos CSV basándose en la estructura real del archivo:
-#     - Nombre de imagen de la columna 'Pokemon'.
-#     - Nombre de carpeta de la columna 'Type1'.
-#     - URL de la imagen de la columna 'Sprite'.
-#     """
-#     for csv_path in csv_paths:
-#         try:
-#             with open(csv_path, mode='r', encoding='utf-8-sig') as f:
-#                 reader = csv.DictReader(f)
-                
-#                 # Verificamos que las columnas necesarias existan
-#                 headers = [h.strip() for h in reader.fieldnames]
-#                 if not all(k in headers for k in ['Pokemon', 'Type1', 'Sprite']):
-#                     print(f"ADVERTENCIA: {csv_path} no contiene las columnas 'Pokemon', 'Type1' y 'Sprite'. Omitiendo.")
-#                     continue
-
-#                 for row in reader:
-#                     # Extraemos los datos usando los nombres de columna correctos
-#                     pokemon_name = row.get('Pokemon')
-#                     folder_name = row.get('Type1')
-#                     image_url = row.get('Sprite', '').strip()
-
-#                     if all([pokemon_name, folder_name, image_url.startswith('http')]):
-#                         yield {
-#                             'PokemonName': pokemon_name,
-#                             'FolderName': folder_name,
-#                             'SpriteURL': image_url
-#                         }
-#         except Exception as e:
-#             print(f"Error crítico al procesar el archivo CSV {csv_path}: {e}")
-
-
-# async def download_image(session, pokemon_data):
-#     """
-#     Descarga una imagen usando los datos extraídos correctamente.
-#     """
-#     pokemon_name = pokemon_data.get('PokemonName')
-#     folder_name = pokemon_data.get('FolderName')
-#     image_url = pokemon_data.get('SpriteURL')
-
-#     try:
-#         # Crea la ruta de la carpeta (ej: output/GRASS)
-#         valid_folder_name = "".join(c for c in folder_name if c.isalnum() or c in (' ', '_')).rstrip()
-#         folder_path = os.path.join(OUTPUT_FOLDER, valid_folder_name)
-#         os.makedirs(folder_path, exist_ok=True)
-
-#         # Crea la ruta de la imagen con el nombre del Pokémon (ej: output/GRASS/Chespin.png)
-#         valid_pokemon_name = "".join(c for c in pokemon_name if c.isalnum() or c in (' ', '_')).rstrip()
-#         image_path = os.path.join(folder_path, f"{valid_pokemon_name}.png")
-
-#         if not os.path.exists(image_path):
-#             print(f"Descargando '{pokemon_name}.png' en la carpeta '{valid_folder_name}'...")
-#             async with session.get(image_url, timeout=15) as response:
-#                 response.raise_for_status()
-#                 async with aiofiles.open(image_path, 'wb') as f:
-#                     await f.write(await response.read())
-#         else:
-#             print(f"Omitiendo {pokemon_name}.png, ya existe.")
-
-#     except aiohttp.ClientError as e:
-#         print(f"❌ Error de red para {pokemon_name}: {e}")
-#     except Exception as e:
-#         print(f"❌ Error inesperado procesando a {pokemon_name}: {e}")
-
-# async def main():
-#     """
-#     Función principal que orquesta todo el proceso.
-#     """
-#     start_time = time.monotonic()
-#     print("Iniciando el proceso de descarga de imágenes de Pokémon...")
-#     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    
-#     # Busca el archivo CSV específico que subiste
-#     csv_paths = glob.glob(os.path.join(CSV_FOLDER, 'pokemon-gen6-data.csv'))
-#     if not csv_paths:
-#         print(f"Error: No se encontró el archivo 'pokemon-gen6-data.csv' en la carpeta '{CSV_FOLDER}'.")
-#         return
-
-#     print(f"Procesando {len(csv_paths)} archivo(s) CSV...")
-#     pokemon_generator = read_pokemons(csv_paths)
-
-#     async with aiohttp.ClientSession() as session:
-#         tasks = [download_image(session, pokemon) for pokemon in pokemon_generator]
-#         await asyncio.gather(*tasks)
-
-#     end_time = time.monotonic()
-#     duration = end_time - start_time
-
-#     print("\n" + "="*40)
-#     print("¡Proceso completado! ✅")
-#     print(f"Duración total: {duration:.2f} segundos.")
-#     print("="*40)
-
-# if __name__ == "__main__":
-#     asyncio.run(main())
\ No newline at end of file
+    import cli
+    cli.main(default_engine="async")
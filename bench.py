@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import pipeline
+from mockserver import MockH2SpriteServer, MockSpriteServer
+
+TYPES = ["grass", "fire", "water", "bug", "normal", "poison", "electric", "ground", "fairy", "psychic"]
+
+RESULT_FIELDS = [
+    "engine", "workers", "rate_limit", "size", "repeat", "elapsed_s", "throughput", "goodput", "p50_ms", "p95_ms", "p99_ms",
+    "peak_rss_kb", "cpu_s", "requests", "connections", "http_errors", "downloaded", "failed",
+]
+
+# Engines benchmarked against the HTTP/2 (h2c) stand-in server
+HTTP2_ENGINES = {"http2"}
+
+IMPORT_FIELDS = ["module", "repeat", "startup_ms", "import_ms", "modules", "heaviest"]
+
+# Modules listed in the `heaviest` column of an import profile
+HEAVIEST = 5
+
+
+def make_dataset(path: str, size: int, server: MockSpriteServer):
+    """Write a csv with `size` synthetic pokemons served by the mock server."""
+    with open(path, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Pokemon", "Type1", "Sprite"])
+        for i in range(size):
+            name = f"pokemon{i:06d}"
+            writer.writerow([name, TYPES[i % len(TYPES)].upper(), server.url(f"sprites/{name}.png")])
+
+
+def percentile(values: t.List[float], q: float) -> t.Optional[float]:
+    """Return the q-th percentile (0-100) of some values, by nearest rank."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _usage() -> t.Tuple[t.Optional[float], t.Optional[int]]:
+    """Return the CPU seconds and peak RSS (KB) of this process and its children."""
+    if resource is None:
+        return None, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, max(own.ru_maxrss, children.ru_maxrss)
+
+
+def run_trial(spec: dict) -> dict:
+    """Run a single engine once; meant to be called in a fresh interpreter."""
+    options = pipeline.Options(workers=spec["workers"], requests_per_second=spec.get("rate_limit"))
+    with open(os.devnull, mode="w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            start = time.perf_counter()
+            counts = pipeline.execute(spec["engine"], spec["output_dir"], spec["inputs"], options)
+            elapsed = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+    cpu, peak_rss = _usage()
+    return {"elapsed_s": elapsed, "cpu_s": cpu, "peak_rss_kb": peak_rss, "counts": counts}
+
+
+def _run_trial_subprocess(spec: dict) -> dict:
+    """Run a trial in a child interpreter so RSS and CPU are not shared."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--trial", json.dumps(spec)],
+        cwd=here, capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def server_class(engine: str) -> t.Type[MockSpriteServer]:
+    """Return the mock server class an engine must be benchmarked against."""
+    return MockH2SpriteServer if engine in HTTP2_ENGINES else MockSpriteServer
+
+
+def benchmark(
+    engines: t.List[str],
+    workers: t.List[int],
+    sizes: t.List[int],
+    repeats: int = 1,
+    rate_limits: t.Sequence[t.Optional[float]] = (None,),
+    **server_options,
+) -> t.List[dict]:
+    """Run every engine over the matrix of worker counts, rate limits and dataset sizes.
+
+    HTTP/1.1 engines hit a MockSpriteServer and HTTP/2 engines a
+    MockH2SpriteServer with the same options. A rate limit of None runs
+    unthrottled.
+    """
+    results = []
+    with contextlib.ExitStack() as stack:
+        workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        servers = {}
+        for engine in engines:
+            server_cls = server_class(engine)
+            if server_cls not in servers:
+                servers[server_cls] = stack.enter_context(server_cls(**server_options))
+        for size in sizes:
+            datasets = {}
+            for server_cls, server in servers.items():
+                datasets[server_cls] = [os.path.join(workdir, f"dataset-{server_cls.__name__}-{size}.csv")]
+                make_dataset(datasets[server_cls][0], size, server)
+            for engine in engines:
+                server_cls = server_class(engine)
+                server, inputs = servers[server_cls], datasets[server_cls]
+                # The sequential engine has no workers to tune
+                for n, rate, repeat in itertools.product(
+                    [1] if engine == "sequential" else workers, rate_limits, range(repeats)
+                ):
+                    output_dir = os.path.join(workdir, f"out-{engine}-{n}-{rate}-{size}-{repeat}")
+                    server.reset_stats()
+                    spec = {
+                        "engine": engine, "workers": n, "rate_limit": rate,
+                        "inputs": inputs, "output_dir": output_dir,
+                    }
+                    trial = _run_trial_subprocess(spec)
+                    latencies = list(server.latencies)
+                    statuses = dict(server.statuses)
+                    connections = server.connections
+                    counts = trial["counts"]
+                    results.append({
+                        "engine": engine,
+                        "workers": n,
+                        "rate_limit": rate,
+                        "size": size,
+                        "repeat": repeat,
+                        "elapsed_s": round(trial["elapsed_s"], 4),
+                        "throughput": round(size / trial["elapsed_s"], 2),
+                        # Sprites actually downloaded per second
+                        "goodput": round(counts["descargado"] / trial["elapsed_s"], 2),
+                        "p50_ms": _ms(percentile(latencies, 50)),
+                        "p95_ms": _ms(percentile(latencies, 95)),
+                        "p99_ms": _ms(percentile(latencies, 99)),
+                        "peak_rss_kb": trial["peak_rss_kb"],
+                        "cpu_s": trial["cpu_s"] and round(trial["cpu_s"], 4),
+                        "requests": len(latencies),
+                        "connections": connections,
+                        "http_errors": sum(count for code, count in statuses.items() if code >= 400),
+                        "downloaded": counts["descargado"],
+                        "failed": counts["error"],
+                    })
+    return results
+
+
+class ImportTime(t.NamedTuple):
+    """A line of `python -X importtime`: times in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> t.List[ImportTime]:
+    """Parse the report `-X importtime` writes to stderr; other lines are ignored."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        entries.append(ImportTime(
+            module=name.strip(),
+            self_us=int(fields[0]),
+            cumulative_us=int(fields[1]),
+            # Each level of nesting indents the name by two more spaces
+            depth=(len(name) - len(name.lstrip()) - 1) // 2,
+        ))
+    return entries
+
+
+def profile_import(module: str) -> dict:
+    """Time `import module` in a fresh interpreter.
+
+    `startup_ms` is the wall time of the whole interpreter run, `import_ms`
+    what the module and everything it pulled in took to import, and
+    `heaviest` the modules that took longest by themselves.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=here, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - start
+    entries = parse_importtime(completed.stderr)
+    # The top-level line of the module comes right after the nested lines of
+    # everything it imported
+    index = max(i for i, entry in enumerate(entries) if entry.module == module and entry.depth == 0)
+    top = entries[index]
+    start = index
+    while start > 0 and entries[start - 1].depth > 0:
+        start -= 1
+    own = entries[start:index + 1]
+    heaviest = sorted(own, key=lambda entry: entry.self_us, reverse=True)[:HEAVIEST]
+    return {
+        "module": module,
+        "startup_ms": _ms(elapsed),
+        "import_ms": round(top.cumulative_us / 1000, 3),
+        "modules": len(own),
+        "heaviest": " ".join(f"{entry.module}:{entry.self_us / 1000:.1f}" for entry in heaviest),
+    }
+
+
+def profile_imports(modules: t.List[str], repeats: int = 1) -> t.List[dict]:
+    """Import profile of each module, `repeats` times after an untimed run.
+
+    The untimed run leaves the bytecode cache written, so the numbers are
+    those of a normal start and not of the first one after an edit.
+    """
+    results = []
+    for module in modules:
+        profile_import(module)
+        for repeat in range(repeats):
+            results.append({**profile_import(module), "repeat": repeat})
+    return results
+
+
+def _ms(seconds: t.Optional[float]) -> t.Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def write_results(
+    results: t.List[dict],
+    json_path: t.Optional[str] = None,
+    csv_path: t.Optional[str] = None,
+    fields: t.List[str] = RESULT_FIELDS,
+):
+    """Write benchmark results as JSON and/or CSV."""
+    if json_path:
+        with open(json_path, mode="w") as f:
+            json.dump(results, f, indent=2)
+    if csv_path:
+        with open(csv_path, mode="w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the download engines against a local mock server.")
+    parser.add_argument("--engines", nargs="+", default=sorted(pipeline.ENGINES), choices=sorted(pipeline.ENGINES))
+    parser.add_argument("--workers", nargs="+", type=int, default=[4, 16])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds before each response")
+    parser.add_argument("--bandwidth", type=float, help="bytes/s per connection (default: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503")
+    parser.add_argument("--payload-size", type=int, default=2048, help="bytes per sprite")
+    parser.add_argument(
+        "--rate-limits", nargs="+", type=float, default=[0],
+        help="requests/s the engines are limited to, 0 for unthrottled (default: %(default)s)",
+    )
+    parser.add_argument("--quota", type=float, help="requests/s the server serves before answering 429")
+    parser.add_argument(
+        "--quota-penalty", type=float, default=1.0,
+        help="seconds a client over the quota keeps getting 429 (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile-imports", action="store_true",
+        help="instead of downloading, time the imports of the cli and of each engine module",
+    )
+    parser.add_argument("--json", help="where to write the results as JSON")
+    parser.add_argument("--csv", help="where to write the results as CSV")
+    parser.add_argument("--trial", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: t.Optional[t.List[str]] = None):
+    args = build_parser().parse_args(argv)
+    if args.trial:
+        print(json.dumps(run_trial(json.loads(args.trial))))
+        return
+    if args.profile_imports:
+        modules = ["cli"] + [pipeline.ENGINES[engine] for engine in args.engines]
+        results = profile_imports(modules, args.repeats)
+        fields = IMPORT_FIELDS
+    else:
+        results = benchmark(
+            args.engines, args.workers, args.sizes, args.repeats,
+            rate_limits=[rate or None for rate in args.rate_limits],
+            latency=args.latency, bandwidth=args.bandwidth,
+            error_rate=args.error_rate, payload_size=args.payload_size,
+            quota=args.quota, quota_penalty=args.quota_penalty,
+        )
+        fields = RESULT_FIELDS
+    write_results(results, args.json, args.csv, fields)
+    writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
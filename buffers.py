@@ -0,0 +1,49 @@
+import contextlib
+import threading
+import typing as t
+
+# Size of each transfer buffer
+BUFFER_SIZE = 64 * 1024
+
+# Bytes of transfer buffers a run may hold at once
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+class BufferPool:
+    """Reusable transfer buffers bounded by a memory budget.
+
+    Every streaming download holds one buffer while it reads its body, so the
+    bytes in flight never exceed the budget: when all the buffers are taken,
+    new transfers wait for one to be released. Buffers are allocated on first
+    use and then recycled.
+    """
+
+    def __init__(self, budget: int = MEMORY_BUDGET, buffer_size: int = BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.capacity = max(1, budget // buffer_size)
+        self._free: t.List[bytearray] = []
+        self._allocated = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> bytearray:
+        """Take a buffer, waiting until one is free if the budget is exhausted."""
+        with self._cond:
+            while not self._free and self._allocated >= self.capacity:
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            self._allocated += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray):
+        with self._cond:
+            self._free.append(buffer)
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def buffer(self) -> t.Iterator[bytearray]:
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
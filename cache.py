@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import typing as t
+
+
+def entry_from_digest(headers: t.Mapping[str, str], size: int, sha256: str) -> dict:
+    """Build a manifest entry for a body that was hashed while it streamed."""
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "size": size,
+        "sha256": sha256,
+    }
+
+
+def conditional_headers(entry: t.Optional[dict]) -> t.Dict[str, str]:
+    """Return the If-None-Match/If-Modified-Since headers for a manifest entry."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class Manifest:
+    """Persistent map of sprite URL to its ETag, Last-Modified, size and hash.
+
+    Engines send the stored validators with each request and treat a 304 as a
+    no-op, so refreshing an unchanged mirror only transfers headers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: t.Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, mode="r") as f:
+                self.entries = json.load(f)
+
+    def get(self, url: str) -> t.Optional[dict]:
+        """Return the entry stored for a URL, if any."""
+        with self._lock:
+            return self.entries.get(url)
+
+    def conditional_headers(self, url: str) -> t.Dict[str, str]:
+        """Return the conditional request headers for a URL."""
+        return conditional_headers(self.get(url))
+
+    def set(self, url: str, entry: dict):
+        """Store the entry for a URL."""
+        with self._lock:
+            self.entries[url] = entry
+
+    def save(self):
+        """Write the manifest to disk, replacing the previous one atomically."""
+        with self._lock:
+            data = json.dumps(self.entries, sort_keys=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+
+def open_manifest(path: t.Optional[str]) -> t.Optional[Manifest]:
+    """Open the manifest at path, or return None when caching is disabled."""
+    return Manifest(path) if path else None
@@ -0,0 +1,159 @@
+import array
+import csv
+import glob
+import hashlib
+import json
+import os
+import pickle
+import typing as t
+
+import utils
+
+# Columns of the input csvs the pipeline needs
+COLUMNS = ("Pokemon", "Type1", "Sprite")
+
+# Bump when the layout of the cached catalogue changes
+CACHE_VERSION = 1
+
+
+class Entry:
+    """A row of the catalogue: the only three fields the pipeline uses."""
+
+    __slots__ = ("pokemon", "type1", "url")
+
+    def __init__(self, pokemon: str, type1: str, url: str):
+        self.pokemon = pokemon
+        self.type1 = type1
+        self.url = url
+
+    def __repr__(self):
+        return f"Entry({self.pokemon!r}, {self.type1!r}, {self.url!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Entry) and (self.pokemon, self.type1, self.url) == (
+            other.pokemon,
+            other.type1,
+            other.url,
+        )
+
+
+class Catalogue:
+    """Column-oriented catalogue of the rows of some csvs.
+
+    Pokemon names are kept in a list; types and URLs are deduplicated into
+    tables and rows only hold an index into them, so a URL repeated across
+    rows (or inputs) is stored once.
+    """
+
+    def __init__(self):
+        self.pokemons: t.List[str] = []
+        self.types: t.List[str] = []
+        self.urls: t.List[str] = []
+        self.type_ids = array.array("I")
+        self.url_ids = array.array("I")
+        self._type_index: t.Dict[str, int] = {}
+        self._url_index: t.Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.pokemons)
+
+    def __iter__(self) -> t.Iterator[Entry]:
+        types, urls = self.types, self.urls
+        for pokemon, type_id, url_id in zip(self.pokemons, self.type_ids, self.url_ids):
+            yield Entry(pokemon, types[type_id], urls[url_id])
+
+    def _intern(self, table: t.List[str], index: t.Dict[str, int], value: str) -> int:
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        return i
+
+    def add(self, pokemon: str, type1: str, url: str):
+        self.pokemons.append(pokemon)
+        self.type_ids.append(self._intern(self.types, self._type_index, type1))
+        self.url_ids.append(self._intern(self.urls, self._url_index, url))
+
+    def extend_from_csv(self, filepath: str):
+        """Append the rows of a csv, projecting only the needed columns.
+
+        Rows with an empty Pokemon, Type1 or Sprite are dropped; a csv without
+        one of those columns raises ValueError.
+        """
+        with open(filepath, mode="r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            missing = [column for column in COLUMNS if column not in header]
+            if missing:
+                raise ValueError(f"{filepath} lacks the columns {missing}")
+            pokemon_col, type_col, url_col = (header.index(column) for column in COLUMNS)
+            width = max(pokemon_col, type_col, url_col)
+            for row in reader:
+                if len(row) <= width:
+                    continue
+                pokemon, type1, url = row[pokemon_col], row[type_col], row[url_col].strip()
+                if pokemon and type1 and url:
+                    self.add(pokemon.lower(), type1.lower(), url)
+
+    def __getstate__(self):
+        return {
+            "pokemons": self.pokemons,
+            "types": self.types,
+            "urls": self.urls,
+            "type_ids": self.type_ids.tobytes(),
+            "url_ids": self.url_ids.tobytes(),
+        }
+
+    def __setstate__(self, state):
+        self.pokemons = state["pokemons"]
+        self.types = state["types"]
+        self.urls = state["urls"]
+        self.type_ids = array.array("I")
+        self.type_ids.frombytes(state["type_ids"])
+        self.url_ids = array.array("I")
+        self.url_ids.frombytes(state["url_ids"])
+        self._type_index = {value: i for i, value in enumerate(self.types)}
+        self._url_index = {value: i for i, value in enumerate(self.urls)}
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value).encode()).hexdigest()
+
+
+def cache_key(inputs: t.List[str]) -> t.Tuple[str, str]:
+    """Hashes of the paths of the inputs and of their identity (path, size, mtime), in order.
+
+    The first one names the inputs whatever their contents, so a stale copy
+    can be found and replaced.
+    """
+    paths, identity = [], []
+    for filepath in inputs:
+        st = os.stat(filepath)
+        paths.append(os.path.abspath(filepath))
+        identity.append([paths[-1], st.st_size, st.st_mtime_ns])
+    return _hash(paths), _hash([CACHE_VERSION, identity])
+
+
+def load(inputs: t.List[str], cache_dir: t.Optional[str] = None) -> Catalogue:
+    """Build the catalogue of some csvs, reusing a cached copy when they did not change."""
+    cache_path = None
+    if cache_dir:
+        paths_key, identity_key = cache_key(inputs)
+        cache_path = os.path.join(cache_dir, f"{paths_key}-{identity_key}.pickle")
+        try:
+            with open(cache_path, mode="rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    catalogue = Catalogue()
+    for filepath in inputs:
+        catalogue.extend_from_csv(filepath)
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Copies of the same inputs before they changed are never read again
+        for stale in glob.glob(os.path.join(glob.escape(cache_dir), f"{paths_key}-*.pickle")):
+            os.remove(stale)
+        utils.write_binary(cache_path, pickle.dumps(catalogue, protocol=pickle.HIGHEST_PROTOCOL), fsync=False)
+    return catalogue
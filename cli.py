@@ -0,0 +1,217 @@
+import argparse
+import typing as t
+
+import pipeline
+import profiling
+import scheduling
+import utils
+
+
+def build_parser(default_engine: str = "sequential") -> argparse.ArgumentParser:
+    """Build the argument parser shared by every engine."""
+    parser = argparse.ArgumentParser(description="Download pokemon sprites grouped by type.")
+    parser.add_argument("output_dir", help="directory to store the data")
+    parser.add_argument("inputs", nargs="+", help="list of files with metadata")
+    parser.add_argument("--clean", action="store_true", help="remove output_dir before downloading")
+    add_options(parser, default_engine)
+    return parser
+
+
+def add_options(parser: argparse.ArgumentParser, default_engine: str = "sequential"):
+    """Add the flags that build the pipeline options (see `options_from_args`).
+
+    Defaults are read from `pipeline.Options`, so both stay in step.
+    """
+    defaults = pipeline.Options()
+    parser.add_argument(
+        "--engine", choices=sorted(pipeline.ENGINES), default=default_engine,
+        help="execution engine (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="threads (thread), processes (process) or tasks (async) to use",
+    )
+    parser.add_argument(
+        "--adaptive", action="store_true",
+        help="adapt concurrency with AIMD up to --workers (thread, async)",
+    )
+    parser.add_argument(
+        "--max-connections", type=int,
+        help="connection pool size per host (process, async); HTTP/2 connections (http2)",
+    )
+    parser.add_argument(
+        "--streams-per-connection", type=int,
+        help="concurrent streams on each HTTP/2 connection (http2)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=defaults.chunk_size,
+        help="rows sent to a worker process at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threads-per-process", type=int, default=defaults.threads_per_process,
+        help="threads inside each worker process (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=defaults.timeout, help="seconds per request (default: %(default)s)",
+    )
+    parser.add_argument("--no-keep-alive", action="store_true", help="close the connection after every request")
+    parser.add_argument(
+        "--dns-ttl", type=float, default=defaults.dns_ttl,
+        help="seconds a DNS answer is reused, 0 to disable the cache (default: %(default)s)",
+    )
+    parser.add_argument("--rate", type=float, help="requests per second to all hosts together")
+    parser.add_argument("--byte-rate", type=float, help="bytes per second from all hosts together")
+    parser.add_argument("--host-rate", type=float, help="requests per second to each host")
+    parser.add_argument("--host-byte-rate", type=float, help="bytes per second from each host")
+    parser.add_argument(
+        "--burst", type=float, default=defaults.burst_seconds,
+        help="seconds of rate that may be spent at once after being idle (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-coalesce", action="store_true",
+        help="fetch a URL once per row instead of once per run",
+    )
+    parser.add_argument(
+        "--schedule", choices=sorted(scheduling.POLICIES), default=defaults.schedule,
+        help="order in which sprites are fetched (default: %(default)s)",
+    )
+    parser.add_argument("--priority-column", help="numeric csv column of the priority schedule; higher goes first")
+    parser.add_argument(
+        "--deadline", type=float,
+        help="seconds after which sprites not yet started are deferred to the next run",
+    )
+    parser.add_argument("--manifest", help="cache manifest used to skip unchanged sprites")
+    parser.add_argument("--store", help="content-addressed store used to deduplicate sprites")
+    parser.add_argument(
+        "--format", choices=pipeline.OUTPUT_FORMATS, default=defaults.output_format,
+        help="loose files, or tar shards with an index in output_dir (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shard-size", type=int, default=defaults.shard_size,
+        help="bytes after which a new tar shard is started (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=defaults.max_attempts, help="attempts per sprite (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--backoff", type=float, default=defaults.backoff_base,
+        help="base of the exponential backoff between attempts, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--backoff-max", type=float, default=defaults.backoff_max,
+        help="longest wait between attempts, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--breaker-threshold", type=int, default=defaults.breaker_threshold,
+        help="consecutive failures that open a host's circuit (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--breaker-reset", type=float, default=defaults.breaker_reset,
+        help="seconds before an open circuit lets a trial request through (default: %(default)s)",
+    )
+    parser.add_argument("--failed", help="csv where failed rows are written, to be used as input of a rerun")
+    parser.add_argument(
+        "--memory-budget", type=int, default=defaults.memory_budget,
+        help="bytes of transfer buffers all downloads may hold at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--buffer-size", type=int, default=defaults.buffer_size,
+        help="bytes of each transfer buffer (default: %(default)s)",
+    )
+    parser.add_argument("--validate", action="store_true", help="check the chunks and CRCs of every downloaded PNG")
+    parser.add_argument("--recompress", action="store_true", help="recompress downloaded PNGs losslessly")
+    parser.add_argument(
+        "--thumbnails", type=int, nargs="+", default=(), metavar="SIZE",
+        help="write thumbnails that fit in SIZE x SIZE pixels (needs Pillow)",
+    )
+    parser.add_argument("--thumbnail-dir", help="root of the thumbnail trees (default: <output_dir>-thumbnails)")
+    parser.add_argument("--process-workers", type=int, help="processes that validate and transform sprites")
+    parser.add_argument("--catalogue-cache", help="directory where parsed csvs are cached between runs")
+    parser.add_argument("--incremental", help="snapshot of the previous run; only changed rows are processed")
+    parser.add_argument("--journal", help="SQLite journal used to resume an interrupted run")
+    parser.add_argument("--no-fsync", action="store_true", help="do not fsync files before renaming them")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print a line per sprite")
+    parser.add_argument("--metrics", help="append periodic JSON-lines summaries to this file")
+    parser.add_argument("--prometheus", help="keep a Prometheus text file with the metrics here")
+    parser.add_argument(
+        "--metrics-interval", type=float, default=defaults.metrics_interval,
+        help="seconds between metrics summaries (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile", nargs="+", default=(), choices=profiling.KINDS + ("all",), metavar="KIND",
+        help=f"profile the run: {', '.join(profiling.KINDS)} or all (default: ${profiling.PROFILE_ENV})",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help=f"where the profile artifacts go (default: ${profiling.PROFILE_DIR_ENV} or a new profile-* directory)",
+    )
+    parser.add_argument(
+        "--profile-interval", type=float, default=defaults.profile_interval,
+        help="seconds between stack samples (default: %(default)s)",
+    )
+
+
+def options_from_args(args: argparse.Namespace) -> pipeline.Options:
+    """Build the pipeline options from parsed arguments."""
+    return pipeline.Options(
+        workers=args.workers,
+        max_connections=args.max_connections,
+        keep_alive=not args.no_keep_alive,
+        dns_ttl=args.dns_ttl,
+        requests_per_second=args.rate,
+        bytes_per_second=args.byte_rate,
+        host_requests_per_second=args.host_rate,
+        host_bytes_per_second=args.host_byte_rate,
+        burst_seconds=args.burst,
+        coalesce=not args.no_coalesce,
+        schedule=args.schedule,
+        priority_column=args.priority_column,
+        deadline=args.deadline,
+        streams_per_connection=args.streams_per_connection,
+        chunk_size=args.chunk_size,
+        threads_per_process=args.threads_per_process,
+        timeout=args.timeout,
+        manifest_path=args.manifest,
+        store_dir=args.store,
+        verbose=args.verbose,
+        adaptive=args.adaptive,
+        max_attempts=args.retries,
+        backoff_base=args.backoff,
+        backoff_max=args.backoff_max,
+        breaker_threshold=args.breaker_threshold,
+        breaker_reset=args.breaker_reset,
+        failed_path=args.failed,
+        memory_budget=args.memory_budget,
+        buffer_size=args.buffer_size,
+        validate=args.validate,
+        recompress=args.recompress,
+        thumbnail_sizes=tuple(args.thumbnails),
+        thumbnail_dir=args.thumbnail_dir,
+        process_workers=args.process_workers,
+        catalogue_cache=args.catalogue_cache,
+        snapshot_path=args.incremental,
+        journal_path=args.journal,
+        fsync=not args.no_fsync,
+        output_format=args.format,
+        shard_size=args.shard_size,
+        metrics_path=args.metrics,
+        prometheus_path=args.prometheus,
+        metrics_interval=args.metrics_interval,
+        profile=tuple(args.profile),
+        profile_dir=args.profile_dir,
+        profile_interval=args.profile_interval,
+    )
+
+
+def main(argv: t.Optional[t.List[str]] = None, default_engine: str = "sequential") -> dict:
+    """Parse the command line and run the selected engine."""
+    args = build_parser(default_engine).parse_args(argv)
+    if args.clean:
+        utils.maybe_remove_dir(args.output_dir)
+    counts = utils.timeit(pipeline.execute)(args.engine, args.output_dir, args.inputs, options_from_args(args))
+    print(", ".join(f"{status}: {n}" for status, n in counts.items()))
+    return counts
+
+
+if __name__ == "__main__":
+    main()
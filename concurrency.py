@@ -0,0 +1,133 @@
+import threading
+import time
+import typing as t
+
+if t.TYPE_CHECKING:
+    import asyncio
+
+
+class AdaptiveLimit:
+    """AIMD controller of how many downloads may be in flight.
+
+    The limit grows by one after each window of completions in which throughput
+    kept rising and latency stayed within `tolerance` times the best latency
+    seen. It shrinks by one when latency degrades, and is multiplied by
+    `backoff` on overload signals (timeouts, 429 and 5xx). Only one multiplicative
+    decrease happens per "epoch", so a burst of failures from requests that
+    started under the old limit does not collapse it to the minimum.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        backoff: float = 0.5,
+        tolerance: float = 2.0,
+        on_change: t.Optional[t.Callable[[int], None]] = None,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.on_change = on_change
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._epoch = 0
+        self._best_latency = float("inf")
+        self._last_throughput = 0.0
+        self._reset_window()
+        self.history: t.List[t.Tuple[float, int]] = [(time.monotonic(), self.limit)]
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._window_done = 0
+        self._window_latency = 0.0
+
+    def _set(self, value: float):
+        value = max(self.minimum, min(value, self.maximum))
+        changed = int(value) != self.limit
+        self._limit = value
+        if changed:
+            self.history.append((time.monotonic(), self.limit))
+            if self.on_change is not None:
+                self.on_change(self.limit)
+
+    def _complete(self, epoch: int, latency: t.Optional[float], overloaded: bool):
+        """Update the limit with the outcome of a download; caller holds the lock."""
+        if overloaded:
+            if epoch == self._epoch:
+                self._epoch += 1
+                self._set(self._limit * self.backoff)
+                self._last_throughput = 0.0
+                self._reset_window()
+            return
+        self._window_done += 1
+        self._window_latency += latency or 0.0
+        if self._window_done < max(1, self.limit):
+            return
+        elapsed = max(time.monotonic() - self._window_start, 1e-9)
+        throughput = self._window_done / elapsed
+        mean_latency = self._window_latency / self._window_done
+        self._best_latency = min(self._best_latency, mean_latency)
+        if mean_latency > self._best_latency * self.tolerance:
+            self._set(self._limit - 1)
+        elif throughput >= self._last_throughput:
+            self._set(self._limit + 1)
+        self._last_throughput = throughput
+        self._reset_window()
+
+
+class ThreadLimiter(AdaptiveLimit):
+    """Adaptive limit for worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+
+    def acquire(self) -> int:
+        """Block until a slot is free; return a token for `release`."""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            return self._epoch
+
+    def release(self, token: int, latency: t.Optional[float] = None, overloaded: bool = False):
+        """Free a slot and feed the outcome of the download to the controller."""
+        with self._cond:
+            self._in_flight -= 1
+            self._complete(token, latency, overloaded)
+            self._cond.notify_all()
+
+
+class AsyncLimiter(AdaptiveLimit):
+    """Adaptive limit for asyncio tasks; must be used from a single event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond: t.Optional["asyncio.Condition"] = None
+        self._in_flight = 0
+
+    async def acquire(self) -> int:
+        """Wait until a slot is free; return a token for `release`."""
+        if self._cond is None:
+            # Imported here, so the thread engine can use this module without loading asyncio
+            import asyncio
+
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            return self._epoch
+
+    async def release(self, token: int, latency: t.Optional[float] = None, overloaded: bool = False):
+        """Free a slot and feed the outcome of the download to the controller."""
+        async with self._cond:
+            self._in_flight -= 1
+            self._complete(token, latency, overloaded)
+            self._cond.notify_all()
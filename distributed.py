@@ -0,0 +1,309 @@
+import argparse
+import collections
+import csv
+import multiprocessing
+import os
+import secrets
+import tempfile
+import threading
+import typing as t
+import zlib
+from multiprocessing.connection import Client, Listener
+
+import catalogue
+import cli
+import pipeline
+
+PARTITIONS = ("type", "hash")
+
+# Shards of a hash partition
+HASH_SHARDS = 16
+
+# Options naming files a run rewrites; concurrent workers must not share them
+PER_WORKER_OPTIONS = ("manifest_path", "store_dir", "journal_path", "profile_dir")
+
+# Options that span a whole run: a worker runs each shard as a run of its own,
+# so each shard would take the others' rows as deleted, rewrite the failed rows
+# and restart the deadline
+PER_RUN_OPTIONS = ("snapshot_path", "failed_path", "deadline")
+
+# Times a shard is handed out before it is given up as failed
+MAX_ASSIGNMENTS = 3
+
+AUTHKEY_ENV = "SPRITES_AUTHKEY"
+
+Row = t.Tuple[str, str, str]
+
+
+def partition(entries: t.Iterable[catalogue.Entry], by: str = "type", shards: int = HASH_SHARDS) -> t.List[t.List[Row]]:
+    """Split catalogue rows into shards.
+
+    By type, each shard is one directory of the output tree. By hash, rows go
+    to `crc32(type/pokemon) % shards`, which is stable across runs and hosts.
+    Either way all the rows of an output path land in the same shard, so no
+    two workers ever write the same file.
+    """
+    if by not in PARTITIONS:
+        raise ValueError(f"Unknown partition {by!r}, expected one of {PARTITIONS}")
+    groups: t.Dict[t.Any, t.List[Row]] = collections.defaultdict(list)
+    for entry in entries:
+        if by == "type":
+            key = entry.type1
+        else:
+            key = zlib.crc32(f"{entry.type1}/{entry.pokemon}".encode()) % shards
+        groups[key].append((entry.pokemon, entry.type1, entry.url))
+    return [groups[key] for key in sorted(groups)]
+
+
+def parse_address(address: str) -> t.Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def authkey_from_env() -> bytes:
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise SystemExit(f"Set {AUTHKEY_ENV} to the key shared by the coordinator and its workers")
+    return key.encode()
+
+
+class Coordinator:
+    """Hands out shards to the workers that connect and merges their counts.
+
+    Shards travel over TCP (`multiprocessing.connection`, authenticated with
+    the shared `authkey`); each worker pulls one, downloads it and reports its
+    counts before asking for the next. A shard whose worker disconnects before
+    reporting is handed out again, up to MAX_ASSIGNMENTS times; after that its
+    rows count as errors.
+    """
+
+    def __init__(self, shards: t.List[t.List[Row]], authkey: bytes, address: t.Tuple[str, int] = ("127.0.0.1", 0)):
+        self.shards = shards
+        self.counts = dict.fromkeys(pipeline.STATUSES, 0)
+        self._pending = collections.deque(range(len(shards)))
+        self._assignments = [0] * len(shards)
+        self._remaining = len(shards)
+        self._cond = threading.Condition()
+        self._listener = Listener(address, authkey=authkey)
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+
+    @property
+    def address(self) -> t.Tuple[str, int]:
+        return self._listener.address
+
+    def start(self) -> "Coordinator":
+        self._thread.start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return  # closed
+            except Exception:
+                continue  # a peer that failed authentication
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _next_shard(self) -> t.Optional[int]:
+        """Wait for a shard to hand out; None once every shard is finished."""
+        with self._cond:
+            while not self._pending and self._remaining:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            shard = self._pending.popleft()
+            self._assignments[shard] += 1
+            return shard
+
+    def _finish(self, counts: t.Mapping[str, int]):
+        with self._cond:
+            for status, n in counts.items():
+                self.counts[status] = self.counts.get(status, 0) + n
+            self._remaining -= 1
+            self._cond.notify_all()
+
+    def _requeue(self, shard: int):
+        with self._cond:
+            if self._assignments[shard] < MAX_ASSIGNMENTS:
+                self._pending.append(shard)
+                self._cond.notify_all()
+                return
+        print(f"❌ Se abandona el shard {shard}: {MAX_ASSIGNMENTS} workers fallaron con él")
+        self._finish({"error": len(self.shards[shard])})
+
+    def _serve(self, conn):
+        shard = None
+        try:
+            with conn:
+                conn.recv()  # ("ready", worker id)
+                while True:
+                    shard = self._next_shard()
+                    if shard is None:
+                        conn.send(None)
+                        return
+                    conn.send((shard, self.shards[shard]))
+                    _, _, counts = conn.recv()  # ("done", shard, counts)
+                    shard = None
+                    self._finish(counts)
+        except (EOFError, OSError):
+            if shard is not None:
+                self._requeue(shard)
+
+    def wait(self, timeout: t.Optional[float] = None) -> bool:
+        """Wait until every shard is finished; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._remaining, timeout)
+
+    def close(self):
+        self._listener.close()
+
+    def __enter__(self) -> "Coordinator":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_worker_options(options: pipeline.Options):
+    """Reject the options a worker cannot honour shard by shard."""
+    per_run = [name for name in PER_RUN_OPTIONS if getattr(options, name) is not None]
+    if per_run:
+        raise ValueError(f"Distributed workers do not support {per_run}: each shard is a run of its own")
+    if options.output_format == "tar":
+        # Every run clears the archive's temporaries, those other workers are writing too
+        raise ValueError("Distributed workers do not support the tar output")
+
+
+def work(
+    address: t.Tuple[str, int],
+    authkey: bytes,
+    output_dir: str,
+    engine: str = "thread",
+    options: t.Optional[pipeline.Options] = None,
+    worker_id: t.Optional[str] = None,
+) -> dict:
+    """Pull shards from a coordinator and download them until there are none left.
+
+    Workers on other hosts must see the same output_dir, e.g. through a
+    network mount. Return the counts of the shards this worker downloaded.
+    """
+    options = options or pipeline.Options()
+    check_worker_options(options)
+    worker_id = worker_id or f"{os.uname().nodename}:{os.getpid()}"
+    counts = dict.fromkeys(pipeline.STATUSES, 0)
+    with Client(address, authkey=authkey) as conn, tempfile.TemporaryDirectory() as tmp:
+        conn.send(("ready", worker_id))
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return counts  # the coordinator finished without saying so
+            if message is None:
+                return counts
+            shard, rows = message
+            path = os.path.join(tmp, f"shard-{shard}.csv")
+            with open(path, mode="w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(catalogue.COLUMNS)
+                writer.writerows(rows)
+            shard_counts = pipeline.execute(engine, output_dir, [path], options)
+            for status, n in shard_counts.items():
+                counts[status] += n
+            conn.send(("done", shard, shard_counts))
+
+
+def run_local(
+    output_dir: str,
+    inputs: t.List[str],
+    nodes: int = 2,
+    engine: str = "thread",
+    partition_by: str = "type",
+    shards: int = HASH_SHARDS,
+    options: t.Optional[pipeline.Options] = None,
+) -> dict:
+    """Run a coordinator and `nodes` worker processes on this host; return the merged counts."""
+    options = options or pipeline.Options()
+    check_worker_options(options)
+    shared = [name for name in PER_WORKER_OPTIONS if getattr(options, name)]
+    if shared:
+        raise ValueError(f"Local workers would share {shared}; start them with `distributed.py worker` instead")
+    authkey = secrets.token_bytes(32)
+    entries = catalogue.load(inputs, options.catalogue_cache)
+    with Coordinator(partition(entries, partition_by, shards), authkey) as coordinator:
+        workers = [
+            multiprocessing.Process(
+                target=work, args=(coordinator.address, authkey, output_dir, engine, options, f"local-{i}")
+            )
+            for i in range(nodes)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            # A worker that dies has its shard handed to the others; stop
+            # waiting only once all of them are gone
+            while not coordinator.wait(timeout=1):
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("Every worker exited before the catalogue was downloaded")
+        finally:
+            for worker in workers:
+                worker.join()
+    return coordinator.counts
+
+
+def main(output_dir, inputs, nodes=2, engine="thread", partition_by="type", **options):
+    """
+    Función principal que coincide con la firma esperada por el archivo de prueba.
+    """
+    return run_local(output_dir, inputs, nodes, engine, partition_by, options=pipeline.Options(**options))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Download pokemon sprites on several hosts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="split the catalogue and hand it out to workers")
+    coordinator.add_argument("address", help="HOST:PORT to listen on")
+    coordinator.add_argument("inputs", nargs="+", help="list of files with metadata")
+    coordinator.add_argument(
+        "--partition", choices=PARTITIONS, default="type",
+        help="one shard per type, or a stable hash of the rows (default: %(default)s)",
+    )
+    coordinator.add_argument(
+        "--shards", type=int, default=HASH_SHARDS, help="shards of a hash partition (default: %(default)s)"
+    )
+    coordinator.add_argument("--catalogue-cache", help="directory where parsed csvs are cached between runs")
+
+    worker = commands.add_parser("worker", help="download the shards handed out by a coordinator")
+    worker.add_argument("address", help="HOST:PORT of the coordinator")
+    worker.add_argument("output_dir", help="directory to store the data, shared by every worker")
+    cli.add_options(worker, default_engine="thread")
+    return parser
+
+
+def cli_main(argv: t.Optional[t.List[str]] = None) -> dict:
+    """Parse the command line and run a coordinator or a worker."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        options = cli.options_from_args(args)
+        try:
+            check_worker_options(options)
+        except ValueError as e:
+            parser.error(str(e))
+    authkey = authkey_from_env()
+    if args.command == "coordinator":
+        entries = catalogue.load(args.inputs, args.catalogue_cache)
+        shards = partition(entries, args.partition, args.shards)
+        with Coordinator(shards, authkey, parse_address(args.address)) as coordinator:
+            print(f"Repartiendo {len(shards)} shards en {args.address}")
+            coordinator.wait()
+        counts = coordinator.counts
+    else:
+        counts = work(parse_address(args.address), authkey, args.output_dir, args.engine, options)
+    print(", ".join(f"{status}: {n}" for status, n in counts.items()))
+    return counts
+
+
+if __name__ == "__main__":
+    cli_main()
@@ -0,0 +1,185 @@
+import asyncio
+import time
+
+import httpx  # Dependencia opcional: pip install "httpx[http2]"
+
+import asyncio_
+import metrics
+import pipeline
+
+# --- Configuración ---
+MAX_CONNECTIONS = 2
+STREAMS_PER_CONNECTION = 32
+
+
+# Quinto metodo: HTTP/2 multiplexado
+
+class Connection:
+    """
+    Una conexión HTTP/2: un cliente httpx limitado a un solo socket y un
+    semáforo con el máximo de streams simultáneos sobre él. Las URL http://
+    usan HTTP/2 sin TLS con conocimiento previo (h2c); las https:// lo
+    negocian por ALPN.
+    """
+
+    def __init__(self, streams, timeout):
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        self.client = httpx.AsyncClient(http1=False, http2=True, limits=limits, timeout=timeout)
+        self.streams = asyncio.Semaphore(streams)
+        self.active = 0
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def trace_connect(timing):
+    """
+    Mide la apertura de la conexión (TCP y TLS) con los eventos de traza de
+    httpcore y la guarda en `timing.connect`. httpcore no informa la
+    resolución DNS aparte: va incluida en esa fase.
+    """
+    started = {}
+
+    async def trace(event, info):
+        step, _, stage = event.rpartition(".")
+        if step not in ("connection.connect_tcp", "connection.start_tls"):
+            return
+        if stage == "started":
+            started[step] = time.perf_counter()
+        elif stage == "complete":
+            timing.connect = (timing.connect or 0.0) + time.perf_counter() - started.pop(step)
+
+    return trace
+
+
+def least_loaded(connections):
+    """
+    Elige la conexión con menos streams en curso.
+    """
+    return min(connections, key=lambda connection: connection.active)
+
+
+async def download_image(connection, task, store, options, writer, budget, rate_limiter=None):
+    """
+    Descarga una sola imagen como un stream de una conexión HTTP/2. El cuerpo
+    se copia a disco con la misma etapa de E/S que el motor asíncrono.
+    """
+    try:
+        if store is not None and not task.exists:
+            result = await writer.link_known(task, store)
+            if result is not None:
+                return result
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(task.url)
+        timing = metrics.Timing()
+        start = time.perf_counter()
+        async with connection.client.stream(
+            "GET", task.url, headers=task.headers, extensions={"trace": trace_connect(timing)}
+        ) as response:
+            timing.ttfb = time.perf_counter() - start
+            if response.status_code == 200:
+                chunks = response.aiter_bytes(options.buffer_size)
+                if rate_limiter is not None:
+                    chunks = asyncio_.throttled(chunks, rate_limiter, task.url)
+                async with budget:
+                    return await asyncio_.stream_to_disk(
+                        chunks, response.headers, task, store, options, writer, timing, start,
+                    )
+            content = await response.aread()
+            timing.transfer = time.perf_counter() - start - timing.ttfb
+            timing.total = time.perf_counter() - start
+            result = pipeline.check_response(task, response.status_code, content, response.headers)
+            return result._replace(timing=timing)
+
+    except httpx.TimeoutException as e:
+        return pipeline.Result(task, 'error', error=f"Tiempo agotado: {e}", overload=True, retryable=True)
+    except httpx.HTTPError as e:
+        return pipeline.Result(task, 'error', error=f"Error de red: {e}", retryable=True)
+    except Exception as e:
+        return pipeline.Result(task, 'error', error=f"Error inesperado: {e}")
+
+
+async def download_on(connections, task, job, writer, budget):
+    """
+    Un intento de descarga en la conexión menos cargada, respetando su tope
+    de streams.
+    """
+    connection = least_loaded(connections)
+    connection.active += 1
+    try:
+        async with connection.streams:
+            return await download_image(connection, task, job.store, job.options, writer, budget, job.rate_limiter)
+    finally:
+        connection.active -= 1
+
+
+async def consume(queue, connections, job, writer, budget):
+    """
+    Worker: toma tareas de la cola y las descarga, reintentando los fallos
+    transitorios, hasta recibir la señal de fin.
+    """
+    while True:
+        task = await queue.get()
+        try:
+            if task is None:
+                return
+            result = await writer.started(job, task)
+            if result is None:
+                result = await pipeline.fetch_once_async(job.flights, task, job.store, lambda: pipeline.with_retries_async(
+                    lambda: download_on(connections, task, job, writer, budget),
+                    task, job.retry_policy, job.breaker, job.deadline,
+                ), writer)
+            await writer.report(job, result)
+        finally:
+            queue.task_done()
+
+
+async def run_async(job):
+    """
+    Multiplexa las descargas sobre `max_connections` conexiones HTTP/2 con a
+    lo más `streams_per_connection` streams cada una. Por defecto hay un
+    worker por stream disponible; `workers` lo limita.
+    """
+    options = job.options
+    n_connections = options.max_connections or MAX_CONNECTIONS
+    streams = options.streams_per_connection or STREAMS_PER_CONNECTION
+    workers = options.workers or n_connections * streams
+    connections = [Connection(streams, options.timeout) for _ in range(n_connections)]
+    job.metrics.set_gauge("http2_connections", n_connections)
+    queue = asyncio.Queue(maxsize=2 * workers)
+    writer = asyncio_.Writer()
+    budget = asyncio.Semaphore(job.buffers.capacity)
+    lag = asyncio.create_task(asyncio_.monitor_lag(job))
+    consumers = [
+        asyncio.create_task(consume(queue, connections, job, writer, budget))
+        for _ in range(workers)
+    ]
+    try:
+        await asyncio_.feed(queue, job, workers, consumers)
+    finally:
+        for task in consumers:
+            task.cancel()
+        writer.close()
+        for connection in connections:
+            await connection.close()
+    lag.cancel()
+    await lag
+
+
+def run(job):
+    """
+    Ejecuta el bucle de eventos para un trabajo.
+    """
+    asyncio.run(run_async(job))
+
+
+def main(output_dir, inputs, **options):
+    """
+    Función principal que coincide con la firma esperada por el archivo de prueba.
+    """
+    return pipeline.execute("http2", output_dir, inputs, pipeline.Options(**options))
+
+# Este bloque te permite ejecutar el script directamente para probarlo
+if __name__ == "__main__":
+    import cli
+    cli.main(default_engine="http2")
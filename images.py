@@ -0,0 +1,169 @@
+import concurrent.futures
+import importlib.util
+import os
+import struct
+import typing as t
+import zlib
+
+import utils
+
+# Pillow is optional and only needed for thumbnails; it is imported when one is made
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+
+class InvalidPNG(ValueError):
+    """The bytes of a file are not a well-formed PNG."""
+
+
+class Chunk(t.NamedTuple):
+    kind: bytes
+    data: bytes
+
+
+class Processed(t.NamedTuple):
+    """Outcome of post-processing one sprite."""
+
+    error: t.Optional[str] = None
+    saved: int = 0
+    thumbnails: int = 0
+
+
+class ProcessingOptions(t.NamedTuple):
+    """What to do with every downloaded sprite, besides validating it."""
+
+    recompress: bool = False
+    thumbnail_sizes: t.Tuple[int, ...] = ()
+    thumbnail_dir: t.Optional[str] = None
+
+
+def read_chunks(content: bytes) -> t.List[Chunk]:
+    """Split a PNG into its chunks, checking the signature, lengths and CRCs."""
+    if not utils.is_png(content):
+        raise InvalidPNG("falta la firma PNG")
+    chunks = []
+    offset = len(utils.PNG_SIGNATURE)
+    while offset < len(content):
+        if offset + 8 > len(content):
+            raise InvalidPNG("chunk truncado")
+        length, kind = struct.unpack(">I4s", content[offset:offset + 8])
+        end = offset + 12 + length
+        if end > len(content):
+            raise InvalidPNG(f"chunk {kind!r} truncado")
+        data = content[offset + 8:offset + 8 + length]
+        (crc,) = struct.unpack(">I", content[end - 4:end])
+        if zlib.crc32(kind + data) != crc:
+            raise InvalidPNG(f"CRC incorrecto en el chunk {kind!r}")
+        chunks.append(Chunk(kind, data))
+        offset = end
+        if kind == b"IEND":
+            break
+    if not chunks or chunks[0].kind != b"IHDR":
+        raise InvalidPNG("el primer chunk no es IHDR")
+    if chunks[-1].kind != b"IEND":
+        raise InvalidPNG("falta el chunk IEND")
+    if not any(chunk.kind == b"IDAT" for chunk in chunks):
+        raise InvalidPNG("no hay datos de imagen (IDAT)")
+    return chunks
+
+
+def write_chunks(chunks: t.Iterable[Chunk]) -> bytes:
+    """Encode chunks back into a PNG."""
+    parts = [utils.PNG_SIGNATURE]
+    for kind, data in chunks:
+        parts.append(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+    return b"".join(parts)
+
+
+def recompress(chunks: t.List[Chunk]) -> t.List[Chunk]:
+    """Deflate the image data again at the highest level, as a single IDAT.
+
+    The pixels are untouched, so this is lossless.
+    """
+    idat = b"".join(chunk.data for chunk in chunks if chunk.kind == b"IDAT")
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9)
+    data = compressor.compress(zlib.decompress(idat)) + compressor.flush()
+    result, placed = [], False
+    for chunk in chunks:
+        if chunk.kind != b"IDAT":
+            result.append(chunk)
+        elif not placed:
+            result.append(Chunk(b"IDAT", data))
+            placed = True
+    return result
+
+
+def thumbnail_path(thumbnail_dir: str, size: int, type1: str, pokemon: str) -> str:
+    """Where the thumbnail of a sprite goes: a tree parallel to the output one, per size."""
+    return os.path.join(thumbnail_dir, str(size), type1, pokemon + ".png")
+
+
+def make_thumbnail(path: str, size: int, dest: str):
+    """Write a copy of the PNG at path that fits in size x size pixels."""
+    if not HAS_PILLOW:
+        raise RuntimeError("las miniaturas necesitan Pillow")
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.thumbnail((size, size))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = utils.temp_path(dest)
+        image.save(tmp_path, format="PNG", optimize=True)
+    os.replace(tmp_path, dest)
+
+
+def process_file(path: str, type1: str, pokemon: str, options: ProcessingOptions) -> Processed:
+    """Validate a downloaded sprite and derive its variants; runs in a worker process.
+
+    An invalid sprite is removed so that it is fetched again on the next run.
+    """
+    try:
+        with open(path, mode="rb") as f:
+            content = f.read()
+        try:
+            chunks = read_chunks(content)
+            if options.recompress:
+                chunks = recompress(chunks)
+        except (InvalidPNG, zlib.error) as e:
+            os.remove(path)
+            return Processed(error=f"PNG inválido: {e}")
+        saved = 0
+        if options.recompress:
+            smaller = write_chunks(chunks)
+            if len(smaller) < len(content):
+                utils.write_binary(path, smaller, fsync=False)
+                saved = len(content) - len(smaller)
+        for size in options.thumbnail_sizes:
+            make_thumbnail(path, size, thumbnail_path(options.thumbnail_dir, size, type1, pokemon))
+        return Processed(saved=saved, thumbnails=len(options.thumbnail_sizes))
+    except Exception as e:
+        return Processed(error=f"Error procesando la imagen: {e}")
+
+
+class ImageProcessor:
+    """Post-processing stage on a process pool, fed while downloads go on.
+
+    `submit` returns at once; `callback` gets the Processed outcome when the
+    worker finishes, from a background thread.
+    """
+
+    def __init__(self, options: ProcessingOptions, workers: t.Optional[int] = None):
+        if options.thumbnail_sizes and not HAS_PILLOW:
+            raise ImportError("Thumbnails need the Pillow package")
+        self.options = options
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, path: str, type1: str, pokemon: str, callback: t.Callable[[Processed], None]):
+        future = self._executor.submit(process_file, path, type1, pokemon, self.options)
+
+        def done(future):
+            try:
+                processed = future.result()
+            except Exception as e:
+                processed = Processed(error=f"Error procesando la imagen: {e}")
+            callback(processed)
+
+        future.add_done_callback(done)
+
+    def close(self):
+        """Wait for the pending sprites and stop the workers."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import typing as t
+
+import catalogue
+
+
+class Delta(t.NamedTuple):
+    """What changed in a catalogue since the previous run."""
+
+    # Rows never fetched before (or that failed last time)
+    new: t.List[catalogue.Entry]
+    # Rows whose URL changed: the old file is stale and must be fetched again
+    changed: t.List[t.Tuple[catalogue.Entry, str]]
+    # Rows that only changed type: the old file can be moved, not fetched
+    moved: t.List[t.Tuple[catalogue.Entry, str]]
+    # (pokemon, type) of the rows that are no longer in the catalogue
+    deleted: t.List[t.Tuple[str, str]]
+    unchanged: int
+
+
+def row_key(pokemon: str, type1: str) -> str:
+    """Key of a row in the snapshot: its place in the output tree, `<type1>/<pokemon>`."""
+    return f"{type1}/{pokemon}"
+
+
+class Snapshot:
+    """URLs of the rows a previous run completed, by their place in the output tree.
+
+    Rows are keyed by type and pokemon, like their files, so two rows with the
+    same name in different types are tracked apart. Rows are only recorded
+    once they succeed, so rows that failed show up as new again on the next run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: t.Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, mode="r") as f:
+                self.rows = json.load(f)
+
+    def diff(self, entries: t.Iterable[catalogue.Entry]) -> Delta:
+        """Compare a catalogue against the rows of the previous run.
+
+        A row that is new at its place but whose pokemon and URL were at
+        another type last time counts as moved from there.
+        """
+        delta = Delta([], [], [], [], 0)
+        unchanged = 0
+        seen = set()
+        fresh = []
+        for entry in entries:
+            key = row_key(entry.pokemon, entry.type1)
+            seen.add(key)
+            old_url = self.rows.get(key)
+            if old_url is None:
+                fresh.append(entry)
+            elif old_url != entry.url:
+                delta.changed.append((entry, entry.type1))
+            else:
+                unchanged += 1
+        # Old types of the rows that left their place, by pokemon and URL
+        gone: t.Dict[t.Tuple[str, str], t.List[str]] = {}
+        for key, url in self.rows.items():
+            if key not in seen:
+                type1, pokemon = key.split("/", 1)
+                gone.setdefault((pokemon, url), []).append(type1)
+        for entry in fresh:
+            old_types = gone.get((entry.pokemon, entry.url))
+            if old_types:
+                delta.moved.append((entry, old_types.pop()))
+            else:
+                delta.new.append(entry)
+        delta.deleted.extend((pokemon, type1) for (pokemon, _), types in gone.items() for type1 in types)
+        return delta._replace(unchanged=unchanged)
+
+    def record(self, entry, ok: bool = True):
+        """Remember the state of a row after this run; forget it if it failed."""
+        key = row_key(entry.pokemon, entry.type1)
+        with self._lock:
+            if ok:
+                self.rows[key] = entry.url
+            else:
+                self.rows.pop(key, None)
+
+    def forget(self, pokemon: str, type1: str):
+        with self._lock:
+            self.rows.pop(row_key(pokemon, type1), None)
+
+    def save(self):
+        """Persist the snapshot atomically."""
+        with self._lock:
+            data = json.dumps(self.rows, sort_keys=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def open_snapshot(path: t.Optional[str]) -> t.Optional[Snapshot]:
+    """Open the snapshot at path, or return None when runs are not incremental."""
+    return Snapshot(path) if path else None
@@ -0,0 +1,101 @@
+import glob
+import os
+import threading
+import time
+import typing as t
+
+PLANNED = "planned"
+INFLIGHT = "inflight"
+DONE = "done"
+FAILED = "failed"
+# The path was pruned or moved away by an incremental run
+REMOVED = "removed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    path TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+_UPSERT = """
+INSERT INTO items (path, url, state, error, updated) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    url = excluded.url, state = excluded.state, error = excluded.error, updated = excluded.updated
+"""
+
+
+class Journal:
+    """SQLite journal of the state of every output path of a job.
+
+    State changes are buffered and committed in batches; losing the last batch
+    on a crash only means redoing a few items, since writes are atomic. On the
+    next run, paths journaled as done for the same URL are skipped without
+    touching the filesystem.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 1.0):
+        # Imported here: only runs with a journal pay for loading sqlite
+        import sqlite3
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        self._pending: t.List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def done(self) -> t.Dict[str, str]:
+        """Return path -> url of every item completed in a previous run."""
+        with self._lock:
+            rows = self._db.execute("SELECT path, url FROM items WHERE state = ?", (DONE,))
+            return dict(rows.fetchall())
+
+    def unfinished(self) -> t.List[str]:
+        """Return the paths that were planned or in flight when a run stopped."""
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM items WHERE state IN (?, ?)", (PLANNED, INFLIGHT))
+            return [path for path, in rows.fetchall()]
+
+    def mark(self, path: str, url: str, state: str, error: t.Optional[str] = None):
+        """Record the new state of an item."""
+        with self._lock:
+            self._pending.append((path, url, state, error, time.time()))
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._db.executemany(_UPSERT, self._pending)
+            self._db.commit()
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Commit the buffered state changes."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+def remove_partial_files(paths: t.Iterable[str]):
+    """Remove the temporary files a stopped run left next to some paths."""
+    for path in paths:
+        for partial in glob.glob(glob.escape(path) + ".*.tmp"):
+            os.remove(partial)
+
+
+def open_journal(path: t.Optional[str]) -> t.Optional[Journal]:
+    """Open the journal at path, or return None when runs are not journaled."""
+    return Journal(path) if path else None
@@ -0,0 +1,17 @@
+import os
+import typing as t
+
+import bench
+
+
+def expected_layout(size: int) -> t.Dict[str, t.Set[str]]:
+    """Type directories and file names a run over `bench.make_dataset(size)` leaves."""
+    layout: t.Dict[str, t.Set[str]] = {}
+    for i in range(size):
+        layout.setdefault(bench.TYPES[i % len(bench.TYPES)], set()).add(f"pokemon{i:06d}.png")
+    return layout
+
+
+def actual_layout(output_dir: str) -> t.Dict[str, t.Set[str]]:
+    """Type directories and file names found in output_dir."""
+    return {d: set(os.listdir(os.path.join(output_dir, d))) for d in os.listdir(output_dir)}
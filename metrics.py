@@ -0,0 +1,215 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+import typing as t
+
+# Phases of a single download, in the order they happen
+PHASES = ("dns", "connect", "ttfb", "transfer", "write", "total")
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Timing:
+    """Durations (seconds) of the phases of one download; None if not measured."""
+
+    __slots__ = PHASES
+
+    def __init__(self):
+        for phase in PHASES:
+            setattr(self, phase, None)
+
+    def as_dict(self) -> t.Dict[str, t.Optional[float]]:
+        return {phase: getattr(self, phase) for phase in PHASES}
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for phase in PHASES:
+            setattr(self, phase, state.get(phase))
+
+
+_current = threading.local()
+
+
+@contextlib.contextmanager
+def measuring(timing: Timing) -> t.Iterator[Timing]:
+    """Make `timing` the one `current_timing` returns in this thread during the block.
+
+    Connections opened meanwhile record their DNS and connect phases in it.
+    """
+    _current.timing = timing
+    try:
+        yield timing
+    finally:
+        _current.timing = None
+
+
+def current_timing() -> t.Optional[Timing]:
+    return getattr(_current, "timing", None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets: t.Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> t.Optional[float]:
+        """Estimate a quantile (0-1) as the upper bound of its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """In-memory counters and per-phase latency histograms of a run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.outcomes: t.Dict[str, int] = {}
+        self.bytes = 0
+        self.retries = 0
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.gauges: t.Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, outcome: str, size: int = 0, timing: t.Optional[Timing] = None, retries: int = 0):
+        """Account for the outcome of one item."""
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.bytes += size
+            self.retries += retries
+            if timing is not None:
+                for phase in PHASES:
+                    value = getattr(timing, phase)
+                    if value is not None:
+                        self.phases[phase].observe(value)
+
+    def set_gauge(self, name: str, value: float):
+        """Set the current value of a gauge, e.g. the concurrency limit."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def summary(self) -> dict:
+        """Return a JSON-serializable summary of the run so far."""
+        with self._lock:
+            elapsed = time.time() - self.started
+            done = sum(self.outcomes.values())
+            return {
+                "ts": round(time.time(), 3),
+                "elapsed_s": round(elapsed, 3),
+                "items": done,
+                "items_per_s": round(done / elapsed, 2) if elapsed else None,
+                "bytes": self.bytes,
+                "retries": self.retries,
+                "outcomes": dict(self.outcomes),
+                "gauges": dict(self.gauges),
+                "phases": {
+                    phase: {
+                        "count": h.count,
+                        "sum_s": round(h.sum, 6),
+                        "p50_s": h.quantile(0.5),
+                        "p95_s": h.quantile(0.95),
+                        "p99_s": h.quantile(0.99),
+                    }
+                    for phase, h in self.phases.items()
+                    if h.count
+                },
+            }
+
+    def to_prometheus(self, prefix: str = "sprites") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_items_total Items processed by outcome.",
+            f"# TYPE {prefix}_items_total counter",
+        ]
+        with self._lock:
+            for outcome, n in sorted(self.outcomes.items()):
+                lines.append(f'{prefix}_items_total{{outcome="{outcome}"}} {n}')
+            lines += [
+                f"# HELP {prefix}_bytes_total Bytes downloaded.",
+                f"# TYPE {prefix}_bytes_total counter",
+                f"{prefix}_bytes_total {self.bytes}",
+                f"# HELP {prefix}_retries_total Extra attempts made after a retryable failure.",
+                f"# TYPE {prefix}_retries_total counter",
+                f"{prefix}_retries_total {self.retries}",
+                f"# HELP {prefix}_phase_seconds Duration of each phase of a download.",
+                f"# TYPE {prefix}_phase_seconds histogram",
+            ]
+            for phase, h in self.phases.items():
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {h.sum}')
+                lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {h.count}')
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class Reporter:
+    """Periodically append JSON-lines summaries and refresh a Prometheus file."""
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        jsonl_path: t.Optional[str] = None,
+        prometheus_path: t.Optional[str] = None,
+        interval: float = 10.0,
+    ):
+        self.metrics = metrics
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+
+    def flush(self):
+        """Write the current state of the metrics."""
+        if self.jsonl_path:
+            with open(self.jsonl_path, mode="a") as f:
+                f.write(json.dumps(self.metrics.summary()) + "\n")
+        if self.prometheus_path:
+            tmp_path = self.prometheus_path + ".tmp"
+            with open(tmp_path, mode="w") as f:
+                f.write(self.metrics.to_prometheus())
+            # Replace atomically so scrapers never read a partial file
+            os.replace(tmp_path, self.prometheus_path)
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def start(self) -> "Reporter":
+        if self.jsonl_path or self.prometheus_path:
+            self._thread = threading.Thread(target=self._loop, name="metrics-reporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop reporting and write a final summary."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
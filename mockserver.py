@@ -0,0 +1,367 @@
+import asyncio
+import hashlib
+import http.server
+import math
+import random
+import struct
+import threading
+import time
+import typing as t
+import zlib
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:  # optional, only needed by MockH2SpriteServer
+    h2 = None
+
+import ratelimit
+from utils import PNG_SIGNATURE
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    """Encode a PNG chunk with its length and CRC."""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def synthetic_png(size: int, seed: int = 0) -> bytes:
+    """Return a valid grayscale PNG of roughly `size` bytes.
+
+    The pixels are random and stored uncompressed, so the size is predictable.
+    """
+    width = max(1, size - 69)
+    pixels = b"\x00" + random.Random(seed).randbytes(width)
+    ihdr = struct.pack(">IIBBBBB", width, 1, 8, 0, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", zlib.compress(pixels, 0))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def setup(self):
+        super().setup()
+        self.server.owner.connected()
+
+    def do_GET(self):
+        start = time.perf_counter()
+        status = self.server.owner.respond(self)
+        self.server.owner.record(status, time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    owner: "MockSpriteServer"
+
+
+class MockSpriteServer:
+    """Local HTTP server serving synthetic sprites for reproducible benchmarks.
+
+    Every path is a PNG of `payload_size` bytes, answered after `latency`
+    seconds, sent at `bandwidth` bytes/s per connection (unlimited if None) and
+    replaced by a 503 with probability `error_rate`. ETag/Last-Modified
+    validators are honoured with 304 responses. `connections` counts the
+    connections accepted so far.
+
+    With a `quota`, like a CDN, it serves at most that many requests per
+    second (after a burst of `quota_burst`); a client that goes over it gets
+    429s with a Retry-After for the next `quota_penalty` seconds.
+
+    With `truncate`, bodies are cut after that many bytes and the connection
+    closed, while Content-Length still announces the whole sprite.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bandwidth: t.Optional[float] = None,
+        error_rate: float = 0.0,
+        payload_size: int = 2048,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        quota: t.Optional[float] = None,
+        quota_burst: t.Optional[float] = None,
+        quota_penalty: float = 1.0,
+        truncate: t.Optional[int] = None,
+    ):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._quota = ratelimit.TokenBucket(quota, quota_burst) if quota else None
+        self.quota_penalty = quota_penalty
+        self.truncate = truncate
+        self._blocked_until = 0.0
+        self._payloads: t.Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.latencies: t.List[float] = []
+        self.statuses: t.Dict[int, int] = {}
+        # Paths requested, in arrival order
+        self.paths: t.List[str] = []
+        self.connections = 0
+        self._thread: t.Optional[threading.Thread] = None
+        self._bind(host, port)
+
+    def _bind(self, host: str, port: int):
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.owner = self
+
+    @property
+    def address(self) -> t.Tuple[str, int]:
+        return self._httpd.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        """Return the absolute URL of a path on this server."""
+        return self.base_url + "/" + path.lstrip("/")
+
+    def payload(self, path: str) -> bytes:
+        """Return the (deterministic) sprite served for a path."""
+        with self._lock:
+            content = self._payloads.get(path)
+            if content is None:
+                seed = int.from_bytes(hashlib.sha256(f"{self.seed}:{path}".encode()).digest()[:8], "big")
+                content = self._payloads[path] = synthetic_png(self.payload_size, seed)
+            return content
+
+    def _throttled(self) -> t.Optional[float]:
+        """Seconds a client over the quota is blocked for, or None if within it."""
+        if self._quota is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._quota.try_take():
+                return None
+            self._blocked_until = now + self.quota_penalty
+            return self.quota_penalty
+
+    def answer(self, path: str, if_none_match: t.Optional[str]) -> t.Tuple[int, t.List[t.Tuple[str, str]], bytes]:
+        """Return the status, headers and body of the response to a GET."""
+        with self._lock:
+            self.paths.append(path)
+        blocked = self._throttled()
+        if blocked is not None:
+            return 429, [("Retry-After", str(math.ceil(blocked))), ("Content-Length", "0")], b""
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            return 503, [("Content-Length", "0")], b""
+        content = self.payload(path)
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        if if_none_match == etag:
+            return 304, [("ETag", etag), ("Content-Length", "0")], b""
+        headers = [
+            ("Content-Type", "image/png"),
+            ("Content-Length", str(len(content))),
+            ("ETag", etag),
+            ("Last-Modified", LAST_MODIFIED),
+        ]
+        return 200, headers, content
+
+    def respond(self, handler: http.server.BaseHTTPRequestHandler) -> int:
+        """Answer a GET request and return the status code sent."""
+        if self.latency:
+            time.sleep(self.latency)
+        status, headers, content = self.answer(handler.path, handler.headers.get("If-None-Match"))
+        handler.send_response(status)
+        for name, value in headers:
+            handler.send_header(name, value)
+        handler.end_headers()
+        if content and self.truncate is not None:
+            self._send(handler, content[:self.truncate])
+            handler.close_connection = True
+        elif content:
+            self._send(handler, content)
+        return status
+
+    def _send(self, handler: http.server.BaseHTTPRequestHandler, content: bytes):
+        """Write a body, throttled to the configured bandwidth."""
+        if not self.bandwidth:
+            handler.wfile.write(content)
+            return
+        step = max(1024, int(self.bandwidth / 100))
+        for i in range(0, len(content), step):
+            chunk = content[i:i + step]
+            handler.wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def record(self, status: int, elapsed: float):
+        """Account for a served request."""
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def connected(self):
+        """Account for an accepted connection."""
+        with self._lock:
+            self.connections += 1
+
+    def reset_stats(self):
+        """Forget the latencies, statuses, paths and connections recorded so far."""
+        with self._lock:
+            self.latencies = []
+            self.statuses = {}
+            self.paths = []
+            self.connections = 0
+
+    def start(self) -> "MockSpriteServer":
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockSpriteServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _H2Protocol(asyncio.Protocol):
+    """One cleartext HTTP/2 (prior knowledge) connection of MockH2SpriteServer."""
+
+    def __init__(self, owner: "MockH2SpriteServer"):
+        self.owner = owner
+        config = h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        self.conn = h2.connection.H2Connection(config=config)
+        self.transport: t.Optional[asyncio.Transport] = None
+        self._windows: t.Dict[int, asyncio.Event] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.owner.connected()
+        self.conn.initiate_connection()
+        self.conn.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self.owner.max_streams})
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data: bytes):
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                asyncio.ensure_future(self._respond(event.stream_id, dict(event.headers)))
+            elif isinstance(event, h2.events.WindowUpdated):
+                for stream_id, window in list(self._windows.items()):
+                    if event.stream_id in (0, stream_id):
+                        window.set()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    def connection_lost(self, exc):
+        for window in self._windows.values():
+            window.set()
+
+    async def _respond(self, stream_id: int, headers: t.Dict[str, str]):
+        start = time.perf_counter()
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        status, response_headers, content = self.owner.answer(headers[":path"], headers.get("if-none-match"))
+        try:
+            self.conn.send_headers(
+                stream_id,
+                [(":status", str(status))] + [(name.lower(), value) for name, value in response_headers],
+                end_stream=not content,
+            )
+            self.transport.write(self.conn.data_to_send())
+            await self._send(stream_id, content)
+        except h2.exceptions.StreamClosedError:
+            return
+        self.owner.record(status, time.perf_counter() - start)
+
+    async def _send(self, stream_id: int, content: bytes):
+        """Send a body within the flow-control windows, throttled to the bandwidth."""
+        while content and not self.transport.is_closing():
+            size = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+            if self.owner.bandwidth:
+                size = min(size, max(1024, int(self.owner.bandwidth / 100)))
+            if size <= 0:
+                window = self._windows[stream_id] = asyncio.Event()
+                await window.wait()
+                del self._windows[stream_id]
+                continue
+            chunk, content = content[:size], content[size:]
+            self.conn.send_data(stream_id, chunk, end_stream=not content)
+            self.transport.write(self.conn.data_to_send())
+            if self.owner.bandwidth:
+                await asyncio.sleep(len(chunk) / self.owner.bandwidth)
+
+
+class MockH2SpriteServer(MockSpriteServer):
+    """MockSpriteServer speaking cleartext HTTP/2 with prior knowledge (h2c).
+
+    Requires the optional `h2` package. Each connection accepts up to
+    `max_streams` concurrent streams; responses on a connection are
+    multiplexed, so `connections` shows how many sockets a client really used.
+    """
+
+    def __init__(self, *args, max_streams: int = 100, **kwargs):
+        self.max_streams = max_streams
+        super().__init__(*args, **kwargs)
+
+    def _bind(self, host: str, port: int):
+        if h2 is None:
+            raise ImportError("MockH2SpriteServer requires the h2 package")
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            self._loop.create_server(lambda: _H2Protocol(self), host, port)
+        )
+
+    @property
+    def address(self) -> t.Tuple[str, int]:
+        return self._server.sockets[0].getsockname()[:2]
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def start(self) -> "MockH2SpriteServer":
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        def shutdown():
+            self._server.close()
+            self._loop.stop()
+
+        self._loop.call_soon_threadsafe(shutdown)
+        if self._thread is not None:
+            self._thread.join()
+        self._loop.close()
@@ -1,102 +1,150 @@
-##raise NotImplementedError
+import multiprocessing.util
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-import threading
-import time
-from concurrent.futures import ThreadPoolExecutor
 import requests
-import os
-import glob
-import csv
-import typing as t
-from utils import read_pokemons
 
-# --- Configuración ---
-CSV_FOLDER = "C:/Users/paula/Downloads/concurrent-downloads-master/concurrent-downloads-master/data"
-OUTPUT_FOLDER = 'output'
-MAX_WORKERS = 10 
+import archive
+import buffers as buffer_pool
+import pipeline
+import ratelimit
+import singleflight
+import sessions
+
+# Estado propio de cada proceso del pool (se crea en _init_worker)
+_session = None
+_executor = None
+_store = None
+_options = None
+_policy = None
+_breaker = None
+_buffers = None
+_connections = None
+_rate_limiter = None
+_flights = None
+_deadline = None
 
 ## Primer Metodo: Usando Multiprocessing y ThreadPoolExecutor
-def read_pokemons(csv_paths):
-    """
-    Lee múltiples archivos CSV, convierte los nombres a minúsculas y los devuelve.
-    """
-    for csv_path in csv_paths:
-        try:
-            with open(csv_path, mode='r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # El test espera que los nombres de carpetas y archivos sean en minúsculas
-                    pokemon_name = row.get('Pokemon', '').lower()
-                    type_name = row.get('Type1', '').lower()
-                    sprite_url = row.get('Sprite', '').strip()
-
-                    if all([pokemon_name, type_name, sprite_url]):
-                        yield {
-                            'Pokemon': pokemon_name,
-                            'Type1': type_name,
-                            'Sprite': sprite_url
-                        }
-        except FileNotFoundError:
-            print(f"ADVERTENCIA: No se encontró el archivo {csv_path}. Omitiendo.")
-        except Exception as e:
-            print(f"Error al leer el archivo {csv_path}: {e}")
-
-def download_image(args):
-    """
-    Descarga una sola imagen. Adaptada para recibir los argumentos en una tupla.
-    """
-    output_dir, pokemon_data = args
-    pokemon_name = pokemon_data['Pokemon']
-    folder_name = pokemon_data['Type1']
-    image_url = pokemon_data['Sprite']
+def _init_worker(output_dir, options, processes, deadline=None):
+    """
+    Inicializa cada proceso: una sesión HTTP reutilizable, su propio pool de hilos,
+    su parte del presupuesto de memoria y, si se pidió, el almacén de blobs
+    deduplicados o su propio escritor de shards tar.
+    """
+    global _session, _executor, _store, _options, _policy, _breaker, _buffers, _connections, _rate_limiter, _flights, _deadline
+    threads = options.threads_per_process
+    _options = options
+    # Un pool de conexiones del tamaño del pool de hilos evita descartar conexiones
+    _connections = sessions.ConnectionStats()
+    _session = sessions.make_session(
+        options.max_connections or threads, _connections, options.keep_alive, options.dns_ttl
+    )
+    _executor = ThreadPoolExecutor(max_workers=threads)
+    _store = pipeline.open_output(output_dir, options)
+    if isinstance(_store, archive.ShardWriter):
+        # Los shards del proceso se cierran cuando el pool lo termina
+        multiprocessing.util.Finalize(_store, _store.close, exitpriority=10)
+    # El presupuesto es global: cada proceso recibe una parte igual
+    _buffers = buffer_pool.BufferPool(options.memory_budget // processes, options.buffer_size)
+    # Igual con los límites de tasa: cada proceso respeta su parte
+    _rate_limiter = ratelimit.open_limiter(pipeline.rate_limits(options).share(processes))
+    # Las URL repetidas se descargan una vez por proceso
+    _flights = singleflight.SingleFlight(pipeline.kept_outcome) if options.coalesce else None
+    # Los lotes se envían todos al principio: cada proceso revisa el plazo del trabajo
+    _deadline = deadline
+    # Cada proceso reintenta por su cuenta y tiene su propio circuit breaker
+    _policy = pipeline.retry_policy(options)
+    _breaker = pipeline.circuit_breaker(options)
+
 
+def fetch(task):
+    """
+    Un intento de descarga con la sesión del proceso. La validación del PNG y
+    el hash para el manifiesto son trabajo de CPU que escala con los procesos.
+    """
     try:
-        # Crea la ruta de la carpeta (ej: output/grass)
-        folder_path = os.path.join(output_dir, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-
-        # Crea la ruta final de la imagen (ej: output/grass/bulbasaur.png)
-        image_path = os.path.join(folder_path, f"{pokemon_name}.png")
-
-        if not os.path.exists(image_path):
-            response = requests.get(image_url, timeout=15)
-            response.raise_for_status()
-            with open(image_path, 'wb') as f:
-                f.write(response.content)
-            print(f"Descargado: {pokemon_name}.png en '{folder_name}'")
-        else:
-            print(f"Omitido: {pokemon_name}.png ya existe.")
-            
+        return pipeline.download(_session, task, _store, _options, _buffers, _rate_limiter)
+    except requests.Timeout as e:
+        return pipeline.Result(task, 'error', error=f"Tiempo agotado: {e}", overload=True, retryable=True)
     except requests.RequestException as e:
-        print(f"❌ Error de red para {pokemon_name}: {e}")
+        return pipeline.Result(task, 'error', error=f"Error de red: {e}", retryable=True)
     except Exception as e:
-        print(f"❌ Error inesperado procesando a {pokemon_name}: {e}")
+        return pipeline.Result(task, 'error', error=f"Error inesperado: {e}")
+
 
-def main(output_dir, inputs):
+def download_image(task):
     """
-    Función principal que coincide con la firma esperada por el archivo de prueba.
+    Descarga una sola imagen, reintentando los fallos transitorios. Pasado
+    el plazo del trabajo, la deja para la próxima ejecución.
+    """
+    if pipeline.past_deadline(_deadline):
+        return pipeline.deferred(task)
+    return pipeline.fetch_once(
+        _flights, task, _store, lambda: pipeline.with_retries(lambda: fetch(task), task, _policy, _breaker, _deadline)
+    )
+
+
+def download_batch(batch):
+    """
+    Descarga un lote de imágenes dentro de un proceso usando su pool de hilos.
+    Devuelve los resultados y cuántas conexiones y peticiones hizo el lote.
+    """
+    opened, sent = _connections.opened, _connections.requests
+    results = list(_executor.map(download_image, batch))
+    return results, _connections.opened - opened, _connections.requests - sent
+
+
+def chunked(iterable, size):
+    """
+    Agrupa un iterable en listas de como máximo `size` elementos.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def started(job, tasks):
+    """
+    Marca como en curso las tareas a medida que se envían a los procesos;
+    pasado el plazo, las informa como aplazadas sin enviarlas.
+    """
+    for task in tasks:
+        deferred = job.started(task)
+        if deferred is None:
+            yield task
+        else:
+            job.report(deferred)
+
+
+def run(job):
+    """
+    Reparte lotes de tareas entre `workers` procesos; cada uno descarga su lote
+    con `threads_per_process` hilos que comparten una misma sesión HTTP. El
+    manifiesto vive en el proceso principal, que recibe los resultados.
     """
-    pokemons_to_download = list(read_pokemons(inputs))
-    
-    # Preparamos los argumentos para cada llamada a download_image
-    # Pasamos el output_dir a cada tarea
-    tasks_with_args = [(output_dir, data) for data in pokemons_to_download]
-    
-    # Usamos un número razonable de hilos
-    max_workers = min(32, os.cpu_count() + 4)
+    processes = job.options.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(job.output_dir, job.options, processes, job.deadline)
+    ) as executor:
+        batches = chunked(started(job, job.tasks()), job.options.chunk_size)
+        for results, opened, sent in executor.map(download_batch, batches):
+            job.connections.add(opened, sent)
+            for result in results:
+                job.report(result)
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(download_image, tasks_with_args)
+
+def main(output_dir, inputs, **options):
+    """
+    Función principal que coincide con la firma esperada por el archivo de prueba.
+    """
+    return pipeline.execute("process", output_dir, inputs, pipeline.Options(**options))
 
 # Este bloque es opcional, pero te permite ejecutar el script directamente
 if __name__ == "__main__":
-    # Ejemplo de cómo ejecutarlo directamente
-    # Asume que los datos están en una carpeta 'data'
-    INPUT_CSVS = [f"data/pokemon-gen{i}-data.csv" for i in range(1, 7)]
-    OUTPUT_DIR = "output_threading"
-    
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    print("Iniciando descarga con Threading...")
-    main(OUTPUT_DIR, INPUT_CSVS)
-    print("¡Proceso con Threading completado!")
+    import cli
+    cli.main(default_engine="process")
@@ -0,0 +1,834 @@
+import csv
+import dataclasses
+import hashlib
+import importlib
+import os
+import threading
+import time
+import typing as t
+
+import archive
+import buffers as buffer_pool
+import cache
+import catalogue
+import images
+import incremental
+import journal as job_journal
+import metrics
+import profiling
+import ratelimit
+import retry
+import scheduling
+import sessions
+import singleflight
+import store as blob_store
+import utils
+
+# Engine name -> module implementing `run(job)`, imported only when selected
+ENGINES = {
+    "sequential": "sequential",
+    "thread": "threading_",
+    "process": "multiprocessing_",
+    "async": "asyncio_",
+    "http2": "http2_",
+}
+
+# Layouts of the output: a file per sprite, or sprites packed in tar shards
+OUTPUT_FORMATS = ("files", "tar")
+
+STATUSES = ("descargado", "sin cambios", "enlazado", "omitido", "movido", "eliminado", "aplazado", "error")
+
+# Concurrency the adaptive limiter starts from
+ADAPTIVE_INITIAL = 4
+
+
+@dataclasses.dataclass
+class Options:
+    """Tuning knobs shared by every engine; None means the engine default."""
+
+    workers: t.Optional[int] = None
+    max_connections: t.Optional[int] = None
+    chunk_size: int = 32
+    threads_per_process: int = 8
+    streams_per_connection: t.Optional[int] = None
+    timeout: float = 15
+    # Reuse connections between requests (HTTP keep-alive)
+    keep_alive: bool = True
+    # Seconds a DNS answer is reused; 0 resolves on every new connection
+    dns_ttl: float = sessions.DNS_TTL
+    manifest_path: t.Optional[str] = None
+    store_dir: t.Optional[str] = None
+    # Print a line per item; errors are always printed
+    verbose: bool = False
+    metrics_path: t.Optional[str] = None
+    prometheus_path: t.Optional[str] = None
+    metrics_interval: float = 10.0
+    # Let an AIMD limiter pick the concurrency, with `workers` as the ceiling
+    adaptive: bool = False
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+    # Csv where the rows that failed are written, ready to be used as input
+    failed_path: t.Optional[str] = None
+    # Bytes of transfer buffers all the downloads may hold at once
+    memory_budget: int = buffer_pool.MEMORY_BUDGET
+    buffer_size: int = buffer_pool.BUFFER_SIZE
+    # Post-processing of downloaded sprites on a process pool: PNG validation,
+    # lossless recompression and thumbnails (which need Pillow)
+    validate: bool = False
+    recompress: bool = False
+    thumbnail_sizes: t.Tuple[int, ...] = ()
+    thumbnail_dir: t.Optional[str] = None
+    process_workers: t.Optional[int] = None
+    # Directory where parsed csvs are cached between runs
+    catalogue_cache: t.Optional[str] = None
+    # Fingerprints of the rows of the previous run; only the delta is processed
+    snapshot_path: t.Optional[str] = None
+    # SQLite journal that lets an interrupted run resume where it stopped
+    journal_path: t.Optional[str] = None
+    # fsync every file before renaming it into place
+    fsync: bool = True
+    # Token-bucket rate limits, globally and per host; None is unlimited
+    requests_per_second: t.Optional[float] = None
+    bytes_per_second: t.Optional[float] = None
+    host_requests_per_second: t.Optional[float] = None
+    host_bytes_per_second: t.Optional[float] = None
+    # Seconds of rate that may be spent at once after being idle
+    burst_seconds: float = 1.0
+    # Fetch each URL once per run; other rows with it get a link to that copy
+    coalesce: bool = True
+    # Order in which tasks are handed to the engine (see scheduling.POLICIES)
+    schedule: str = "csv"
+    # Numeric csv column read by the "priority" policy; higher goes first
+    priority_column: t.Optional[str] = None
+    # Seconds after which tasks not yet started are deferred to the next run
+    deadline: t.Optional[float] = None
+    # "tar" packs the sprites in shards of at most `shard_size` bytes, with an index
+    output_format: str = "files"
+    shard_size: int = archive.SHARD_SIZE
+    # Profile the run (see profiling.KINDS) and write the artifacts to
+    # `profile_dir`; when empty, the SPRITES_PROFILE variable decides
+    profile: t.Tuple[str, ...] = ()
+    profile_dir: t.Optional[str] = None
+    profile_interval: float = profiling.INTERVAL
+
+
+class Task(t.NamedTuple):
+    """A sprite to fetch and where to place it."""
+
+    pokemon: str
+    type1: str
+    url: str
+    path: str
+    exists: bool
+    # Conditional request headers; empty for a plain GET
+    headers: t.Dict[str, str]
+
+
+class Result(t.NamedTuple):
+    """Outcome of a task, reported back to the job."""
+
+    task: Task
+    status: str
+    entry: t.Optional[dict] = None
+    error: t.Optional[str] = None
+    # Hash of the content in the blob store, if one is used
+    digest: t.Optional[str] = None
+    timing: t.Optional[metrics.Timing] = None
+    size: int = 0
+    # The origin looks overloaded: timeout, 429 or 5xx
+    overload: bool = False
+    # Trying again may succeed: network error, timeout, 408, 429 or 5xx
+    retryable: bool = False
+    retry_after: t.Optional[float] = None
+    attempts: int = 1
+    # Shared from the transfer of another task for the same URL
+    coalesced: bool = False
+
+
+class OutputTree:
+    """Listing of the output directory, read once per type directory.
+
+    Planning asks it whether sprites exist instead of stat-ing each path, and
+    it creates every type directory before any task for it is handed out, so
+    engines never need to call makedirs.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        utils.maybe_create_dir(output_dir)
+        with os.scandir(output_dir) as it:
+            self._dirs = {e.name for e in it if e.is_dir()}
+        self._files: t.Dict[str, t.Set[str]] = {}
+
+    def files(self, type1: str) -> t.Set[str]:
+        """Names of the files in the directory of a type, creating it if missing."""
+        names = self._files.get(type1)
+        if names is None:
+            folder = os.path.join(self.output_dir, type1)
+            if type1 in self._dirs:
+                with os.scandir(folder) as it:
+                    names = {e.name for e in it}
+            else:
+                os.makedirs(folder, exist_ok=True)
+                names = set()
+            self._files[type1] = names
+        return names
+
+
+def plan(
+    entries: t.Iterable[catalogue.Entry],
+    output_dir: str,
+    manifest=None,
+    done: t.Optional[t.Dict[str, str]] = None,
+    tree=None,
+) -> t.Iterator[Task]:
+    """Turn catalogue entries into tasks.
+
+    `done` maps the paths a journal knows are complete to their URL; those are
+    known to exist without even listing their directory. `tree` answers which
+    sprites exist, an OutputTree of output_dir by default.
+    """
+    done = done or {}
+    if tree is None:
+        tree = OutputTree(output_dir)
+    for entry in entries:
+        pokemon, type1, url = entry.pokemon, entry.type1, entry.url
+        filename = pokemon + ".png"
+        path = os.path.join(output_dir, type1, filename)
+        exists = done.get(path) == url or filename in tree.files(type1)
+        headers = manifest.conditional_headers(url) if exists and manifest is not None else {}
+        yield Task(pokemon, type1, url, path, exists, headers)
+
+
+def link_known(task: Task, store) -> t.Optional[Result]:
+    """Satisfy a task from the blob store without fetching, if possible."""
+    if store is None or task.exists:
+        return None
+    if store.link_known(task.url, task.path):
+        return Result(task, "enlazado")
+    return None
+
+
+def check_response(
+    task: Task, status_code: int, content: bytes, headers: t.Optional[t.Mapping[str, str]] = None
+) -> t.Optional[Result]:
+    """Return the final result of a response that must not be written."""
+    if status_code == 304:
+        return Result(task, "sin cambios")
+    if status_code != 200:
+        overload = status_code == 429 or status_code >= 500
+        return Result(
+            task,
+            "error",
+            error=f"HTTP {status_code}",
+            overload=overload,
+            retryable=overload or status_code == 408,
+            retry_after=retry.parse_retry_after((headers or {}).get("Retry-After")),
+        )
+    if not utils.is_png(content):
+        return Result(task, "error", error="el contenido no es un PNG")
+    return None
+
+
+def open_output(output_dir: str, options: Options):
+    """Open where downloads are committed: the blob store, a shard writer or nothing.
+
+    With None, sprites are renamed into place as loose files.
+    """
+    if options.output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {options.output_format!r}, expected one of {OUTPUT_FORMATS}")
+    if options.output_format == "files":
+        return blob_store.open_store(options.store_dir, options.fsync)
+    if options.store_dir or options.snapshot_path or image_processor_enabled(options):
+        raise ValueError("The tar output does not support a store, incremental runs or post-processing")
+    utils.maybe_create_dir(output_dir)
+    return archive.ShardWriter(output_dir, options.shard_size, fsync=options.fsync)
+
+
+def temp_path(task: Task, store) -> str:
+    """Temporary file where the body of a task is streamed."""
+    if isinstance(store, archive.ShardWriter):
+        return store.temp_path(task.path)
+    return utils.temp_path(task.path)
+
+
+def commit_file(tmp_path: str, task: Task, store, sha256: t.Optional[str]) -> t.Optional[str]:
+    """Move a fully written temporary file into place, through the blob store if there is one.
+
+    Return the hash of the blob when the store is used.
+    """
+    if store is None:
+        os.replace(tmp_path, task.path)
+        return None
+    store.save_file(task.url, tmp_path, sha256, task.path)
+    return sha256
+
+
+def streamed(
+    task: Task,
+    headers: t.Mapping[str, str],
+    size: int,
+    sha256: t.Optional[str],
+    options: Options,
+    digest: t.Optional[str] = None,
+    timing: t.Optional[metrics.Timing] = None,
+) -> Result:
+    """Result of a download streamed to disk, with its manifest entry when caching."""
+    entry = None
+    if options.manifest_path is not None:
+        entry = cache.entry_from_digest(headers, size, sha256)
+    return Result(task, "descargado", entry, digest=digest, timing=timing, size=size)
+
+
+def needs_hash(store, options: Options) -> bool:
+    """Whether the body of a download must be hashed while it streams."""
+    return store is not None or options.manifest_path is not None
+
+
+def stream_body(
+    task: Task,
+    readinto: t.Callable[[memoryview], int],
+    headers: t.Mapping[str, str],
+    buffer: bytearray,
+    store,
+    options: Options,
+    timing: metrics.Timing,
+    start: float,
+) -> Result:
+    """Copy the body of a 200 response to disk through a reusable buffer.
+
+    `readinto` fills the buffer and returns how many bytes it read (0 at the
+    end). Slices of the buffer are hashed and written without copying, into a
+    temporary file that is renamed into place once complete and valid.
+    """
+    view = memoryview(buffer)
+    hasher = hashlib.sha256() if needs_hash(store, options) else None
+    head = b""
+    size = 0
+    timing.write = 0.0
+    tmp_path = temp_path(task, store)
+    try:
+        with open(tmp_path, mode="wb") as f:
+            while True:
+                n = readinto(view)
+                if not n:
+                    break
+                chunk = view[:n]
+                if len(head) < len(utils.PNG_SIGNATURE):
+                    head += bytes(chunk[:len(utils.PNG_SIGNATURE)])
+                if hasher is not None:
+                    hasher.update(chunk)
+                size += n
+                write_start = time.perf_counter()
+                f.write(chunk)
+                timing.write += time.perf_counter() - write_start
+            result = check_response(task, 200, head, headers)
+            if result is None and options.fsync:
+                write_start = time.perf_counter()
+                f.flush()
+                os.fsync(f.fileno())
+                timing.write += time.perf_counter() - write_start
+        if result is not None:
+            os.remove(tmp_path)
+            return result._replace(timing=timing)
+        sha256 = hasher.hexdigest() if hasher is not None else None
+        write_start = time.perf_counter()
+        digest = commit_file(tmp_path, task, store, sha256)
+        timing.write += time.perf_counter() - write_start
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    timing.transfer = time.perf_counter() - start - timing.ttfb - timing.write
+    return streamed(task, headers, size, sha256, options, digest, timing)
+
+
+def throttled(readinto: t.Callable[[memoryview], int], rate_limiter: ratelimit.RateLimiter, url: str):
+    """Wrap `readinto` so the bytes it returns are paced by the rate limiter."""
+    def read(view: memoryview) -> int:
+        n = readinto(view)
+        if n:
+            rate_limiter.consume(url, n)
+        return n
+    return read
+
+
+def download(
+    session,
+    task: Task,
+    store,
+    options: Options,
+    buffers: buffer_pool.BufferPool,
+    rate_limiter: t.Optional[ratelimit.RateLimiter] = None,
+) -> Result:
+    """Fetch a task with a requests-like session and stream it to disk.
+
+    The body is read after the headers so the time to first byte and the
+    transfer are measured separately; it is read through a buffer of the pool,
+    so the memory in flight stays within its budget. With a rate limiter, the
+    request waits for its turn and the body is read no faster than allowed.
+    Network errors are left to the engine.
+    """
+    result = link_known(task, store)
+    if result is not None:
+        return result
+    if rate_limiter is not None:
+        rate_limiter.acquire(task.url)
+    timing = metrics.Timing()
+    start = time.perf_counter()
+    # A connection opened for this request records its DNS and connect phases in `timing`
+    with metrics.measuring(timing), session.get(
+        task.url, headers=task.headers, timeout=options.timeout, stream=True
+    ) as response:
+        timing.ttfb = time.perf_counter() - start
+        if response.status_code == 200:
+            readinto = sessions.raw_readinto(response)
+            if rate_limiter is not None:
+                readinto = throttled(readinto, rate_limiter, task.url)
+            with buffers.buffer() as buffer:
+                result = stream_body(task, readinto, response.headers, buffer, store, options, timing, start)
+        else:
+            content = response.content
+            timing.transfer = time.perf_counter() - start - timing.ttfb
+            result = check_response(task, response.status_code, content, response.headers)._replace(timing=timing)
+    timing.total = time.perf_counter() - start
+    return result
+
+
+def share(result: Result, task: Task, store) -> Result:
+    """Result of a task whose URL was fetched by another task, with outcome `result`.
+
+    The sprite is linked from the path the other task wrote.
+    """
+    if result.status in ("error", "aplazado"):
+        return Result(task, result.status, error=result.error, coalesced=True)
+    try:
+        if result.task.path != task.path:
+            if isinstance(store, archive.ShardWriter):
+                store.link(result.task.path, task.path)
+            else:
+                blob_store.link_file(result.task.path, task.path)
+    except (OSError, KeyError) as e:
+        return Result(task, "error", error=f"No se pudo enlazar la descarga compartida: {e}", coalesced=True)
+    return Result(task, "enlazado", result.entry, digest=result.digest, coalesced=True)
+
+
+def kept_outcome(result: Result) -> t.Optional[Result]:
+    """What a run keeps of a finished transfer, so later rows of its URL link to the file.
+
+    Only what `share` needs is kept, and nothing of a failed transfer: those
+    rows fetch the URL again.
+    """
+    if result.status not in ("descargado", "enlazado"):
+        return None
+    return Result(result.task, result.status, digest=result.digest)
+
+
+def fetch_once(flights: t.Optional[singleflight.SingleFlight], task: Task, store, fetch: t.Callable[[], Result]) -> Result:
+    """Fetch a task, sharing the transfer with every other task for the same URL.
+
+    Only plain GETs are shared: a task whose file exists revalidates its own copy.
+    """
+    if flights is None or task.exists:
+        return fetch()
+    result, shared = flights.do(task.url, fetch)
+    return share(result, task, store) if shared else result
+
+
+async def fetch_once_async(flights: t.Optional[singleflight.SingleFlight], task: Task, store, fetch, writer) -> Result:
+    """Like `fetch_once`, for a coroutine function `fetch`.
+
+    The shared file is linked by `writer` (an `asyncio_.Writer`), off the event loop.
+    """
+    if flights is None or task.exists:
+        return await fetch()
+    result, shared = await flights.do_async(task.url, fetch)
+    return await writer.share(result, task, store) if shared else result
+
+
+def past_deadline(deadline: t.Optional[float]) -> bool:
+    """Whether the wall-clock `deadline` of a job has passed."""
+    return deadline is not None and time.time() >= deadline
+
+
+def deferred(task: Task) -> Result:
+    return Result(task, "aplazado", error="plazo agotado")
+
+
+def retry_policy(options: Options) -> retry.RetryPolicy:
+    return retry.RetryPolicy(options.max_attempts, options.backoff_base, options.backoff_max)
+
+
+def circuit_breaker(options: Options) -> retry.CircuitBreaker:
+    return retry.CircuitBreaker(options.breaker_threshold, options.breaker_reset)
+
+
+def rate_limits(options: Options) -> ratelimit.Limits:
+    return ratelimit.Limits(
+        options.requests_per_second,
+        options.bytes_per_second,
+        options.host_requests_per_second,
+        options.host_bytes_per_second,
+        options.burst_seconds,
+    )
+
+
+def _circuit_open(task: Task) -> Result:
+    return Result(task, "error", error=f"Circuito abierto para {retry.host_of(task.url)}")
+
+
+def _retry_delay(policy: retry.RetryPolicy, attempt: int, result: Result, deadline: t.Optional[float]) -> t.Optional[float]:
+    """Seconds to wait before the next attempt, or None if it would start past the deadline."""
+    delay = policy.delay(attempt, result.retry_after)
+    if deadline is not None and time.time() + delay >= deadline:
+        return None
+    return delay
+
+
+def with_retries(
+    fetch: t.Callable[[], Result],
+    task: Task,
+    policy: retry.RetryPolicy,
+    breaker,
+    deadline: t.Optional[float] = None,
+) -> Result:
+    """Call fetch() until it succeeds, fails for good or attempts run out.
+
+    Requests to a host whose circuit is open fail fast without being sent. A
+    retry that would start past the wall-clock `deadline` is not made: the
+    task is deferred instead.
+    """
+    host = retry.host_of(task.url)
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.allow(host):
+            return _circuit_open(task)
+        result = fetch()
+        if breaker is not None:
+            breaker.record(host, not result.retryable)
+        if not result.retryable or attempt + 1 >= policy.max_attempts:
+            return result._replace(attempts=attempt + 1)
+        delay = _retry_delay(policy, attempt, result, deadline)
+        if delay is None:
+            return deferred(task)._replace(attempts=attempt + 1)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def with_retries_async(
+    fetch, task: Task, policy: retry.RetryPolicy, breaker, deadline: t.Optional[float] = None
+) -> Result:
+    """Like `with_retries`, for a coroutine function `fetch`."""
+    # Only the async engines get here, with asyncio already loaded; importing
+    # it at module level would slow down the start of every other engine
+    import asyncio
+
+    host = retry.host_of(task.url)
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.allow(host):
+            return _circuit_open(task)
+        result = await fetch()
+        if breaker is not None:
+            breaker.record(host, not result.retryable)
+        if not result.retryable or attempt + 1 >= policy.max_attempts:
+            return result._replace(attempts=attempt + 1)
+        delay = _retry_delay(policy, attempt, result, deadline)
+        if delay is None:
+            return deferred(task)._replace(attempts=attempt + 1)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class FailedRows:
+    """Csv of the rows that failed, usable as the input of a rerun.
+
+    It is written next to its final path and moved into place on close, so a
+    rerun may read the previous failures file while producing the new one.
+    """
+
+    FIELDS = ["Pokemon", "Type1", "Sprite", "Error"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, mode="w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.FIELDS)
+
+    def add(self, result: Result):
+        task = result.task
+        self._writer.writerow([task.pokemon, task.type1, task.url, result.error])
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class Job:
+    """State of a single run: inputs, options, cache manifest, store and counts."""
+
+    def __init__(self, output_dir: str, inputs: t.List[str], options: Options):
+        self.output_dir = output_dir
+        self.inputs = inputs
+        self.options = options
+        # Wall clock, so worker processes can check it too
+        self.deadline = time.time() + options.deadline if options.deadline is not None else None
+        self.manifest = cache.open_manifest(options.manifest_path)
+        self.store = open_output(output_dir, options)
+        self.journal = job_journal.open_journal(options.journal_path)
+        self.snapshot = incremental.open_snapshot(options.snapshot_path)
+        self.buffers = buffer_pool.BufferPool(options.memory_budget, options.buffer_size)
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.retry_policy = retry_policy(options)
+        self.breaker = circuit_breaker(options)
+        self.rate_limiter = ratelimit.open_limiter(rate_limits(options))
+        self.flights = singleflight.SingleFlight(kept_outcome) if options.coalesce else None
+        self.coalesced = 0
+        self.priorities = None
+        if options.priority_column:
+            self.priorities = scheduling.read_priorities(inputs, options.priority_column)
+        self.failed = FailedRows(options.failed_path) if options.failed_path else None
+        self.metrics = metrics.Metrics()
+        self.connections = sessions.ConnectionStats(self.metrics)
+        self.processor = image_processor(output_dir, options)
+        self.processed = {"images_processed": 0, "thumbnails_written": 0, "recompress_saved_bytes": 0}
+        self.reporter = metrics.Reporter(
+            self.metrics, options.metrics_path, options.prometheus_path, options.metrics_interval
+        ).start()
+        self._lock = threading.Lock()
+
+    def tasks(self) -> t.Iterator[Task]:
+        """Yield the tasks engines must fetch, in the order of the scheduling policy.
+
+        Files already present are skipped.
+        """
+        done = None
+        if self.journal is not None:
+            job_journal.remove_partial_files(self.journal.unfinished())
+            done = self.journal.done()
+        tree = None
+        if isinstance(self.store, archive.ShardWriter):
+            archive.remove_partial_files(self.output_dir)
+            tree = archive.ArchiveIndex(self.output_dir)
+        entries = catalogue.load(self.inputs, self.options.catalogue_cache)
+        if self.snapshot is not None:
+            entries = self.apply_delta(self.snapshot.diff(entries))
+        pending = self._pending(plan(entries, self.output_dir, self.manifest, done, tree))
+        for task in scheduling.order(pending, self.options.schedule, self):
+            if self.journal is not None:
+                self.journal.mark(task.path, task.url, job_journal.PLANNED)
+            yield task
+
+    def _pending(self, tasks: t.Iterable[Task]) -> t.Iterator[Task]:
+        """Report the tasks whose file is already there; yield the others."""
+        for task in tasks:
+            if task.exists and self.manifest is None:
+                self.report(Result(task, "omitido"))
+            else:
+                yield task
+
+    def apply_delta(self, delta: incremental.Delta) -> t.List[catalogue.Entry]:
+        """Prune deleted rows and move retyped ones; return the entries to fetch."""
+        with self._lock:
+            self.counts["omitido"] += delta.unchanged
+        for pokemon, old_type in delta.deleted:
+            old_path = os.path.join(self.output_dir, old_type, pokemon + ".png")
+            if os.path.exists(old_path):
+                os.remove(old_path)
+            self.report(Result(Task(pokemon, old_type, "", old_path, False, {}), "eliminado"))
+        fetch = list(delta.new)
+        for entry, old_type in delta.changed:
+            old_path = os.path.join(self.output_dir, old_type, entry.pokemon + ".png")
+            if os.path.exists(old_path):
+                os.remove(old_path)
+            fetch.append(entry)
+        for entry, old_type in delta.moved:
+            # The row now lives at its new type; it is recorded there once done
+            self.snapshot.forget(entry.pokemon, old_type)
+            old_path = os.path.join(self.output_dir, old_type, entry.pokemon + ".png")
+            path = os.path.join(self.output_dir, entry.type1, entry.pokemon + ".png")
+            if not os.path.exists(old_path):
+                fetch.append(entry)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(old_path, path)
+            if self.journal is not None:
+                self.journal.mark(old_path, "", job_journal.REMOVED)
+            self.report(Result(Task(entry.pokemon, entry.type1, entry.url, path, True, {}), "movido"))
+        return fetch
+
+    def started(self, task: Task) -> t.Optional[Result]:
+        """Record that an engine starts working on a task.
+
+        Past the deadline the task must not be started: its deferred result is
+        returned, for the engine to report instead of fetching.
+        """
+        if past_deadline(self.deadline):
+            return deferred(task)
+        if self.journal is not None:
+            self.journal.mark(task.path, task.url, job_journal.INFLIGHT)
+        return None
+
+    def limiter(self, limiter_class, maximum: int):
+        """Build the adaptive concurrency limiter of an engine, if enabled."""
+        if not self.options.adaptive:
+            return None
+
+        def on_change(limit):
+            self.metrics.set_gauge("concurrency_limit", limit)
+
+        limiter = limiter_class(initial=ADAPTIVE_INITIAL, maximum=maximum, on_change=on_change)
+        on_change(limiter.limit)
+        return limiter
+
+    def report(self, result: Result):
+        """Account for the result of a task, once post-processed if that is enabled.
+
+        Post-processing happens on a process pool while downloads go on; the
+        result is accounted for when it finishes. Rows linked to a shared
+        download or to the blob store are post-processed on their own: each
+        gets its thumbnails, and each drops its link if the sprite is invalid.
+        """
+        if self.processor is None or not needs_processing(result):
+            self._account(result)
+            return
+        task = result.task
+        self.processor.submit(task.path, task.type1, task.pokemon, lambda processed: self._processed(result, processed))
+
+    def _processed(self, result: Result, processed: images.Processed):
+        task = result.task
+        if processed.error is not None:
+            if self.store is not None:
+                self.store.forget(task.url)
+            result = result._replace(status="error", error=processed.error, entry=None, digest=None)
+        with self._lock:
+            self.processed["images_processed"] += 1
+            self.processed["thumbnails_written"] += processed.thumbnails
+            self.processed["recompress_saved_bytes"] += processed.saved
+            for name, value in self.processed.items():
+                self.metrics.set_gauge(name, value)
+        self._account(result)
+
+    def _account(self, result: Result):
+        task = result.task
+        with self._lock:
+            self.counts[result.status] += 1
+            if result.coalesced:
+                self.coalesced += 1
+                self.metrics.set_gauge("coalesced_requests", self.coalesced)
+            if result.entry is not None and self.manifest is not None:
+                self.manifest.set(task.url, result.entry)
+            if result.digest is not None and self.store is not None:
+                self.store.remember(task.url, result.digest)
+            if result.status in ("error", "aplazado") and self.failed is not None:
+                self.failed.add(result)
+        if self.snapshot is not None:
+            if result.status == "eliminado":
+                self.snapshot.forget(task.pokemon, task.type1)
+            else:
+                self.snapshot.record(task, result.status not in ("error", "aplazado"))
+        if self.journal is not None:
+            if result.status == "error":
+                state = job_journal.FAILED
+            elif result.status == "aplazado":
+                state = job_journal.PLANNED
+            elif result.status == "eliminado":
+                state = job_journal.REMOVED
+            else:
+                state = job_journal.DONE
+            self.journal.mark(task.path, task.url, state, result.error)
+        self.metrics.observe(result.status, result.size, result.timing, result.attempts - 1)
+        if result.status == "error":
+            print(f"❌ Error procesando a {task.pokemon}: {result.error}")
+        elif not self.options.verbose:
+            return
+        elif result.status == "descargado":
+            print(f"Descargado: {task.pokemon}.png en '{task.type1}'")
+        elif result.status == "enlazado":
+            print(f"Enlazado: {task.pokemon}.png en '{task.type1}'")
+        elif result.status == "sin cambios":
+            print(f"Sin cambios: {task.pokemon}.png")
+        elif result.status == "omitido":
+            print(f"Omitido: {task.pokemon}.png ya existe.")
+        elif result.status == "movido":
+            print(f"Movido: {task.pokemon}.png a '{task.type1}'")
+        elif result.status == "eliminado":
+            print(f"Eliminado: {task.pokemon}.png de '{task.type1}'")
+        elif result.status == "aplazado":
+            print(f"Aplazado: {task.pokemon}.png, se agotó el plazo")
+
+    def close(self):
+        """Persist the manifest and the store index, and flush the metrics."""
+        if self.processor is not None:
+            self.processor.close()
+        if self.rate_limiter is not None:
+            self.metrics.set_gauge("rate_limit_wait_seconds", round(self.rate_limiter.waited, 4))
+        self.reporter.stop()
+        if self.failed is not None:
+            self.failed.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.snapshot is not None:
+            self.snapshot.save()
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.store is not None:
+            self.store.save_index()
+
+
+def needs_processing(result: Result) -> bool:
+    """Whether a result wrote a sprite this run: a download, or a link to a shared one or a stored blob.
+
+    Store-linked sprites are never recompressed: `image_processor` turns
+    recompression off whenever a store is used.
+    """
+    return result.status in ("descargado", "enlazado")
+
+
+def image_processor_enabled(options: Options) -> bool:
+    return bool(options.validate or options.recompress or options.thumbnail_sizes)
+
+
+def image_processor(output_dir: str, options: Options) -> t.Optional[images.ImageProcessor]:
+    """Build the post-processing stage, if any post-processing was asked for."""
+    if not image_processor_enabled(options):
+        return None
+    thumbnail_dir = options.thumbnail_dir or os.path.normpath(output_dir) + "-thumbnails"
+    processing = images.ProcessingOptions(
+        # Rewriting a sprite would break its hardlink to the blob store
+        recompress=options.recompress and options.store_dir is None,
+        thumbnail_sizes=tuple(options.thumbnail_sizes),
+        thumbnail_dir=thumbnail_dir,
+    )
+    return images.ImageProcessor(processing, options.process_workers)
+
+
+def load_engine(name: str):
+    """Import the module implementing an engine."""
+    try:
+        module_name = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown engine {name!r}, expected one of {sorted(ENGINES)}") from None
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"Engine {name!r} needs the missing package {e.name!r}") from e
+
+
+def execute(engine: str, output_dir: str, inputs: t.List[str], options: t.Optional[Options] = None) -> dict:
+    """Run a download job with the given engine and return the counts by status.
+
+    The run is profiled when `options.profile` or SPRITES_PROFILE ask for it.
+    """
+    options = options or Options()
+    with profiling.from_env(options.profile, options.profile_dir, options.profile_interval):
+        job = Job(output_dir, inputs, options)
+        try:
+            load_engine(engine).run(job)
+        finally:
+            job.close()
+    return job.counts
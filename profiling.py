@@ -0,0 +1,295 @@
+import collections
+import contextlib
+import csv
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import typing as t
+
+# What a run can be profiled for; "all" selects every kind
+KINDS = ("cprofile", "sample", "threads", "memory")
+
+# Comma-separated kinds (or "all") that turn profiling on without touching the code
+PROFILE_ENV = "SPRITES_PROFILE"
+# Directory of the artifacts; by default a new profile-<time>-<pid> directory
+PROFILE_DIR_ENV = "SPRITES_PROFILE_DIR"
+
+# Seconds between two samples of the stacks and thread clocks
+INTERVAL = 0.01
+
+# Lines of the cProfile and tracemalloc reports
+TOP = 40
+
+
+def parse_kinds(value: t.Union[None, str, t.Iterable[str]]) -> t.Tuple[str, ...]:
+    """Normalize "cprofile,sample", ["all"] and the like to a tuple of KINDS."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split(",")
+    kinds = {kind.strip().lower() for kind in value if kind.strip()}
+    if "all" in kinds:
+        return KINDS
+    unknown = kinds.difference(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown profile kinds {sorted(unknown)}, expected some of {list(KINDS)} or 'all'")
+    return tuple(kind for kind in KINDS if kind in kinds)
+
+
+def default_dir() -> str:
+    return f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """Stack of a frame, root first, as `a;b;c` (flamegraph.pl collapsed format)."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _thread_clock(ident: int) -> t.Optional[int]:
+    """CPU clock of another thread, where the platform exposes one."""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class _ThreadTimes:
+    """CPU and wall time of one thread, as seen by the sampler."""
+
+    __slots__ = ("name", "clock", "first_seen", "last_seen", "cpu_start", "cpu")
+
+    def __init__(self, name: str, clock: t.Optional[int], now: float):
+        self.name = name
+        self.clock = clock
+        self.first_seen = now
+        self.last_seen = now
+        # CPU time the thread had used when first seen; `cpu` is counted from it
+        self.cpu_start = self._read()
+        self.cpu: t.Optional[float] = None if self.cpu_start is None else 0.0
+
+    def _read(self) -> t.Optional[float]:
+        if self.clock is None:
+            return None
+        try:
+            return time.clock_gettime(self.clock)
+        except OSError:  # the thread just exited
+            return None
+
+    def update(self, now: float):
+        self.last_seen = now
+        reading = self._read()
+        if reading is not None and self.cpu_start is not None:
+            self.cpu = reading - self.cpu_start
+
+
+class Profiler:
+    """Profiles a block of code and writes what it found to `run_dir`.
+
+    Each kind writes its own artifacts:
+
+    - cprofile: `cprofile.pstats` (for pstats, snakeviz...) and `cprofile.txt`,
+      the top functions by cumulative time. Threads started inside the block
+      are profiled too.
+    - sample: `stacks.collapsed`, the stacks of every thread sampled every
+      `interval` seconds, ready for flamegraph.pl or speedscope.
+    - threads: `threads.csv`, CPU against wall time of every thread.
+    - memory: `memory.txt`, the lines that allocated most (tracemalloc).
+
+    plus `summary.json` with the wall and CPU time of the whole block. Worker
+    processes are not profiled: only the process that enters the block.
+    """
+
+    def __init__(
+        self,
+        run_dir: str,
+        kinds: t.Iterable[str] = KINDS,
+        interval: float = INTERVAL,
+        top: int = TOP,
+    ):
+        self.run_dir = run_dir
+        self.kinds = parse_kinds(kinds)
+        self.interval = interval
+        self.top = top
+        self._profiles: t.List[t.Any] = []
+        self._profiles_lock = threading.Lock()
+        self._stacks: t.Counter[str] = collections.Counter()
+        self._threads: t.Dict[int, _ThreadTimes] = {}
+        self._stop = threading.Event()
+        self._sampler: t.Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        if "memory" in self.kinds:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+        # The sampler starts first so that cProfile leaves it out
+        if "sample" in self.kinds or "threads" in self.kinds:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        if "cprofile" in self.kinds:
+            import cProfile
+
+            self._profile_type = cProfile.Profile
+            threading.setprofile(self._profile_thread)
+            self._profile_thread()
+
+    def _profile_thread(self, *args):
+        """Start a cProfile profile for the calling thread.
+
+        Installed with threading.setprofile, so that it runs first thing in
+        every new thread; it then replaces itself with the real profiler.
+        """
+        sys.setprofile(None)
+        profile = self._profile_type()
+        try:
+            profile.enable()
+        except ValueError:  # Python 3.12+: the first profile already sees every thread
+            return
+        with self._profiles_lock:
+            self._profiles.append(profile)
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own)
+        self._sample(own)
+
+    def _sample(self, own: int):
+        now = time.perf_counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            name = names.get(ident, str(ident))
+            if "sample" in self.kinds:
+                self._stacks[f"{name};{collapse(frame)}"] += 1
+            if "threads" in self.kinds:
+                times = self._threads.get(ident)
+                if times is None:
+                    self._threads[ident] = _ThreadTimes(name, _thread_clock(ident), now)
+                else:
+                    times.update(now)
+
+    def stop(self):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        os.makedirs(self.run_dir, exist_ok=True)
+        artifacts = []
+        # Memory first, before writing the other reports allocates anything
+        if "memory" in self.kinds:
+            artifacts.append(self._write_memory())
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        if "cprofile" in self.kinds:
+            threading.setprofile(None)
+            artifacts += self._write_cprofile()
+        if self._sampler is not None:
+            if "sample" in self.kinds:
+                artifacts.append(self._write_stacks())
+            if "threads" in self.kinds:
+                artifacts.append(self._write_threads())
+        summary = {"kinds": list(self.kinds), "wall_s": round(wall, 4), "cpu_s": round(cpu, 4), "artifacts": artifacts}
+        with open(os.path.join(self.run_dir, "summary.json"), mode="w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Perfil guardado en {self.run_dir}")
+
+    def _write_cprofile(self) -> t.List[str]:
+        import pstats
+
+        # Profiles of threads that already finished are complete; the one of
+        # this thread is stopped here
+        for profile in self._profiles:
+            profile.disable()
+        path = os.path.join(self.run_dir, "cprofile.pstats")
+        stats = pstats.Stats(*self._profiles)
+        stats.dump_stats(path)
+        report = os.path.join(self.run_dir, "cprofile.txt")
+        with open(report, mode="w") as f:
+            pstats.Stats(path, stream=f).sort_stats("cumulative").print_stats(self.top)
+        return ["cprofile.pstats", "cprofile.txt"]
+
+    def _write_stacks(self) -> str:
+        with open(os.path.join(self.run_dir, "stacks.collapsed"), mode="w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return "stacks.collapsed"
+
+    def _write_threads(self) -> str:
+        with open(os.path.join(self.run_dir, "threads.csv"), mode="w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["thread", "cpu_s", "wall_s", "cpu_ratio"])
+            for times in self._threads.values():
+                wall = times.last_seen - times.first_seen
+                cpu = times.cpu
+                ratio = round(cpu / wall, 4) if cpu is not None and wall > 0 else None
+                writer.writerow([times.name, cpu and round(cpu, 4), round(wall, 4), ratio])
+        return "threads.csv"
+
+    def _write_memory(self) -> str:
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        with open(os.path.join(self.run_dir, "memory.txt"), mode="w") as f:
+            f.write(f"current: {current} bytes, peak: {peak} bytes\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                f.write(f"{stat}\n")
+        return "memory.txt"
+
+
+def from_env(
+    kinds: t.Union[None, str, t.Iterable[str]] = None,
+    run_dir: t.Optional[str] = None,
+    interval: float = INTERVAL,
+) -> t.ContextManager:
+    """A Profiler for the given kinds, or those of SPRITES_PROFILE; a no-op if none.
+
+    Explicit arguments win over the environment variables.
+    """
+    kinds = parse_kinds(kinds or os.environ.get(PROFILE_ENV))
+    if not kinds:
+        return contextlib.nullcontext()
+    run_dir = run_dir or os.environ.get(PROFILE_DIR_ENV) or default_dir()
+    return Profiler(run_dir, kinds, interval)
+
+
+def profiled(
+    kinds: t.Union[None, str, t.Iterable[str]] = None,
+    run_dir: t.Optional[str] = None,
+    interval: float = INTERVAL,
+) -> t.Callable:
+    """Decorator that profiles every call of a function (see `from_env`)."""
+    def decorate(f: t.Callable) -> t.Callable:
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with from_env(kinds, run_dir, interval):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,177 @@
+import threading
+import time
+import typing as t
+
+import retry
+
+
+class TokenBucket:
+    """Tokens refilled at `rate` per second, up to `burst` saved for bursts.
+
+    `reserve` never blocks: it takes the tokens right away, going into debt if
+    needed, and returns how long the caller must wait before using them. So
+    the same bucket paces threads (time.sleep), tasks (asyncio.sleep) and
+    mixes of both.
+    """
+
+    def __init__(self, rate: float, burst: t.Optional[float] = None):
+        self._lock = threading.Lock()
+        self._set(rate, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def configure(self, rate: float, burst: t.Optional[float] = None):
+        """Change the rate and burst; tokens already saved or owed are kept.
+
+        Tokens earned until now are counted at the old rate.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._set(rate, burst)
+
+    def _set(self, rate: float, burst: t.Optional[float]):
+        if rate <= 0:
+            raise ValueError("The rate of a token bucket must be positive")
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens and return the seconds to wait until they are earned."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def try_take(self, tokens: float = 1) -> bool:
+        """Take tokens only if they are available now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+
+class Limits(t.NamedTuple):
+    """Rates of a RateLimiter; None leaves that dimension unlimited."""
+
+    requests_per_second: t.Optional[float] = None
+    bytes_per_second: t.Optional[float] = None
+    host_requests_per_second: t.Optional[float] = None
+    host_bytes_per_second: t.Optional[float] = None
+    # Seconds of rate that may be spent at once after being idle
+    burst_seconds: float = 1.0
+
+    def share(self, parts: int) -> "Limits":
+        """Limits of one of `parts` independent processes that together keep these."""
+        def split(rate):
+            return rate / parts if rate else rate
+        return self._replace(
+            requests_per_second=split(self.requests_per_second),
+            bytes_per_second=split(self.bytes_per_second),
+            host_requests_per_second=split(self.host_requests_per_second),
+            host_bytes_per_second=split(self.host_bytes_per_second),
+        )
+
+
+class RateLimiter:
+    """Global and per-host token buckets for requests and bytes.
+
+    Engines call `acquire` before each request and `consume` as bytes arrive
+    (or their async variants). Limits can be changed while a run goes on
+    with `configure`.
+    """
+
+    def __init__(self, limits: Limits):
+        self._lock = threading.Lock()
+        self._hosts: t.Dict[t.Tuple[str, str], TokenBucket] = {}
+        self.limits = limits
+        self._requests = self._bucket(limits.requests_per_second)
+        self._bytes = self._bucket(limits.bytes_per_second)
+        # Seconds callers were asked to wait so far
+        self.waited = 0.0
+
+    def _bucket(self, rate: t.Optional[float]) -> t.Optional[TokenBucket]:
+        if not rate:
+            return None
+        return TokenBucket(rate, rate * self.limits.burst_seconds)
+
+    def configure(self, limits: Limits):
+        """Apply new limits; buckets keep their saved tokens."""
+        with self._lock:
+            self.limits = limits
+            self._requests = self._reconfigure(self._requests, limits.requests_per_second)
+            self._bytes = self._reconfigure(self._bytes, limits.bytes_per_second)
+            for (kind, host), bucket in list(self._hosts.items()):
+                rate = limits.host_requests_per_second if kind == "requests" else limits.host_bytes_per_second
+                bucket = self._reconfigure(bucket, rate)
+                if bucket is None:
+                    del self._hosts[kind, host]
+                else:
+                    self._hosts[kind, host] = bucket
+
+    def _reconfigure(self, bucket: t.Optional[TokenBucket], rate: t.Optional[float]) -> t.Optional[TokenBucket]:
+        if bucket is None or not rate:
+            return self._bucket(rate)
+        bucket.configure(rate, rate * self.limits.burst_seconds)
+        return bucket
+
+    def _host_bucket(self, kind: str, host: str) -> t.Optional[TokenBucket]:
+        rate = self.limits.host_requests_per_second if kind == "requests" else self.limits.host_bytes_per_second
+        if not rate:
+            return None
+        with self._lock:
+            bucket = self._hosts.get((kind, host))
+            if bucket is None:
+                bucket = self._hosts[kind, host] = self._bucket(rate)
+            return bucket
+
+    def _delay(self, kind: str, url: str, tokens: float) -> float:
+        delay = 0.0
+        for bucket in (self._requests if kind == "requests" else self._bytes, self._host_bucket(kind, retry.host_of(url))):
+            if bucket is not None:
+                delay = max(delay, bucket.reserve(tokens))
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def acquire(self, url: str):
+        """Wait until a request to url may be sent."""
+        delay = self._delay("requests", url, 1)
+        if delay:
+            time.sleep(delay)
+
+    def consume(self, url: str, n: int):
+        """Account for n bytes received from url, waiting if they came too fast."""
+        delay = self._delay("bytes", url, n)
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str):
+        # asyncio is already loaded by the caller's event loop; not at module level,
+        # so that the thread engines do not pay for importing it
+        import asyncio
+
+        delay = self._delay("requests", url, 1)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def consume_async(self, url: str, n: int):
+        import asyncio
+
+        delay = self._delay("bytes", url, n)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def open_limiter(limits: Limits) -> t.Optional[RateLimiter]:
+    """Build a limiter, or return None when nothing is limited."""
+    if not any(limits[:4]):
+        return None
+    return RateLimiter(limits)
@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+import typing as t
+import urllib.parse
+
+
+def parse_retry_after(value: t.Optional[str]) -> t.Optional[float]:
+    """Return the seconds requested by a Retry-After header, if any."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    # HTTP dates are rare; the email package is only loaded for them
+    import email.utils
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """How many times to try a download and how long to wait in between.
+
+    Waits follow exponential backoff with full jitter, unless the server asked
+    for a specific delay with Retry-After.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0, seed=None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, attempt: int, retry_after: t.Optional[float] = None) -> float:
+        """Seconds to wait after the given (zero-based) failed attempt."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After `threshold` consecutive failures a host is "open" and requests to it
+    fail fast for `reset_timeout` seconds; then a single trial request is let
+    through ("half-open") and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures: t.Dict[str, int] = {}
+        self._opened_at: t.Dict[str, float] = {}
+        self._trial: t.Set[str] = set()
+        self._lock = threading.Lock()
+
+    def allow(self, host: str) -> bool:
+        """Whether a request to host may be sent now."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if host in self._trial or time.monotonic() - opened_at < self.reset_timeout:
+                return False
+            self._trial.add(host)
+            return True
+
+    def record(self, host: str, ok: bool):
+        """Account for the outcome of a request to host."""
+        with self._lock:
+            self._trial.discard(host)
+            if ok:
+                self._failures.pop(host, None)
+                self._opened_at.pop(host, None)
+                return
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            if failures >= self.threshold or host in self._opened_at:
+                self._opened_at[host] = time.monotonic()
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._opened_at
+
+
+def host_of(url: str) -> str:
+    """Return the host (and port) a URL points to."""
+    return urllib.parse.urlsplit(url).netloc
@@ -0,0 +1,96 @@
+import csv
+import math
+import typing as t
+
+# A policy builds, for a job, the sort key of its tasks; None keeps csv order
+Policy = t.Callable[[t.Any], t.Optional[t.Callable[[t.Any], t.Any]]]
+
+
+def csv_order(job) -> None:
+    """Tasks in the order of the input rows; the only policy that keeps planning lazy."""
+    return None
+
+
+def small_first(job):
+    """Smallest expected body first, from the sizes in the cache manifest.
+
+    Sprites of unknown size go last, in csv order.
+    """
+    manifest = job.manifest
+
+    def key(task):
+        entry = manifest.get(task.url) if manifest is not None else None
+        size = entry.get("size") if entry else None
+        return math.inf if size is None else size
+
+    return key
+
+
+def by_type(job):
+    """Tasks of the same type together, so each directory is written in one burst.
+
+    Types come in the order they first appear in the input.
+    """
+    order: t.Dict[str, int] = {}
+
+    def key(task):
+        return order.setdefault(task.type1, len(order))
+
+    return key
+
+
+def by_priority(job):
+    """Highest value of the priority column first; rows without one count as 0.
+
+    Priorities are looked up by (type, pokemon), like the output paths, so a
+    pokemon listed under two types can be ranked differently in each.
+    """
+    priorities = job.priorities or {}
+
+    def key(task):
+        return -priorities.get((task.type1, task.pokemon), 0.0)
+
+    return key
+
+
+# Name -> policy; new policies can be registered here
+POLICIES: t.Dict[str, Policy] = {
+    "csv": csv_order,
+    "small-first": small_first,
+    "by-type": by_type,
+    "priority": by_priority,
+}
+
+
+def order(tasks: t.Iterable, policy: str, job) -> t.Iterable:
+    """Return the tasks in the order a policy wants them fetched.
+
+    Sorting is stable, so ties keep csv order.
+    """
+    try:
+        make_key = POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"Unknown scheduling policy {policy!r}, expected one of {sorted(POLICIES)}") from None
+    key = make_key(job)
+    if key is None:
+        return tasks
+    return sorted(tasks, key=key)
+
+
+def read_priorities(inputs: t.List[str], column: str) -> t.Dict[t.Tuple[str, str], float]:
+    """Read a numeric priority column by (type, pokemon), lowercased as in the catalogue.
+
+    Rows with an empty or non-numeric value are left out.
+    """
+    priorities = {}
+    for filepath in inputs:
+        with open(filepath, mode="r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            if column not in (reader.fieldnames or ()):
+                raise ValueError(f"{filepath} has no {column!r} column")
+            for row in reader:
+                try:
+                    priorities[row["Type1"].lower(), row["Pokemon"].lower()] = float(row[column])
+                except (TypeError, ValueError):
+                    continue
+    return priorities
@@ -1,38 +1,42 @@
-import os
 import typing as t
 
 import requests
 
+import pipeline
+import sessions
 import utils
 
 
-def download_and_save_pokemon(session, pokemon, output_dir):
+def download_and_save_pokemon(session, task, store, options, buffers, rate_limiter=None):
     """Download and save a single pokemon."""
-    content = utils.maybe_download_sprite(session, pokemon["Sprite"])
-    if content is not None:
-        target_dir = os.path.join(output_dir, pokemon["Type1"])
-        utils.maybe_create_dir(target_dir)
-        filepath = os.path.join(target_dir, pokemon["Pokemon"] + ".png")
-        utils.write_binary(filepath, content)
+    try:
+        return pipeline.download(session, task, store, options, buffers, rate_limiter)
+    except requests.Timeout as e:
+        return pipeline.Result(task, "error", error=f"Tiempo agotado: {e}", overload=True, retryable=True)
+    except requests.RequestException as e:
+        return pipeline.Result(task, "error", error=f"Error de red: {e}", retryable=True)
 
 
-def dowload_and_save_all_pokemons(pokemons, output_dir):
-    """Download and save all pokemons using a sequentially."""
-    with requests.Session() as session:
-        for p in pokemons:
-            download_and_save_pokemon(session, p, output_dir)
+def run(job):
+    """Download and save all pokemons sequentially, retrying transient failures."""
+    options = job.options
+    with sessions.make_session(1, job.connections, options.keep_alive, options.dns_ttl) as session:
+        for task in job.tasks():
+            result = job.started(task)
+            if result is None:
+                result = pipeline.fetch_once(job.flights, task, job.store, lambda: pipeline.with_retries(
+                    lambda: download_and_save_pokemon(session, task, job.store, job.options, job.buffers, job.rate_limiter),
+                    task, job.retry_policy, job.breaker, job.deadline,
+                ))
+            job.report(result)
+
 
 @utils.timeit
-def main(output_dir: str, inputs: t.List[str]):
+def main(output_dir: str, inputs: t.List[str], **options):
     """Download for all intpus and place them in output_dir."""
-    utils.maybe_create_dir(output_dir)
-    dowload_and_save_all_pokemons(utils.read_pokemons(inputs), output_dir)
-    
+    return pipeline.execute("sequential", output_dir, inputs, pipeline.Options(**options))
+
+
 if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("output_dir", help="directory to store the data")
-    parser.add_argument("inputs", nargs="+", help="list of files with metadata")
-    args = parser.parse_args()
-    utils.maybe_remove_dir(args.output_dir)
-    main(args.output_dir, args.inputs)
\ No newline at end of file
+    import cli
+    cli.main(default_engine="sequential")
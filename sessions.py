@@ -0,0 +1,123 @@
+import socket
+import threading
+import time
+import typing as t
+
+if t.TYPE_CHECKING:
+    import requests
+
+# Seconds a resolved address is reused
+DNS_TTL = 300.0
+
+
+class ConnectionStats:
+    """Counts of requests sent and connections opened, to measure keep-alive reuse.
+
+    When given a Metrics, it keeps the `connections_opened`, `http_requests`
+    and `connection_reuse_ratio` gauges up to date.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.opened = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def reuse_ratio(self) -> t.Optional[float]:
+        """Fraction of requests sent on an already open connection."""
+        if not self.requests:
+            return None
+        return max(0.0, 1 - self.opened / self.requests)
+
+    def add(self, opened: int = 0, requests: int = 0):
+        with self._lock:
+            self.opened += opened
+            self.requests += requests
+            if self.metrics is not None:
+                self.metrics.set_gauge("connections_opened", self.opened)
+                self.metrics.set_gauge("http_requests", self.requests)
+                if self.requests:
+                    self.metrics.set_gauge("connection_reuse_ratio", round(self.reuse_ratio, 4))
+
+
+class DNSCache:
+    """Resolved addresses by host, reused for `ttl` seconds."""
+
+    def __init__(self, ttl: float = DNS_TTL):
+        self.ttl = ttl
+        self._entries: t.Dict[t.Tuple[str, int], t.Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> str:
+        """Return an address of host, resolving it only when the cached one expired."""
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        infos = socket.getaddrinfo(host.strip("[]"), port, 0, socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[key] = (now + self.ttl, address)
+        return address
+
+    def forget(self, host: str, port: int):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+def make_session(
+    pool_size: int,
+    stats: ConnectionStats,
+    keep_alive: bool = True,
+    dns_ttl: float = DNS_TTL,
+) -> "requests.Session":
+    """Build a session whose connection pool fits `pool_size` concurrent requests.
+
+    Without keep-alive every request asks the server to close its connection.
+    A `dns_ttl` of 0 disables the DNS cache.
+    """
+    # requests is imported by the engines that use it, not by the pipeline
+    # (which only needs ConnectionStats), so the other engines start faster
+    import requests
+
+    from adapters import TunedAdapter
+
+    session = requests.Session()
+    dns_cache = DNSCache(dns_ttl) if dns_ttl > 0 else None
+    adapter = TunedAdapter(stats, dns_cache, pool_maxsize=max(1, pool_size))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def raw_readinto(response: "requests.Response") -> t.Callable[[memoryview], int]:
+    """The `readinto` of a streamed response's body, decoded as `iter_content` would.
+
+    Errors of urllib3 are raised as the requests exceptions `iter_content`
+    raises, so a connection dropped mid-body is a retryable network error.
+    """
+    import requests
+    from urllib3 import exceptions
+
+    # Undo any Content-Encoding
+    response.raw.decode_content = True
+    readinto = response.raw.readinto
+
+    def read(view: memoryview) -> int:
+        try:
+            return readinto(view)
+        except exceptions.ReadTimeoutError as e:
+            raise requests.ReadTimeout(e) from e
+        except exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e) from e
+        except exceptions.SSLError as e:
+            raise requests.exceptions.SSLError(e) from e
+
+    return read
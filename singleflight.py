@@ -0,0 +1,106 @@
+import concurrent.futures
+import threading
+import typing as t
+
+
+class _Flight:
+    """A call in progress: its outcome and how many callers still need it."""
+
+    __slots__ = ("future", "waiters")
+
+    def __init__(self):
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs a call once per key and hands its outcome to every caller of that key.
+
+    The first caller of a key leads: it runs the call while the others wait
+    for its result, whether they are threads or asyncio tasks. The outcome
+    is dropped once its last waiter got it; `keep`, if given, is called with
+    it then, and what it returns (unless None) is what later callers of the
+    key get instead of running anything. If the leader raises, the key is
+    forgotten and the callers that were waiting try again, one of them leading.
+    """
+
+    def __init__(self, keep: t.Optional[t.Callable[[t.Any], t.Any]] = None):
+        self._lock = threading.Lock()
+        self._flights: t.Dict[t.Hashable, _Flight] = {}
+        self._keep = keep
+        self._kept: t.Dict[t.Hashable, t.Any] = {}
+
+    def _claim(self, key: t.Hashable) -> t.Tuple[_Flight, bool]:
+        """Return the flight of the key's outcome and whether the caller leads it."""
+        with self._lock:
+            if key in self._kept:
+                # Not registered: the caller's `_leave` does nothing
+                flight = _Flight()
+                flight.future.set_result(self._kept[key])
+                return flight, False
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            flight.waiters += 1
+            return flight, leader
+
+    def _leave(self, key: t.Hashable, flight: _Flight):
+        """A caller got the outcome; the last one drops it (or keeps what `keep` returns)."""
+        with self._lock:
+            flight.waiters -= 1
+            if flight.waiters > 0 or self._flights.get(key) is not flight:
+                return
+            del self._flights[key]
+            if self._keep is not None and flight.future.exception() is None:
+                kept = self._keep(flight.future.result())
+                if kept is not None:
+                    self._kept[key] = kept
+
+    def _failed(self, key: t.Hashable, flight: _Flight, error: BaseException):
+        with self._lock:
+            del self._flights[key]
+        flight.future.set_exception(error)
+
+    def do(self, key: t.Hashable, fn: t.Callable[[], t.Any]) -> t.Tuple[t.Any, bool]:
+        """Return the outcome of fn for key and whether it came from another caller."""
+        while True:
+            flight, leader = self._claim(key)
+            if leader:
+                try:
+                    value = fn()
+                except BaseException as e:
+                    self._failed(key, flight, e)
+                    raise
+                flight.future.set_result(value)
+                self._leave(key, flight)
+                return value, False
+            try:
+                return flight.future.result(), True
+            except Exception:
+                continue
+            finally:
+                self._leave(key, flight)
+
+    async def do_async(self, key: t.Hashable, fn: t.Callable[[], t.Awaitable]) -> t.Tuple[t.Any, bool]:
+        """Like `do`, for a coroutine function fn."""
+        import asyncio
+
+        while True:
+            flight, leader = self._claim(key)
+            if leader:
+                try:
+                    value = await fn()
+                except BaseException as e:
+                    self._failed(key, flight, e)
+                    raise
+                flight.future.set_result(value)
+                self._leave(key, flight)
+                return value, False
+            try:
+                # Shielded: a waiter being cancelled must not cancel the leader's outcome
+                return await asyncio.shield(asyncio.wrap_future(flight.future)), True
+            except Exception:
+                continue
+            finally:
+                self._leave(key, flight)
@@ -0,0 +1,137 @@
+import errno
+import json
+import os
+import shutil
+import threading
+import typing as t
+
+import utils
+
+# ioctl request number of FICLONE on Linux (reflink a whole file)
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Try to clone src into dst sharing its extents; return whether it worked."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, mode="rb") as fsrc, open(dst, mode="wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def link_file(src: str, dest: str):
+    """Make dest a hardlink to src (a reflink or a copy when hardlinks are not possible).
+
+    dest is replaced atomically if it exists.
+    """
+    tmp_path = utils.temp_path(dest)
+    try:
+        os.link(src, tmp_path)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        if not _reflink(src, tmp_path):
+            shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+class BlobStore:
+    """Content-addressed store of sprite bytes.
+
+    Each distinct content is written once under its sha256 and every output path
+    becomes a hardlink to it (a reflink or a copy when hardlinks are not
+    possible). A URL to hash index lets already resolved URLs skip the network.
+    """
+
+    INDEX_NAME = "urls.json"
+
+    def __init__(self, root: str, fsync: bool = True):
+        self.root = root
+        self.fsync = fsync
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self.index_path = os.path.join(root, self.INDEX_NAME)
+        self.urls: t.Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, mode="r") as f:
+                self.urls = json.load(f)
+
+    def blob_path(self, digest: str) -> str:
+        """Return where the blob with a given hash lives."""
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def adopt(self, tmp_path: str, digest: str):
+        """Move a finished temporary file with a known hash into the store."""
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # The store lives on another filesystem: copy next to the blob first
+            blob_tmp_path = utils.temp_path(path)
+            shutil.copyfile(tmp_path, blob_tmp_path)
+            os.replace(blob_tmp_path, path)
+            os.remove(tmp_path)
+
+    def link(self, digest: str, dest: str):
+        """Make dest point to a stored blob, replacing dest if it exists."""
+        link_file(self.blob_path(digest), dest)
+
+    def lookup(self, url: str) -> t.Optional[str]:
+        """Return the hash a URL resolved to, if its blob is still stored."""
+        with self._lock:
+            digest = self.urls.get(url)
+        if digest is not None and os.path.exists(self.blob_path(digest)):
+            return digest
+        return None
+
+    def remember(self, url: str, digest: str):
+        """Record that a URL resolved to some hash."""
+        with self._lock:
+            self.urls[url] = digest
+
+    def forget(self, url: str):
+        """Drop what a URL resolved to, e.g. because its content turned out invalid."""
+        with self._lock:
+            self.urls.pop(url, None)
+
+    def link_known(self, url: str, dest: str) -> bool:
+        """Link dest to the blob of an already resolved URL, without any fetch."""
+        digest = self.lookup(url)
+        if digest is None:
+            return False
+        self.link(digest, dest)
+        return True
+
+    def save_file(self, url: str, tmp_path: str, digest: str, dest: str):
+        """Store a body that was streamed to a temporary file and link it at dest."""
+        self.adopt(tmp_path, digest)
+        self.remember(url, digest)
+        self.link(digest, dest)
+
+    def save_index(self):
+        """Persist the URL to hash index."""
+        with self._lock:
+            data = json.dumps(self.urls, sort_keys=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, mode="w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+
+
+def open_store(root: t.Optional[str], fsync: bool = True) -> t.Optional[BlobStore]:
+    """Open the blob store at root, or return None when deduplication is disabled."""
+    return BlobStore(root, fsync) if root else None
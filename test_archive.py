@@ -0,0 +1,99 @@
+import os
+import tarfile
+import tempfile
+import unittest
+
+import archive
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, writer, type1, name, content):
+        src = os.path.join(self.root, name + ".src")
+        with open(src, "wb") as f:
+            f.write(content)
+        return writer.add_file(type1, name, src)
+
+    def test_shards_are_valid_tars_and_read_back_through_the_index(self):
+        writer = archive.ShardWriter(self.root, shard_size=4096, prefix="a", fsync=False)
+        sprites = {("fire", f"p{i}.png"): bytes([i]) * (700 + i) for i in range(6)}
+        for (type1, name), content in sprites.items():
+            self.add(writer, type1, name, content)
+        writer.close()
+
+        shards = sorted(n for n in os.listdir(self.root) if n.endswith(".tar"))
+        self.assertGreater(len(shards), 1)
+        for shard in shards:
+            self.assertLessEqual(os.path.getsize(os.path.join(self.root, shard)), 4096 + 2 * archive.BLOCK)
+            with tarfile.open(os.path.join(self.root, shard)) as tar:
+                for member in tar.getmembers():
+                    type1, name = member.name.split("/")
+                    self.assertEqual(tar.extractfile(member).read(), sprites[type1, name])
+
+        with archive.ArchiveReader(self.root) as reader:
+            self.assertEqual(len(reader.index), len(sprites))
+            self.assertEqual(reader.index.files("fire"), {name for _, name in sprites})
+            for (type1, name), content in sprites.items():
+                view = reader.get(type1, name)
+                self.assertEqual(view, content)
+                view.release()
+            with self.assertRaises(KeyError):
+                reader.get("water", "p0.png")
+
+    def test_later_entries_win_across_writers(self):
+        first = archive.ShardWriter(self.root, prefix="a", fsync=False)
+        self.add(first, "fire", "p.png", b"old")
+        first.close()
+        second = archive.ShardWriter(self.root, prefix="b", fsync=False)
+        self.add(second, "fire", "p.png", b"new")
+        second.close()
+        # A new writer with the same prefix starts a new shard
+        again = archive.ShardWriter(self.root, prefix="b", fsync=False)
+        self.add(again, "grass", "q.png", b"more")
+        again.close()
+        self.assertTrue(os.path.exists(os.path.join(self.root, "shard-b-00002.tar")))
+        with archive.ArchiveReader(self.root) as reader:
+            self.assertEqual(bytes(reader.get("fire", "p.png")), b"new")
+            self.assertEqual(bytes(reader.get("grass", "q.png")), b"more")
+
+    def test_newest_entry_wins_whatever_the_index_names(self):
+        # "9" sorts after "10", but the writer with prefix "10" is the newer one
+        older = archive.ShardWriter(self.root, prefix="9", fsync=False)
+        self.add(older, "fire", "p.png", b"OLD")
+        older.close()
+        newer = archive.ShardWriter(self.root, prefix="10", fsync=False)
+        self.add(newer, "fire", "p.png", b"NEW")
+        newer.close()
+        with archive.ArchiveReader(self.root) as reader:
+            self.assertEqual(bytes(reader.get("fire", "p.png")), b"NEW")
+            self.assertEqual(len(reader.index), 1)
+
+    def test_truncated_index_line_is_ignored(self):
+        writer = archive.ShardWriter(self.root, prefix="a", fsync=False)
+        self.add(writer, "fire", "p.png", b"data")
+        writer.close()
+        with open(os.path.join(self.root, "index-a.jsonl"), "a") as f:
+            f.write('{"type": "fire", "na')
+        self.assertEqual(len(archive.ArchiveIndex(self.root)), 1)
+
+    def test_save_file_removes_the_temporary(self):
+        writer = archive.ShardWriter(self.root, prefix="a", fsync=False)
+        dest = os.path.join(self.root, "fire", "p.png")
+        tmp_path = writer.temp_path(dest)
+        self.assertEqual(os.path.dirname(tmp_path), writer.partial_dir)
+        with open(tmp_path, "wb") as f:
+            f.write(b"data")
+        writer.save_file("http://x/p.png", tmp_path, None, dest)
+        writer.close()
+        self.assertFalse(os.path.exists(tmp_path))
+        self.assertIn(("fire", "p.png"), archive.ArchiveIndex(self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
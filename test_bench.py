@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import requests
+
+import bench
+import utils
+from mockserver import MockSpriteServer, synthetic_png
+
+
+class TestMockServer(unittest.TestCase):
+    def test_synthetic_png_has_requested_size(self):
+        content = synthetic_png(4096, seed=1)
+        self.assertTrue(utils.is_png(content))
+        self.assertEqual(len(content), 4096)
+
+    def test_error_rate_and_validators(self):
+        with MockSpriteServer(error_rate=1.0) as server:
+            self.assertEqual(requests.get(server.url("a.png")).status_code, 503)
+        with MockSpriteServer() as server:
+            first = requests.get(server.url("a.png"))
+            again = requests.get(server.url("a.png"), headers={"If-None-Match": first.headers["ETag"]})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(server.statuses, {200: 1, 304: 1})
+
+    def test_quota_answers_429_for_a_penalty(self):
+        with MockSpriteServer(quota=1, quota_burst=2, quota_penalty=5) as server:
+            statuses = [requests.get(server.url("a.png")).status_code for _ in range(4)]
+            self.assertEqual(statuses, [200, 200, 429, 429])
+            throttled = requests.get(server.url("a.png"))
+            self.assertLessEqual(int(throttled.headers["Retry-After"]), 5)
+
+
+class TestBench(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(bench.percentile(values, 50), 50)
+        self.assertEqual(bench.percentile(values, 99), 99)
+        self.assertIsNone(bench.percentile([], 50))
+
+    def test_benchmark_writes_results(self):
+        results = bench.benchmark(["thread"], [2], [10])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["downloaded"], 10)
+        self.assertEqual(results[0]["requests"], 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path, csv_path = os.path.join(tmp, "r.json"), os.path.join(tmp, "r.csv")
+            bench.write_results(results, json_path, csv_path)
+            self.assertTrue(os.path.getsize(json_path) and os.path.getsize(csv_path))
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   utils\n"
+            "import time:        80 |        200 | cli\n"
+        )
+        self.assertEqual(bench.parse_importtime(stderr), [
+            bench.ImportTime("utils", 120, 120, 1),
+            bench.ImportTime("cli", 80, 200, 0),
+        ])
+
+    def test_profile_imports(self):
+        results = bench.profile_imports(["cli"])
+        self.assertEqual(len(results), 1)
+        self.assertGreater(results[0]["import_ms"], 0)
+        self.assertIn("pipeline", results[0]["heaviest"])
+
+
+class TestStartup(unittest.TestCase):
+    def _loaded(self, module: str, candidates) -> list:
+        """Which of the candidate modules a fresh interpreter has loaded after importing module."""
+        code = f"import sys, {module}; print(' '.join(m for m in {list(candidates)!r} if m in sys.modules))"
+        completed = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        )
+        return completed.stdout.split()
+
+    def test_cli_does_not_load_engine_dependencies(self):
+        heavy = ["requests", "urllib3", "asyncio", "aiohttp", "httpx", "PIL", "sqlite3", "tarfile"]
+        self.assertEqual(self._loaded("cli", heavy), [])
+
+    def test_engines_load_only_their_client(self):
+        clients = ["requests", "asyncio", "aiohttp", "httpx"]
+        for module in ("sequential", "threading_", "multiprocessing_"):
+            with self.subTest(module=module):
+                self.assertEqual(self._loaded(module, clients), ["requests"])
+        self.assertEqual(self._loaded("http2_", clients), ["asyncio", "httpx"])
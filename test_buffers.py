@@ -0,0 +1,38 @@
+import threading
+import unittest
+
+import buffers
+
+
+class TestBufferPool(unittest.TestCase):
+    def test_buffers_are_reused(self):
+        pool = buffers.BufferPool(budget=1024, buffer_size=256)
+        with pool.buffer() as first:
+            pass
+        with pool.buffer() as second:
+            self.assertIs(first, second)
+
+    def test_budget_caps_buffers_in_use(self):
+        pool = buffers.BufferPool(budget=512, buffer_size=256)
+        self.assertEqual(pool.capacity, 2)
+        held = [pool.acquire(), pool.acquire()]
+        acquired = threading.Event()
+
+        def take():
+            pool.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=take)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        pool.release(held.pop())
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_budget_smaller_than_a_buffer_still_allows_one(self):
+        pool = buffers.BufferPool(budget=10, buffer_size=256)
+        self.assertEqual(len(pool.acquire()), 256)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cache
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "manifest.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_conditional_headers_send_the_stored_validators(self):
+        self.assertEqual(cache.conditional_headers(None), {})
+        self.assertEqual(cache.conditional_headers({"etag": None, "last_modified": None}), {})
+        entry = cache.entry_from_digest({"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, 12, "ff")
+        self.assertEqual(entry, {
+            "etag": '"abc"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT", "size": 12, "sha256": "ff",
+        })
+        self.assertEqual(cache.conditional_headers(entry), {
+            "If-None-Match": '"abc"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+        })
+
+    def test_entries_survive_reopening(self):
+        with cache.open_manifest(self.path) as manifest:
+            manifest.set("http://x/a.png", cache.entry_from_digest({"ETag": '"a"'}, 3, "aa"))
+        manifest = cache.Manifest(self.path)
+        self.assertEqual(manifest.get("http://x/a.png")["sha256"], "aa")
+        self.assertEqual(manifest.conditional_headers("http://x/a.png"), {"If-None-Match": '"a"'})
+        self.assertEqual(manifest.conditional_headers("http://x/b.png"), {})
+        self.assertEqual(os.listdir(self.workdir), ["manifest.json"])
+
+    def test_caching_can_be_disabled(self):
+        self.assertIsNone(cache.open_manifest(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import glob
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import catalogue
+import utils
+
+
+class TestCatalogue(unittest.TestCase):
+    inputs = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "*.csv")))
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_matches_read_pokemons(self):
+        expected = [
+            catalogue.Entry(row["Pokemon"], row["Type1"], row["Sprite"].strip())
+            for row in utils.read_pokemons(self.inputs)
+            if row["Pokemon"] and row["Type1"] and row["Sprite"].strip()
+        ]
+        self.assertEqual(list(catalogue.load(self.inputs)), expected)
+
+    def test_urls_are_deduplicated(self):
+        c = catalogue.load(self.inputs + self.inputs)
+        self.assertEqual(len(c), 2 * len(c.urls))
+        first, second = list(c)[0], list(c)[len(c.urls)]
+        self.assertIs(first.url, second.url)
+
+    def test_rows_with_missing_fields_are_dropped(self):
+        path = os.path.join(self.workdir, "rows.csv")
+        with open(path, mode="w") as f:
+            f.write("Number,Pokemon,Type1,Sprite\n1,Bulbasaur,GRASS,http://x/b.png\n2,,FIRE,http://x/c.png\n3,Short\n")
+        self.assertEqual(list(catalogue.load([path])), [catalogue.Entry("bulbasaur", "grass", "http://x/b.png")])
+
+    def test_inputs_without_the_needed_columns_are_rejected(self):
+        path = os.path.join(self.workdir, "rows.csv")
+        with open(path, mode="w") as f:
+            f.write("Pokemon,Type,Sprite\nBulbasaur,GRASS,http://x/b.png\n")
+        with self.assertRaisesRegex(ValueError, "Type1"):
+            catalogue.load([path])
+
+    def test_cache_is_reused_until_inputs_change(self):
+        path = os.path.join(self.workdir, "rows.csv")
+        with open(path, mode="w") as f:
+            f.write("Pokemon,Type1,Sprite\nBulbasaur,GRASS,http://x/b.png\n")
+        cache_dir = os.path.join(self.workdir, "cache")
+        catalogue.load([path], cache_dir)
+        (cache_file,) = os.listdir(cache_dir)
+        # A cached catalogue is returned as is, without parsing the csv
+        cached = catalogue.Catalogue()
+        cached.add("cached", "grass", "http://x/cached.png")
+        with open(os.path.join(cache_dir, cache_file), mode="wb") as f:
+            pickle.dump(cached, f)
+        self.assertEqual([e.pokemon for e in catalogue.load([path], cache_dir)], ["cached"])
+        with open(path, mode="a") as f:
+            f.write("Charmander,FIRE,http://x/c.png\n")
+        self.assertEqual([e.pokemon for e in catalogue.load([path], cache_dir)], ["bulbasaur", "charmander"])
+        # The copy of the csv before it changed is replaced, not kept
+        self.assertNotIn(cache_file, os.listdir(cache_dir))
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import bench
+import cli
+import pipeline
+from layouts import actual_layout, expected_layout
+from mockserver import MockSpriteServer
+
+
+def _options(*argv):
+    return cli.options_from_args(cli.build_parser().parse_args(["output", "data.csv", *argv]))
+
+
+class TestCli(unittest.TestCase):
+    def test_defaults_are_the_pipeline_defaults(self):
+        self.assertEqual(_options(), pipeline.Options())
+
+    def test_flags_map_to_options(self):
+        options = _options(
+            "--workers", "8", "--max-connections", "4", "--chunk-size", "16", "--threads-per-process", "2",
+            "--no-keep-alive", "--no-coalesce", "--no-fsync", "--manifest", "m.json", "--store", "blobs",
+            "--retries", "5", "--backoff-max", "2.5", "--thumbnails", "32", "64", "--format", "tar",
+            "--incremental", "s.json",
+        )
+        self.assertEqual(options.workers, 8)
+        self.assertEqual(options.max_connections, 4)
+        self.assertEqual(options.chunk_size, 16)
+        self.assertEqual(options.threads_per_process, 2)
+        self.assertFalse(options.keep_alive)
+        self.assertFalse(options.coalesce)
+        self.assertFalse(options.fsync)
+        self.assertEqual(options.manifest_path, "m.json")
+        self.assertEqual(options.store_dir, "blobs")
+        self.assertEqual(options.max_attempts, 5)
+        self.assertEqual(options.backoff_max, 2.5)
+        self.assertEqual(options.thumbnail_sizes, (32, 64))
+        self.assertEqual(options.output_format, "tar")
+        self.assertEqual(options.snapshot_path, "s.json")
+
+    def test_unknown_engine_is_rejected(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            cli.build_parser().parse_args(["output", "data.csv", "--engine", "gpu"])
+        self.assertEqual(cli.build_parser("async").parse_args(["output", "data.csv"]).engine, "async")
+
+
+class TestMain(unittest.TestCase):
+    size = 12
+
+    def setUp(self):
+        self.server = MockSpriteServer().start()
+        self.workdir = tempfile.mkdtemp()
+        self.inputs = [os.path.join(self.workdir, "dataset.csv")]
+        bench.make_dataset(self.inputs[0], self.size, self.server)
+        self.output_dir = os.path.join(self.workdir, "output")
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.workdir)
+
+    def test_main_runs_the_selected_engine(self):
+        # --clean removes what a previous run left
+        os.makedirs(os.path.join(self.output_dir, "stale"))
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            counts = cli.main([self.output_dir, *self.inputs, "--clean", "--engine", "thread", "--workers", "2"])
+        self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+        self.assertIn(f"descargado: {self.size}", out.getvalue())
+        self.assertEqual(self.server.statuses, {200: self.size})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import unittest
+
+import concurrency
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+    def test_increases_while_latency_is_stable(self):
+        limiter = concurrency.ThreadLimiter(initial=2, maximum=5)
+        for _ in range(50):
+            limiter.release(limiter.acquire(), latency=0.01)
+        self.assertEqual(limiter.limit, 5)
+
+    def test_backs_off_once_per_epoch(self):
+        changes = []
+        limiter = concurrency.ThreadLimiter(initial=8, maximum=8, on_change=changes.append)
+        tokens = [limiter.acquire() for _ in range(4)]
+        for token in tokens:
+            limiter.release(token, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(changes, [4, 2])
+
+    def test_decreases_when_latency_degrades(self):
+        limiter = concurrency.ThreadLimiter(initial=3, maximum=3)
+        for _ in range(3):
+            limiter.release(limiter.acquire(), latency=0.01)
+        for _ in range(3):
+            limiter.release(limiter.acquire(), latency=1.0)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_thread_limiter_bounds_in_flight(self):
+        limiter = concurrency.ThreadLimiter(initial=2, maximum=2)
+        in_flight, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            token = limiter.acquire()
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            with lock:
+                in_flight[0] -= 1
+            limiter.release(token, latency=0.01)
+
+        threads = [threading.Thread(target=work) for _ in range(20)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertLessEqual(peak[0], 2)
+
+    def test_async_limiter_bounds_in_flight(self):
+        limiter = concurrency.AsyncLimiter(initial=3, maximum=3)
+        in_flight, peak = [0], [0]
+
+        async def work():
+            token = await limiter.acquire()
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.001)
+            in_flight[0] -= 1
+            await limiter.release(token, latency=0.001)
+
+        async def main():
+            await asyncio.gather(*(work() for _ in range(30)))
+
+        asyncio.run(main())
+        self.assertEqual(peak[0], 3)
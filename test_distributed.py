@@ -0,0 +1,92 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.connection import Client
+from unittest import mock
+
+import bench
+import catalogue
+import distributed
+import pipeline
+from layouts import actual_layout, expected_layout
+from mockserver import MockSpriteServer
+
+
+class TestDistributed(unittest.TestCase):
+    size = 60
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockSpriteServer().start()
+        cls.workdir = tempfile.mkdtemp()
+        cls.inputs = [os.path.join(cls.workdir, "dataset.csv")]
+        bench.make_dataset(cls.inputs[0], cls.size, cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.workdir)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(dir=self.workdir)
+        self.server.reset_stats()
+
+    def test_partitions_keep_each_path_in_one_shard(self):
+        entries = list(catalogue.load(self.inputs))
+        by_type = distributed.partition(entries, "type")
+        self.assertEqual(len(by_type), len(bench.TYPES))
+        self.assertTrue(all(len({row[1] for row in shard}) == 1 for shard in by_type))
+        by_hash = distributed.partition(entries, "hash", shards=4)
+        self.assertEqual(by_hash, distributed.partition(entries, "hash", shards=4))
+        self.assertEqual(sum(map(len, by_hash)), self.size)
+
+    def test_workers_merge_into_one_tree(self):
+        for partition_by in distributed.PARTITIONS:
+            with self.subTest(partition=partition_by):
+                shutil.rmtree(self.output_dir)
+                self.server.reset_stats()
+                counts = distributed.run_local(
+                    self.output_dir, self.inputs, nodes=3, partition_by=partition_by, shards=5,
+                    options=pipeline.Options(workers=2),
+                )
+                self.assertEqual(counts["descargado"], self.size)
+                self.assertEqual(self.server.statuses, {200: self.size})
+                self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+
+    def test_shard_of_a_lost_worker_is_handed_out_again(self):
+        authkey = b"secret"
+        shards = distributed.partition(catalogue.load(self.inputs), "hash", shards=3)
+        with distributed.Coordinator(shards, authkey) as coordinator:
+            with Client(coordinator.address, authkey=authkey) as conn:
+                conn.send(("ready", "lost"))
+                conn.recv()  # takes a shard and disconnects without reporting
+            counts = distributed.work(coordinator.address, authkey, self.output_dir, "thread", pipeline.Options(workers=2))
+            self.assertTrue(coordinator.wait(timeout=5))
+        self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(coordinator.counts["descargado"], self.size)
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+
+    def test_local_workers_refuse_shared_state_files(self):
+        with self.assertRaises(ValueError):
+            distributed.run_local(self.output_dir, self.inputs, options=pipeline.Options(manifest_path="m.json"))
+
+    def test_workers_refuse_options_they_cannot_honour(self):
+        for name, value in (
+            ("snapshot_path", "s.json"), ("failed_path", "failed.csv"), ("deadline", 60), ("output_format", "tar"),
+        ):
+            options = pipeline.Options(**{name: value})
+            with self.subTest(option=name):
+                with self.assertRaises(ValueError):
+                    distributed.work(("127.0.0.1", 1), b"key", self.output_dir, "thread", options)
+                with self.assertRaises(ValueError):
+                    distributed.run_local(self.output_dir, self.inputs, options=options)
+        with mock.patch.dict(os.environ, {distributed.AUTHKEY_ENV: "key"}), \
+                contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            distributed.cli_main(["worker", "127.0.0.1:1", self.output_dir, "--deadline", "60"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,559 @@
+import csv
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import archive
+import bench
+import journal
+import multiprocessing_
+import pipeline
+import profiling
+from layouts import actual_layout, expected_layout
+from mockserver import MockH2SpriteServer, MockSpriteServer
+
+
+HAS_HTTP2 = all(importlib.util.find_spec(name) for name in ("httpx", "h2"))
+
+# Engines that speak HTTP/1.1 to the mock server; http2 is tested against MockH2SpriteServer
+HTTP1_ENGINES = [engine for engine in pipeline.ENGINES if engine != "http2"]
+
+
+class TestEngines(unittest.TestCase):
+    size = 40
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockSpriteServer().start()
+        cls.workdir = tempfile.mkdtemp()
+        cls.inputs = [os.path.join(cls.workdir, "dataset.csv")]
+        bench.make_dataset(cls.inputs[0], cls.size, cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.workdir)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(dir=self.workdir)
+        self.server.reset_stats()
+
+    def _execute(self, engine, **options):
+        return pipeline.execute(engine, self.output_dir, self.inputs, pipeline.Options(workers=4, **options))
+
+    def test_engines_writeexpected_layout(self):
+        for engine in HTTP1_ENGINES:
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                counts = self._execute(engine)
+                self.assertEqual(counts["descargado"], self.size)
+                self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+
+    def test_process_engine_runs_a_pool_of_pooled_sessions(self):
+        with mock.patch("multiprocessing_.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool:
+            counts = multiprocessing_.main(self.output_dir, self.inputs, workers=2, threads_per_process=3, chunk_size=5)
+        self.assertEqual(pool.call_args.kwargs["max_workers"], 2)
+        self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+        # Each process reuses the connections of its own session
+        self.assertLessEqual(self.server.connections, 2 * 3)
+
+    def test_existing_files_are_skipped(self):
+        self._execute("thread")
+        counts = self._execute("thread")
+        self.assertEqual(counts["omitido"], self.size)
+
+    def test_warm_mirror_is_planned_without_per_item_stats(self):
+        self._execute("thread")
+        real_stat = os.stat
+        with mock.patch("os.stat", side_effect=real_stat) as stat:
+            counts = self._execute("thread")
+        self.assertEqual(counts["omitido"], self.size)
+        self.assertLess(stat.call_count, len(bench.TYPES))
+
+    def test_manifest_turns_refresh_into_not_modified(self):
+        manifest_path = os.path.join(self.output_dir + ".manifest.json")
+        for engine in HTTP1_ENGINES:
+            with self.subTest(engine=engine):
+                self._execute(engine, manifest_path=manifest_path)
+                counts = self._execute(engine, manifest_path=manifest_path)
+                self.assertEqual(counts["sin cambios"], self.size)
+
+    def test_store_links_already_resolved_urls(self):
+        store_dir = self.output_dir + ".store"
+        self._execute("async", store_dir=store_dir)
+        shutil.rmtree(self.output_dir)
+        self.server.reset_stats()
+        counts = self._execute("process", store_dir=store_dir)
+        self.assertEqual(counts["enlazado"], self.size)
+        self.assertEqual(self.server.latencies, [])
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+        sprite = os.path.join(self.output_dir, "grass", "pokemon000000.png")
+        self.assertEqual(os.stat(sprite).st_nlink, 2)
+
+    def test_journal_resumes_interrupted_run(self):
+        journal_path = self.output_dir + ".sqlite"
+        self._execute("thread", journal_path=journal_path)
+        # Simulate a crash: one sprite in flight with a partial temporary file
+        sprite = os.path.join(self.output_dir, "grass", "pokemon000000.png")
+        os.remove(sprite)
+        partial = sprite + ".123.456.tmp"
+        with open(partial, mode="wb") as f:
+            f.write(b"partial")
+        j = journal.Journal(journal_path)
+        j.mark(sprite, self.server.url("sprites/pokemon000000.png"), journal.INFLIGHT)
+        j.close()
+        self.server.reset_stats()
+        counts = self._execute("async", journal_path=journal_path)
+        self.assertEqual(counts["descargado"], 1)
+        self.assertEqual(counts["omitido"], self.size - 1)
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+
+    def test_incremental_processes_only_the_delta(self):
+        snapshot_path = self.output_dir + ".snapshot.json"
+        self._execute("thread", snapshot_path=snapshot_path)
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "delta.csv")]
+        del rows[1]  # pokemon000000 is deleted
+        rows[1][2] = self.server.url("sprites/v2/pokemon000001.png")  # new URL
+        rows[2][1] = "GRASS"  # pokemon000002 changes from water to grass
+        rows.append(["pokemon999999", "FIRE", self.server.url("sprites/pokemon999999.png")])
+        with open(inputs[0], mode="w", newline="") as f:
+            csv.writer(f).writerows(rows)
+        self.server.reset_stats()
+        options = pipeline.Options(workers=4, snapshot_path=snapshot_path)
+        counts = pipeline.execute("async", self.output_dir, inputs, options)
+        self.assertEqual(counts["descargado"], 2)
+        self.assertEqual(counts["movido"], 1)
+        self.assertEqual(counts["eliminado"], 1)
+        self.assertEqual(counts["omitido"], self.size - 3)
+        self.assertEqual(len(self.server.latencies), 2)
+        layout = actual_layout(self.output_dir)
+        self.assertNotIn("pokemon000000.png", layout["grass"])
+        self.assertIn("pokemon000002.png", layout["grass"])
+        self.assertNotIn("pokemon000002.png", layout["water"])
+        self.assertIn("pokemon999999.png", layout["fire"])
+
+    def test_large_bodies_stream_through_a_small_budget(self):
+        with MockSpriteServer(payload_size=256 * 1024) as server:
+            bench.make_dataset(os.path.join(self.workdir, "large.csv"), 8, server)
+            inputs = [os.path.join(self.workdir, "large.csv")]
+            for engine in HTTP1_ENGINES:
+                with self.subTest(engine=engine):
+                    shutil.rmtree(self.output_dir)
+                    options = pipeline.Options(workers=4, buffer_size=4096, memory_budget=8192)
+                    counts = pipeline.execute(engine, self.output_dir, inputs, options)
+                    self.assertEqual(counts["descargado"], 8)
+                    sprite = os.path.join(self.output_dir, "grass", "pokemon000000.png")
+                    with open(sprite, mode="rb") as f:
+                        self.assertEqual(f.read(), server.payload("/sprites/pokemon000000.png"))
+
+    def test_tar_output_packs_sprites_into_indexed_shards(self):
+        for engine in HTTP1_ENGINES:
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                counts = self._execute(engine, output_format="tar", shard_size=16 * 1024)
+                self.assertEqual(counts["descargado"], self.size)
+                shards = [n for n in os.listdir(self.output_dir) if n.endswith(".tar")]
+                self.assertGreater(len(shards), 1)
+                # No loose layout is created next to the shards
+                self.assertFalse(any(os.path.isdir(os.path.join(self.output_dir, t)) for t in bench.TYPES))
+                with archive.ArchiveReader(self.output_dir) as reader:
+                    self.assertEqual(len(reader.index), self.size)
+                    self.assertEqual(
+                        bytes(reader.get("grass", "pokemon000000.png")),
+                        self.server.payload("/sprites/pokemon000000.png"),
+                    )
+                self.assertEqual(os.listdir(os.path.join(self.output_dir, archive.ShardWriter.PARTIAL_DIR)), [])
+                counts = self._execute(engine, output_format="tar")
+                self.assertEqual(counts["omitido"], self.size)
+
+    def test_tar_output_rejects_the_store(self):
+        with self.assertRaises(ValueError):
+            self._execute("thread", output_format="tar", store_dir=self.output_dir + ".store")
+
+    @unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_sprites_are_post_processed_while_downloading(self):
+        thumbnail_dir = self.output_dir + ".thumbs"
+        counts = self._execute("thread", validate=True, recompress=True, thumbnail_sizes=(8,), thumbnail_dir=thumbnail_dir)
+        self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(actual_layout(os.path.join(thumbnail_dir, "8")), expected_layout(self.size))
+
+    @unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_rows_of_a_shared_download_are_post_processed(self):
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "shared.csv")]
+        with open(inputs[0], mode="w", newline="") as f:
+            csv.writer(f).writerows(rows + [[pokemon + "_bis", type1, url] for pokemon, type1, url in rows[1:]])
+        expected = expected_layout(self.size)
+        for names in expected.values():
+            names.update({name.replace(".png", "_bis.png") for name in names})
+        for engine in ("thread", "async"):
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                thumbnail_dir = self.output_dir + f".{engine}.thumbs"
+                options = pipeline.Options(workers=8, validate=True, recompress=True, thumbnail_sizes=(8,), thumbnail_dir=thumbnail_dir)
+                job = pipeline.Job(self.output_dir, inputs, options)
+                try:
+                    pipeline.load_engine(engine).run(job)
+                finally:
+                    job.close()
+                self.assertEqual(job.counts["descargado"] + job.counts["enlazado"], 2 * self.size)
+                self.assertEqual(job.processed["images_processed"], 2 * self.size)
+                self.assertEqual(actual_layout(os.path.join(thumbnail_dir, "8")), expected)
+
+    @unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_sprites_linked_from_the_store_are_post_processed(self):
+        store_dir = self.output_dir + ".store"
+        self._execute("thread", store_dir=store_dir)
+        shutil.rmtree(self.output_dir)
+        thumbnail_dir = self.output_dir + ".thumbs"
+        counts = self._execute(
+            "thread", store_dir=store_dir, validate=True, recompress=True, thumbnail_sizes=(8,), thumbnail_dir=thumbnail_dir
+        )
+        self.assertEqual(counts["enlazado"], self.size)
+        self.assertEqual(actual_layout(os.path.join(thumbnail_dir, "8")), expected_layout(self.size))
+        # Not recompressed: the sprite is still a link to its blob
+        sprite = os.path.join(self.output_dir, "grass", "pokemon000000.png")
+        self.assertEqual(os.stat(sprite).st_nlink, 2)
+
+    def test_metrics_record_download_phases(self):
+        metrics_path = self.output_dir + ".jsonl"
+        for engine in HTTP1_ENGINES:
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                self._execute(engine, metrics_path=metrics_path)
+                with open(metrics_path) as f:
+                    summary = json.loads(f.readlines()[-1])
+                self.assertEqual(summary["outcomes"], {"descargado": self.size})
+                for phase in ("ttfb", "transfer", "write", "total"):
+                    self.assertEqual(summary["phases"][phase]["count"], self.size)
+                # Only the requests that opened a connection measure it
+                self.assertGreater(summary["phases"]["connect"]["count"], 0)
+                if engine != "async":  # aiohttp does not resolve an IP address
+                    self.assertGreater(summary["phases"]["dns"]["count"], 0)
+
+    def test_async_engine_reports_event_loop_lag(self):
+        metrics_path = self.output_dir + ".jsonl"
+        self._execute("async", metrics_path=metrics_path, manifest_path=self.output_dir + ".manifest.json")
+        with open(metrics_path) as f:
+            summary = json.loads(f.readlines()[-1])
+        self.assertIn("event_loop_lag_max_seconds", summary["gauges"])
+        self.assertEqual(summary["bytes"], self.size * self.server.payload_size)
+        leftovers = [name for d in actual_layout(self.output_dir).values() for name in d if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+    def test_async_engine_bounds_the_work_in_flight(self):
+        workers, size = 3, 60
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0, "yielded": 0, "reported": 0, "ahead": 0}
+        tasks, report = pipeline.Job.tasks, pipeline.Job.report
+
+        def counted_tasks(job):
+            for task in tasks(job):
+                with lock:
+                    state["yielded"] += 1
+                    state["ahead"] = max(state["ahead"], state["yielded"] - state["reported"])
+                yield task
+
+        def counted_report(job, result):
+            with lock:
+                state["reported"] += 1
+            return report(job, result)
+
+        with MockSpriteServer(latency=0.01) as server:
+            respond = server.respond
+
+            def counted_respond(handler):
+                with lock:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                try:
+                    return respond(handler)
+                finally:
+                    with lock:
+                        state["active"] -= 1
+
+            server.respond = counted_respond
+            inputs = [os.path.join(self.workdir, "slow.csv")]
+            bench.make_dataset(inputs[0], size, server)
+            with mock.patch.object(pipeline.Job, "tasks", counted_tasks), \
+                    mock.patch.object(pipeline.Job, "report", counted_report):
+                counts = pipeline.execute("async", self.output_dir, inputs, pipeline.Options(workers=workers))
+        self.assertEqual(counts["descargado"], size)
+        self.assertLessEqual(state["peak"], workers)
+        # The producer waits on the queue: at most its 2 * workers slots, one
+        # task per worker and the one being put are ahead of the results
+        self.assertLessEqual(state["ahead"], 3 * workers + 1)
+
+    def test_async_engine_stops_the_producer_when_workers_fail(self):
+        outcome = []
+
+        def run():
+            try:
+                pipeline.execute("async", self.output_dir, self.inputs, pipeline.Options(workers=1))
+            except Exception as e:
+                outcome.append(e)
+
+        # Every worker dies on its first result, with the queue still full
+        with mock.patch.object(pipeline.Job, "report", side_effect=RuntimeError("boom")):
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([str(e) for e in outcome], ["boom"])
+
+    def test_async_engine_keeps_job_bookkeeping_off_the_loop(self):
+        threads = set()
+        started, report = pipeline.Job.started, pipeline.Job.report
+
+        def record(method):
+            def wrapper(job, *args):
+                threads.add(threading.current_thread().name)
+                return method(job, *args)
+            return wrapper
+
+        with mock.patch.object(pipeline.Job, "started", record(started)), \
+                mock.patch.object(pipeline.Job, "report", record(report)):
+            self._execute("async", journal_path=self.output_dir + ".journal")
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith("reporter") for name in threads), threads)
+
+    def test_truncated_bodies_are_retried_network_errors(self):
+        with MockSpriteServer(truncate=108) as server:
+            inputs = [os.path.join(self.workdir, "truncated.csv")]
+            bench.make_dataset(inputs[0], 4, server)
+            for engine in HTTP1_ENGINES:
+                with self.subTest(engine=engine):
+                    shutil.rmtree(self.output_dir)
+                    server.reset_stats()
+                    options = pipeline.Options(workers=2, max_attempts=2, backoff_base=0, breaker_threshold=100)
+                    counts = pipeline.execute(engine, self.output_dir, inputs, options)
+                    self.assertEqual(counts["error"], 4)
+                    # Every sprite was tried again after the connection dropped
+                    self.assertEqual(server.statuses, {200: 8})
+                    leftovers = [n for d in actual_layout(self.output_dir).values() for n in d]
+                    self.assertEqual(leftovers, [])
+
+    def test_rate_limit_keeps_engines_within_the_quota(self):
+        with MockSpriteServer(quota=100, quota_penalty=1) as server:
+            bench.make_dataset(os.path.join(self.workdir, "quota.csv"), self.size, server)
+            inputs = [os.path.join(self.workdir, "quota.csv")]
+            for engine in HTTP1_ENGINES:
+                with self.subTest(engine=engine):
+                    shutil.rmtree(self.output_dir)
+                    server.reset_stats()
+                    # Let the quota's burst refill from the previous engine
+                    time.sleep(1)
+                    options = pipeline.Options(workers=8, requests_per_second=80, burst_seconds=0.1)
+                    start = time.monotonic()
+                    counts = pipeline.execute(engine, self.output_dir, inputs, options)
+                    self.assertEqual(counts["descargado"], self.size)
+                    self.assertEqual(server.statuses, {200: self.size})
+                    self.assertGreaterEqual(time.monotonic() - start, (self.size - 8) / 80)
+
+    def test_repeated_urls_are_fetched_once(self):
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "repeated.csv")]
+        # Every sprite again under another name, and every row once more as is
+        renamed = [[pokemon + "_bis", type1, url] for pokemon, type1, url in rows[1:]]
+        with open(inputs[0], mode="w", newline="") as f:
+            csv.writer(f).writerows(rows + renamed + rows[1:])
+        expected = expected_layout(self.size)
+        for names in expected.values():
+            names.update({name.replace(".png", "_bis.png") for name in names})
+        for engine in HTTP1_ENGINES:
+            for output_format in pipeline.OUTPUT_FORMATS:
+                with self.subTest(engine=engine, output_format=output_format):
+                    shutil.rmtree(self.output_dir)
+                    self.server.reset_stats()
+                    options = pipeline.Options(workers=4, chunk_size=200, output_format=output_format)
+                    job = pipeline.Job(self.output_dir, inputs, options)
+                    try:
+                        pipeline.load_engine(engine).run(job)
+                    finally:
+                        job.close()
+                    self.assertEqual(self.server.statuses, {200: self.size})
+                    self.assertEqual(job.counts["descargado"], self.size)
+                    self.assertEqual(job.counts["enlazado"], 2 * self.size)
+                    self.assertEqual(job.coalesced, 2 * self.size)
+                    if output_format == "files":
+                        self.assertEqual(actual_layout(self.output_dir), expected)
+                    else:
+                        with archive.ArchiveReader(self.output_dir) as reader:
+                            self.assertEqual(len(reader.index), 2 * self.size)
+
+    def test_async_engine_links_shared_downloads_off_the_loop(self):
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "shared.csv")]
+        with open(inputs[0], mode="w", newline="") as f:
+            csv.writer(f).writerows(rows + [[pokemon + "_bis", type1, url] for pokemon, type1, url in rows[1:]])
+        threads = []
+        share = pipeline.share
+
+        def recorded(*args):
+            threads.append(threading.current_thread().name)
+            return share(*args)
+
+        with mock.patch("pipeline.share", recorded):
+            counts = pipeline.execute("async", self.output_dir, inputs, pipeline.Options(workers=8))
+        self.assertEqual(len(threads), counts["enlazado"])
+        self.assertTrue(all(name.startswith("writer") for name in threads), threads)
+
+    def test_concurrent_writes_to_one_path_do_not_collide(self):
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "doubled.csv")]
+        # Each row twice in a row, so both copies are in flight together
+        with open(inputs[0], mode="w", newline="") as f:
+            csv.writer(f).writerows(rows[:1] + [row for row in rows[1:] for _ in range(2)])
+        for engine in HTTP1_ENGINES:
+            for output_format in pipeline.OUTPUT_FORMATS:
+                with self.subTest(engine=engine, output_format=output_format):
+                    shutil.rmtree(self.output_dir)
+                    options = pipeline.Options(workers=8, coalesce=False, output_format=output_format)
+                    counts = pipeline.execute(engine, self.output_dir, inputs, options)
+                    self.assertEqual((counts["descargado"], counts["error"]), (2 * self.size, 0))
+
+    def test_schedule_orders_requests(self):
+        with open(self.inputs[0], newline="") as f:
+            rows = list(csv.reader(f))
+        inputs = [os.path.join(self.workdir, "priorities.csv")]
+        with open(inputs[0], mode="w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(rows[0] + ["Rank"])
+            writer.writerows(row + [i] for i, row in enumerate(rows[1:]))
+        for engine in ("thread", "async"):
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                self.server.reset_stats()
+                options = pipeline.Options(workers=1, schedule="priority", priority_column="Rank")
+                pipeline.execute(engine, self.output_dir, inputs, options)
+                expected = [f"/sprites/pokemon{i:06d}.png" for i in reversed(range(self.size))]
+                self.assertEqual(self.server.paths, expected)
+
+    def test_deadline_defers_what_is_left(self):
+        failed_path = self.output_dir + ".failed.csv"
+        journal_path = self.output_dir + ".sqlite"
+        for engine in HTTP1_ENGINES:
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                self.server.reset_stats()
+                counts = self._execute(engine, deadline=0, failed_path=failed_path, journal_path=journal_path)
+                self.assertEqual(counts["aplazado"], self.size)
+                self.assertEqual(self.server.paths, [])
+                with open(failed_path, newline="") as f:
+                    self.assertEqual(len(list(csv.reader(f))), self.size + 1)
+                j = journal.Journal(journal_path)
+                self.assertEqual(len(j.unfinished()), self.size)
+                j.close()
+
+    def test_profile_from_the_environment(self):
+        run_dir = self.output_dir + "-profile"
+        environ = {profiling.PROFILE_ENV: "cprofile,sample,threads", profiling.PROFILE_DIR_ENV: run_dir}
+        with mock.patch.dict(os.environ, environ):
+            counts = self._execute("thread")
+        self.assertEqual(counts["descargado"], self.size)
+        with open(os.path.join(run_dir, "cprofile.txt")) as f:
+            self.assertIn("download_image", f.read())
+        with open(os.path.join(run_dir, "threads.csv"), newline="") as f:
+            self.assertGreater(len(list(csv.reader(f))), 2)
+        shutil.rmtree(run_dir)
+
+    def test_connections_are_reused(self):
+        metrics_path = self.output_dir + ".jsonl"
+        for engine in ("sequential", "thread", "process", "async"):
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                self.server.reset_stats()
+                self._execute(engine, metrics_path=metrics_path)
+                with open(metrics_path) as f:
+                    gauges = json.loads(f.readlines()[-1])["gauges"]
+                self.assertEqual(gauges["http_requests"], self.size)
+                self.assertEqual(gauges["connections_opened"], self.server.connections)
+                self.assertGreater(gauges["connection_reuse_ratio"], 0.5)
+
+    def test_keep_alive_can_be_disabled(self):
+        metrics_path = self.output_dir + ".jsonl"
+        self._execute("thread", metrics_path=metrics_path, keep_alive=False)
+        with open(metrics_path) as f:
+            gauges = json.loads(f.readlines()[-1])["gauges"]
+        self.assertEqual(gauges["connections_opened"], self.size)
+        self.assertEqual(self.server.connections, self.size)
+
+    def test_adaptive_engines_report_their_limit(self):
+        metrics_path = self.output_dir + ".jsonl"
+        for engine in ("thread", "async"):
+            with self.subTest(engine=engine):
+                shutil.rmtree(self.output_dir)
+                counts = self._execute(engine, adaptive=True, metrics_path=metrics_path)
+                self.assertEqual(counts["descargado"], self.size)
+                with open(metrics_path) as f:
+                    summary = json.loads(f.readlines()[-1])
+                self.assertIn("concurrency_limit", summary["gauges"])
+
+
+@unittest.skipUnless(HAS_HTTP2, "httpx[http2] is not installed")
+class TestHttp2Engine(unittest.TestCase):
+    size = 40
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockH2SpriteServer(max_streams=8).start()
+        cls.workdir = tempfile.mkdtemp()
+        cls.inputs = [os.path.join(cls.workdir, "dataset.csv")]
+        bench.make_dataset(cls.inputs[0], cls.size, cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.workdir)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp(dir=self.workdir)
+        self.server.reset_stats()
+
+    def _execute(self, **options):
+        options = pipeline.Options(max_connections=2, streams_per_connection=8, **options)
+        return pipeline.execute("http2", self.output_dir, self.inputs, options)
+
+    def test_multiplexes_over_few_connections(self):
+        counts = self._execute()
+        self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(actual_layout(self.output_dir), expected_layout(self.size))
+        self.assertEqual(self.server.statuses, {200: self.size})
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_metrics_record_connect_phase(self):
+        metrics_path = self.output_dir + ".jsonl"
+        self._execute(metrics_path=metrics_path)
+        with open(metrics_path) as f:
+            summary = json.loads(f.readlines()[-1])
+        # One per connection; httpcore resolves DNS inside the connect phase
+        self.assertEqual(summary["phases"]["connect"]["count"], self.server.connections)
+        self.assertNotIn("dns", summary["phases"])
+
+    def test_manifest_turns_refresh_into_not_modified(self):
+        manifest_path = self.output_dir + ".manifest.json"
+        self._execute(manifest_path=manifest_path)
+        counts = self._execute(manifest_path=manifest_path)
+        self.assertEqual(counts["sin cambios"], self.size)
+
+    def test_store_links_already_resolved_urls(self):
+        store_dir = self.output_dir + ".store"
+        self._execute(store_dir=store_dir)
+        shutil.rmtree(self.output_dir)
+        counts = self._execute(store_dir=store_dir)
+        self.assertEqual(counts["enlazado"], self.size)
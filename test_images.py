@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import images
+from mockserver import _png_chunk, synthetic_png
+from utils import PNG_SIGNATURE
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+
+def _flat_png(width: int) -> bytes:
+    """A compressible PNG: one row of zeros stored without compression."""
+    ihdr = struct.pack(">IIBBBBB", width, 1, 8, 0, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", zlib.compress(bytes(width + 1), 0))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+class TestImages(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _write(self, content: bytes) -> str:
+        path = os.path.join(self.workdir, "sprite.png")
+        with open(path, mode="wb") as f:
+            f.write(content)
+        return path
+
+    def test_valid_png_round_trips(self):
+        content = synthetic_png(1024)
+        self.assertEqual(images.write_chunks(images.read_chunks(content)), content)
+
+    def test_corruption_is_detected(self):
+        content = bytearray(synthetic_png(1024))
+        content[40] ^= 0xFF
+        with self.assertRaisesRegex(images.InvalidPNG, "CRC"):
+            images.read_chunks(bytes(content))
+        with self.assertRaisesRegex(images.InvalidPNG, "truncado"):
+            images.read_chunks(synthetic_png(1024)[:500])
+
+    def test_recompress_is_lossless_and_smaller(self):
+        content = _flat_png(4096)
+        chunks = images.recompress(images.read_chunks(content))
+        idat = [chunk.data for chunk in chunks if chunk.kind == b"IDAT"]
+        self.assertEqual(len(idat), 1)
+        self.assertEqual(zlib.decompress(idat[0]), bytes(4097))
+        self.assertLess(len(images.write_chunks(chunks)), len(content))
+
+    def test_invalid_file_is_removed(self):
+        path = self._write(synthetic_png(1024)[:-6])
+        processed = images.process_file(path, "grass", "sprite", images.ProcessingOptions())
+        self.assertIn("PNG inválido", processed.error)
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipUnless(HAS_PILLOW, "Pillow is not installed")
+    def test_thumbnails_go_to_a_parallel_tree(self):
+        path = self._write(_flat_png(256))
+        thumbnail_dir = os.path.join(self.workdir, "thumbs")
+        options = images.ProcessingOptions(recompress=True, thumbnail_sizes=(16, 64), thumbnail_dir=thumbnail_dir)
+        processed = images.process_file(path, "grass", "sprite", options)
+        self.assertIsNone(processed.error)
+        self.assertGreater(processed.saved, 0)
+        self.assertEqual(processed.thumbnails, 2)
+        from PIL import Image
+
+        with Image.open(images.thumbnail_path(thumbnail_dir, 16, "grass", "sprite")) as thumbnail:
+            self.assertEqual(thumbnail.size, (16, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import catalogue
+import incremental
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "snapshot.json")
+        self.snapshot = incremental.Snapshot(self.path)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def _record(self, *entries):
+        for entry in entries:
+            self.snapshot.record(entry)
+
+    def test_rows_with_the_same_name_in_two_types_are_kept_apart(self):
+        fire = catalogue.Entry("castform", "fire", "http://x/c.png")
+        water = catalogue.Entry("castform", "water", "http://x/c.png")
+        self._record(fire, water)
+        delta = self.snapshot.diff([fire, water])
+        self.assertEqual((delta.unchanged, delta.deleted, delta.new, delta.moved), (2, [], [], []))
+        # Dropping one of them deletes only its file
+        delta = self.snapshot.diff([water])
+        self.assertEqual(delta.deleted, [("castform", "fire")])
+
+    def test_type_change_is_a_move_and_url_change_a_refetch(self):
+        self._record(
+            catalogue.Entry("a", "fire", "http://x/a.png"),
+            catalogue.Entry("b", "fire", "http://x/b.png"),
+            catalogue.Entry("c", "fire", "http://x/c.png"),
+        )
+        moved = catalogue.Entry("a", "water", "http://x/a.png")
+        changed = catalogue.Entry("b", "fire", "http://x/b2.png")
+        retyped = catalogue.Entry("c", "grass", "http://x/c2.png")
+        delta = self.snapshot.diff([moved, changed, retyped])
+        self.assertEqual(delta.moved, [(moved, "fire")])
+        self.assertEqual(delta.changed, [(changed, "fire")])
+        self.assertEqual(delta.new, [retyped])
+        self.assertEqual(delta.deleted, [("c", "fire")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import journal
+import utils
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "job.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_states_survive_reopening(self):
+        j = journal.Journal(self.path, batch_size=2)
+        j.mark("a.png", "http://x/a", journal.PLANNED)
+        j.mark("b.png", "http://x/b", journal.PLANNED)
+        j.mark("a.png", "http://x/a", journal.DONE)
+        j.mark("c.png", "http://x/c", journal.FAILED, "HTTP 404")
+        j.close()
+        j = journal.Journal(self.path)
+        self.assertEqual(j.done(), {"a.png": "http://x/a"})
+        self.assertEqual(j.unfinished(), ["b.png"])
+        j.close()
+
+    def test_remove_partial_files(self):
+        target = os.path.join(self.workdir, "a[1].png")
+        partial = utils.temp_path(target)
+        with open(partial, mode="wb") as f:
+            f.write(b"partial")
+        utils.write_binary(target, b"complete")
+        journal.remove_partial_files([target])
+        self.assertEqual(os.listdir(self.workdir), ["a[1].png"])
+
+    def test_write_binary_is_atomic(self):
+        target = os.path.join(self.workdir, "a.png")
+        utils.write_binary(target, b"old")
+        utils.write_binary(target, b"new", fsync=False)
+        with open(target, mode="rb") as f:
+            self.assertEqual(f.read(), b"new")
+        self.assertEqual(os.listdir(self.workdir), ["a.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import json
+import os
+import tempfile
+import unittest
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_quantiles_use_bucket_bounds(self):
+        h = metrics.Histogram(buckets=(0.01, 0.1, 1.0))
+        for value in [0.005] * 90 + [0.5] * 10:
+            h.observe(value)
+        self.assertEqual(h.quantile(0.5), 0.01)
+        self.assertEqual(h.quantile(0.95), 1.0)
+        self.assertIsNone(metrics.Histogram().quantile(0.5))
+
+    def test_summary_and_prometheus(self):
+        m = metrics.Metrics()
+        timing = metrics.Timing()
+        timing.ttfb, timing.write = 0.02, 0.003
+        m.observe("descargado", 100, timing)
+        m.observe("error")
+        summary = m.summary()
+        self.assertEqual(summary["outcomes"], {"descargado": 1, "error": 1})
+        self.assertEqual(summary["bytes"], 100)
+        self.assertEqual(set(summary["phases"]), {"ttfb", "write"})
+        text = m.to_prometheus()
+        self.assertIn('sprites_items_total{outcome="descargado"} 1', text)
+        self.assertIn('sprites_phase_seconds_bucket{phase="ttfb",le="0.025"} 1', text)
+        self.assertIn('sprites_phase_seconds_count{phase="write"} 1', text)
+
+    def test_reporter_writes_final_summary(self):
+        m = metrics.Metrics()
+        m.observe("descargado", 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl, prom = os.path.join(tmp, "m.jsonl"), os.path.join(tmp, "m.prom")
+            metrics.Reporter(m, jsonl, prom, interval=60).start().stop()
+            with open(jsonl) as f:
+                self.assertEqual(json.loads(f.readline())["items"], 1)
+            self.assertTrue(os.path.exists(prom))
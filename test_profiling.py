@@ -0,0 +1,69 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import profiling
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.run_dir = os.path.join(self.workdir, "profile")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_parse_kinds(self):
+        self.assertEqual(profiling.parse_kinds("sample, cprofile"), ("cprofile", "sample"))
+        self.assertEqual(profiling.parse_kinds(["all"]), profiling.KINDS)
+        self.assertEqual(profiling.parse_kinds(""), ())
+        with self.assertRaises(ValueError):
+            profiling.parse_kinds("perf")
+
+    def test_profiler_writes_every_artifact(self):
+        def spin():
+            total = 0
+            for i in range(300_000):
+                total += i
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with profiling.Profiler(self.run_dir, ["all"], interval=0.001):
+                worker = threading.Thread(target=spin, name="spinner")
+                worker.start()
+                worker.join()
+        with open(os.path.join(self.run_dir, "summary.json")) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["kinds"], list(profiling.KINDS))
+        for artifact in summary["artifacts"]:
+            self.assertTrue(os.path.getsize(os.path.join(self.run_dir, artifact)), artifact)
+        with open(os.path.join(self.run_dir, "cprofile.txt")) as f:
+            self.assertIn("spin", f.read())
+        with open(os.path.join(self.run_dir, "stacks.collapsed")) as f:
+            stacks = f.read().splitlines()
+        self.assertTrue(any(line.startswith("spinner;") and "spin (test_profiling.py" in line for line in stacks))
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in stacks))
+        with open(os.path.join(self.run_dir, "threads.csv"), newline="") as f:
+            threads = {row["thread"]: row for row in csv.DictReader(f)}
+        self.assertIn("MainThread", threads)
+        self.assertNotIn("profiler-sampler", threads)
+
+    def test_from_env(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsInstance(profiling.from_env(), contextlib.nullcontext)
+        environ = {profiling.PROFILE_ENV: "sample", profiling.PROFILE_DIR_ENV: self.run_dir}
+        with mock.patch.dict(os.environ, environ):
+            profiler = profiling.from_env()
+            self.assertEqual((profiler.kinds, profiler.run_dir), (("sample",), self.run_dir))
+            # Explicit arguments win over the environment
+            self.assertEqual(profiling.from_env(["memory"]).kinds, ("memory",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import ratelimit
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_is_free_then_rate_applies(self):
+        bucket = ratelimit.TokenBucket(rate=10, burst=3)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+    def test_try_take_does_not_go_into_debt(self):
+        bucket = ratelimit.TokenBucket(rate=1, burst=1)
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+
+    def test_configure_changes_the_rate_live(self):
+        bucket = ratelimit.TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        bucket.configure(rate=100, burst=1)
+        self.assertAlmostEqual(bucket.reserve(), 0.01, delta=0.005)
+        with self.assertRaises(ValueError):
+            bucket.configure(rate=0)
+
+    def test_configure_keeps_what_was_earned_at_the_old_rate(self):
+        with mock.patch("time.monotonic", return_value=0.0) as monotonic:
+            bucket = ratelimit.TokenBucket(rate=1, burst=10)
+            bucket.reserve(10)
+            monotonic.return_value = 5.0
+            bucket.configure(rate=100, burst=10)
+            # 5 tokens earned at 1/s, not 10 at 100/s
+            self.assertAlmostEqual(bucket.reserve(10), 0.05)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_nothing_limited_builds_no_limiter(self):
+        self.assertIsNone(ratelimit.open_limiter(ratelimit.Limits()))
+
+    def test_hosts_have_separate_budgets(self):
+        limiter = ratelimit.RateLimiter(ratelimit.Limits(host_requests_per_second=5, burst_seconds=0.2))
+        self.assertEqual(limiter._delay("requests", "http://a/1.png", 1), 0.0)
+        self.assertEqual(limiter._delay("requests", "http://b/1.png", 1), 0.0)
+        self.assertGreater(limiter._delay("requests", "http://a/2.png", 1), 0.0)
+
+    def test_global_limit_paces_threads_and_tasks(self):
+        limiter = ratelimit.RateLimiter(ratelimit.Limits(requests_per_second=50, burst_seconds=0.02))
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire("http://a/x.png")
+
+        async def acquire_all():
+            for _ in range(5):
+                await limiter.acquire_async("http://b/x.png")
+
+        asyncio.run(acquire_all())
+        self.assertGreaterEqual(time.monotonic() - start, 9 / 50 - 0.01)
+        self.assertGreater(limiter.waited, 0)
+
+    def test_bytes_are_limited(self):
+        limiter = ratelimit.RateLimiter(ratelimit.Limits(bytes_per_second=1000))
+        limiter.consume("http://a/x.png", 1000)
+        self.assertAlmostEqual(limiter._delay("bytes", "http://a/x.png", 500), 0.5, delta=0.05)
+
+    def test_reconfigure_and_share(self):
+        limits = ratelimit.Limits(requests_per_second=100, host_bytes_per_second=1000)
+        limiter = ratelimit.RateLimiter(limits)
+        limiter.consume("http://a/x.png", 10)
+        limiter.configure(limits._replace(host_bytes_per_second=None, bytes_per_second=10))
+        self.assertEqual(limiter._hosts, {})
+        self.assertIsNotNone(limiter._bytes)
+        self.assertEqual(limits.share(4), limits._replace(requests_per_second=25, host_bytes_per_second=250))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import csv
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import bench
+import pipeline
+import retry
+import utils
+from mockserver import MockSpriteServer
+
+HAS_HTTP2 = all(importlib.util.find_spec(name) for name in ("httpx", "h2"))
+
+TASK = pipeline.Task("bulbasaur", "grass", "http://host:1/bulbasaur.png", "out/grass/bulbasaur.png", False, {})
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(retry.parse_retry_after("3"), 3.0)
+        self.assertIsNone(retry.parse_retry_after(None))
+        self.assertIsNone(retry.parse_retry_after("soon"))
+        self.assertEqual(retry.parse_retry_after("Mon, 01 Jan 2001 00:00:00 GMT"), 0.0)
+
+    def test_delay_is_jittered_and_capped(self):
+        policy = retry.RetryPolicy(base_delay=1.0, max_delay=5.0, seed=0)
+        for attempt in range(10):
+            self.assertTrue(0 <= policy.delay(attempt) <= min(5.0, 2 ** attempt))
+        self.assertEqual(policy.delay(0, retry_after=60), 5.0)
+
+    def test_with_retries_stops_on_success(self):
+        outcomes = [
+            pipeline.Result(TASK, "error", retryable=True),
+            pipeline.Result(TASK, "error", retryable=True, retry_after=0),
+            pipeline.Result(TASK, "descargado"),
+        ]
+        result = pipeline.with_retries(lambda: outcomes.pop(0), TASK, retry.RetryPolicy(5, 0.0), None)
+        self.assertEqual((result.status, result.attempts), ("descargado", 3))
+
+    def test_with_retries_does_not_retry_permanent_errors(self):
+        calls = []
+        fetch = lambda: calls.append(1) or pipeline.Result(TASK, "error", error="HTTP 404")
+        result = pipeline.with_retries(fetch, TASK, retry.RetryPolicy(5, 0.0), None)
+        self.assertEqual((len(calls), result.attempts), (1, 1))
+
+    def test_with_retries_does_not_retry_past_the_deadline(self):
+        calls = []
+        fetch = lambda: calls.append(1) or pipeline.Result(TASK, "error", retryable=True, retry_after=5)
+        policy = retry.RetryPolicy(5, 0.0, max_delay=5)
+        result = pipeline.with_retries(fetch, TASK, policy, None, deadline=time.time() + 1)
+        self.assertEqual((len(calls), result.status, result.attempts), (1, "aplazado", 1))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_then_half_opens(self):
+        breaker = retry.CircuitBreaker(threshold=2, reset_timeout=0.05)
+        for _ in range(2):
+            self.assertTrue(breaker.allow("h"))
+            breaker.record("h", ok=False)
+        self.assertFalse(breaker.allow("h"))
+        self.assertTrue(breaker.allow("other"))
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow("h"))
+        self.assertFalse(breaker.allow("h"))
+        breaker.record("h", ok=True)
+        self.assertTrue(breaker.allow("h"))
+        self.assertFalse(breaker.is_open("h"))
+
+    def test_open_circuit_fails_fast(self):
+        breaker = retry.CircuitBreaker(threshold=1, reset_timeout=60)
+        breaker.record("host:1", ok=False)
+        result = pipeline.with_retries(lambda: 1 / 0, TASK, retry.RetryPolicy(), breaker)
+        self.assertIn("Circuito abierto", result.error)
+
+
+class TestEnginesRetry(unittest.TestCase):
+    size = 20
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.inputs = [os.path.join(self.workdir, "dataset.csv")]
+        self.output_dir = os.path.join(self.workdir, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_transient_errors_are_retried(self):
+        for engine in pipeline.ENGINES:
+            if engine in bench.HTTP2_ENGINES and not HAS_HTTP2:
+                continue
+            with self.subTest(engine=engine), bench.server_class(engine)(error_rate=0.3) as server:
+                bench.make_dataset(self.inputs[0], self.size, server)
+                shutil.rmtree(self.output_dir, ignore_errors=True)
+                options = pipeline.Options(
+                    workers=4, max_attempts=10, backoff_base=0.001, breaker_threshold=1000
+                )
+                counts = pipeline.execute(engine, self.output_dir, self.inputs, options)
+                self.assertEqual(counts["descargado"], self.size)
+
+    def test_failed_rows_can_be_rerun(self):
+        failed_path = os.path.join(self.workdir, "failed.csv")
+        with MockSpriteServer(error_rate=1.0) as server:
+            bench.make_dataset(self.inputs[0], self.size, server)
+            options = pipeline.Options(workers=4, max_attempts=2, backoff_base=0.001, failed_path=failed_path)
+            counts = pipeline.execute("thread", self.output_dir, self.inputs, options)
+            self.assertEqual(counts["error"], self.size)
+            with open(failed_path) as f:
+                self.assertEqual(len(list(csv.DictReader(f))), self.size)
+            server.error_rate = 0.0
+            options = pipeline.Options(workers=4, failed_path=failed_path)
+            counts = pipeline.execute("thread", self.output_dir, [failed_path], options)
+            self.assertEqual(counts["descargado"], self.size)
+        self.assertEqual(list(utils.read_pokemons([failed_path])), [])
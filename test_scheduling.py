@@ -0,0 +1,74 @@
+import os
+import tempfile
+import types
+import unittest
+
+import pipeline
+import scheduling
+
+
+def _task(pokemon, type1):
+    return pipeline.Task(pokemon, type1, f"http://x/{pokemon}.png", f"out/{type1}/{pokemon}.png", False, {})
+
+
+class FakeManifest:
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def get(self, url):
+        size = self.sizes.get(url)
+        return None if size is None else {"size": size}
+
+
+class TestScheduling(unittest.TestCase):
+    def setUp(self):
+        self.tasks = [_task("a", "fire"), _task("b", "water"), _task("c", "fire"), _task("d", "grass")]
+        self.job = types.SimpleNamespace(manifest=None, priorities=None)
+
+    def names(self, policy):
+        return [task.pokemon for task in scheduling.order(iter(self.tasks), policy, self.job)]
+
+    def test_csv_order_stays_lazy(self):
+        tasks = iter(self.tasks)
+        self.assertIs(scheduling.order(tasks, "csv", self.job), tasks)
+
+    def test_small_first_uses_cached_sizes(self):
+        self.job.manifest = FakeManifest({"http://x/a.png": 300, "http://x/c.png": 100, "http://x/d.png": 200})
+        self.assertEqual(self.names("small-first"), ["c", "d", "a", "b"])
+
+    def test_by_type_groups_in_order_of_appearance(self):
+        self.assertEqual(self.names("by-type"), ["a", "c", "b", "d"])
+
+    def test_priority_highest_first(self):
+        self.job.priorities = {("water", "b"): 5, ("grass", "d"): 1, ("fire", "c"): -1}
+        self.assertEqual(self.names("priority"), ["b", "d", "a", "c"])
+
+    def test_priority_is_per_type(self):
+        self.tasks.append(_task("a", "water"))
+        self.job.priorities = {("water", "a"): 1}
+        first = next(iter(scheduling.order(iter(self.tasks), "priority", self.job)))
+        self.assertEqual((first.type1, first.pokemon), ("water", "a"))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            scheduling.order(self.tasks, "random", self.job)
+
+    def test_read_priorities(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.csv")
+            with open(path, "w") as f:
+                f.write("Pokemon,Type1,Sprite,Rank\nBulbasaur,Grass,u1,3\nIvysaur,Grass,u2,\n")
+            self.assertEqual(scheduling.read_priorities([path], "Rank"), {("grass", "bulbasaur"): 3.0})
+            with self.assertRaises(ValueError):
+                scheduling.read_priorities([path], "Missing")
+
+    def test_read_priorities_skips_a_byte_order_mark(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.csv")
+            with open(path, "w", encoding="utf-8-sig") as f:
+                f.write("Pokemon,Type1,Sprite,Rank\nBulbasaur,Grass,u1,3\n")
+            self.assertEqual(scheduling.read_priorities([path], "Rank"), {("grass", "bulbasaur"): 3.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
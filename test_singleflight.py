@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import singleflight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_threads_share_one_call(self):
+        flights = singleflight.SingleFlight(keep=lambda value: value)
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "sprite"
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(flights.do, "url", fetch) for _ in range(8)]
+            release.set()
+            outcomes = [future.result() for future in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in outcomes), [False] + [True] * 7)
+        self.assertEqual({value for value, _ in outcomes}, {"sprite"})
+        # Later callers get the kept outcome
+        self.assertEqual(flights.do("url", fetch), ("sprite", True))
+        self.assertEqual(len(calls), 1)
+
+    def test_finished_outcomes_are_dropped_unless_kept(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "sprite"
+
+        flights = singleflight.SingleFlight()
+        self.assertEqual(flights.do("url", fetch), ("sprite", False))
+        self.assertEqual(flights.do("url", fetch), ("sprite", False))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flights._flights, {})
+        # `keep` decides what later callers get; None keeps nothing
+        flights = singleflight.SingleFlight(keep=lambda value: None if value == "error" else value.upper())
+        self.assertEqual(flights.do("url", fetch), ("sprite", False))
+        self.assertEqual(flights.do("url", fetch), ("SPRITE", True))
+        self.assertEqual(flights.do("other", lambda: "error"), ("error", False))
+        self.assertEqual(flights._kept, {"url": "SPRITE"})
+        self.assertEqual(flights._flights, {})
+
+    def test_async_tasks_share_one_call(self):
+        flights = singleflight.SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "sprite"
+
+        async def main():
+            return await asyncio.gather(*(flights.do_async("url", fetch) for _ in range(5)))
+
+        outcomes = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([shared for _, shared in outcomes], [False, True, True, True, True])
+        self.assertEqual(flights._flights, {})
+
+    def test_waiters_try_again_when_the_leader_raises(self):
+        flights = singleflight.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flights.do, "url", failing)
+            started.wait(5)
+            follower = executor.submit(flights.do, "url", lambda: "sprite")
+            release.set()
+            with self.assertRaises(RuntimeError):
+                leader.result()
+            self.assertEqual(follower.result(), ("sprite", False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,10 +5,9 @@ import unittest
 import pandas as pd
 
 import utils
-from asyncio_ import main as asyncio_main
-from sequential import main as sync_main
-from threading_ import main as threading_main
-from multiprocessing_ import main as multiprocessing_main
+
+# The engines are imported by the tests that use them, so running one test
+# does not load the dependencies of all the others
 
 
 def _find_all_datasets():
@@ -51,21 +50,36 @@ class TestSolution(unittest.TestCase):
         utils.maybe_remove_dir(self.output_dir)
 
     def test_synchronous(self):
+        from sequential import main as sync_main
+
         sync_main(self.output_dir, self.inputs)
         _test_correctness(self.output_dir)
         utils.maybe_remove_dir(self.output_dir)
 
     def test_asyncio(self):
+        from asyncio_ import main as asyncio_main
+
         asyncio_main(self.output_dir, self.inputs)
         _test_correctness(self.output_dir)
         utils.maybe_remove_dir(self.output_dir)
 
     def test_multiprocessing(self):
+        from multiprocessing_ import main as multiprocessing_main
+
         multiprocessing_main(self.output_dir, self.inputs)
         _test_correctness(self.output_dir)
         utils.maybe_remove_dir(self.output_dir)
 
     def test_threading(self):
+        from threading_ import main as threading_main
+
         threading_main(self.output_dir, self.inputs)
         _test_correctness(self.output_dir)
+        utils.maybe_remove_dir(self.output_dir)
+
+    def test_distributed(self):
+        from distributed import main as distributed_main
+
+        distributed_main(self.output_dir, self.inputs, nodes=3)
+        _test_correctness(self.output_dir)
         utils.maybe_remove_dir(self.output_dir)
\ No newline at end of file
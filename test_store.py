@@ -0,0 +1,68 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import store
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.store = store.BlobStore(os.path.join(self.workdir, "store"), fsync=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _streamed(self, content: bytes):
+        """A temporary file as a download leaves it, and its hash."""
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.workdir)
+        with os.fdopen(fd, mode="wb") as f:
+            f.write(content)
+        return tmp_path, hashlib.sha256(content).hexdigest()
+
+    def test_identical_bodies_are_stored_once(self):
+        first, second = os.path.join(self.workdir, "a.png"), os.path.join(self.workdir, "b.png")
+        tmp_path, digest = self._streamed(b"sprite")
+        self.store.save_file("http://x/a.png", tmp_path, digest, first)
+        tmp_path, digest = self._streamed(b"sprite")
+        self.store.save_file("http://x/b.png", tmp_path, digest, second)
+        self.assertEqual(os.listdir(os.path.dirname(self.store.blob_path(digest))), [digest])
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(os.stat(first).st_nlink, 3)
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.workdir)))
+
+    def test_resolved_urls_are_linked_without_a_fetch(self):
+        tmp_path, digest = self._streamed(b"sprite")
+        self.store.save_file("http://x/a.png", tmp_path, digest, os.path.join(self.workdir, "a.png"))
+        self.store.save_index()
+        reopened = store.BlobStore(self.store.root)
+        dest = os.path.join(self.workdir, "again.png")
+        self.assertTrue(reopened.link_known("http://x/a.png", dest))
+        with open(dest, mode="rb") as f:
+            self.assertEqual(f.read(), b"sprite")
+        self.assertFalse(reopened.link_known("http://x/unknown.png", dest))
+        reopened.forget("http://x/a.png")
+        self.assertIsNone(reopened.lookup("http://x/a.png"))
+
+    def test_urls_whose_blob_is_gone_are_fetched_again(self):
+        tmp_path, digest = self._streamed(b"sprite")
+        self.store.save_file("http://x/a.png", tmp_path, digest, os.path.join(self.workdir, "a.png"))
+        os.remove(self.store.blob_path(digest))
+        self.assertIsNone(self.store.lookup("http://x/a.png"))
+
+    def test_link_file_replaces_the_destination(self):
+        src, dest = os.path.join(self.workdir, "src.png"), os.path.join(self.workdir, "dest.png")
+        for path, content in ((src, b"new"), (dest, b"old")):
+            with open(path, mode="wb") as f:
+                f.write(content)
+        store.link_file(src, dest)
+        self.assertTrue(os.path.samefile(src, dest))
+
+    def test_deduplication_can_be_disabled(self):
+        self.assertIsNone(store.open_store(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,15 @@
+import unittest
+
+import utils
+
+
+class TestUtils(unittest.TestCase):
+    def test_is_png_checks_the_signature(self):
+        self.assertTrue(utils.is_png(utils.PNG_SIGNATURE + b"IHDR"))
+        self.assertFalse(utils.is_png(b"<html>Not found</html>"))
+        self.assertFalse(utils.is_png(utils.PNG_SIGNATURE[:4]))
+        self.assertFalse(utils.is_png(b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 import csv
 import functools
+import itertools
 import os
 import shutil
+import threading
 import time
 import typing as t
 
@@ -32,7 +34,7 @@ def timeit(f: t.Callable):
 
 def read_csv_rows_as_dict(filepath: str):
     """Iterate over the rows of a single csv."""
-    with open(filepath, mode="r") as f:
+    with open(filepath, mode="r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f)
         for row in reader:
             yield row
@@ -51,20 +53,33 @@ def read_pokemons(inputs: t.List[str]):
         row["Pokemon"] = row["Pokemon"].lower()
         yield row
 
-def write_binary(filepath: str, content: bytes):
-    """Write binary contents to a file."""
-    with open(filepath, mode="wb") as f:
-        f.write(content)
+# Distinguishes the temporaries of a thread, e.g. of asyncio tasks on one loop
+_temp_ids = itertools.count()
+
 
+def temp_path(filepath: str) -> str:
+    """Return a temporary path next to filepath, unique per call."""
+    return f"{filepath}.{os.getpid()}.{threading.get_ident()}.{next(_temp_ids)}.tmp"
 
-def maybe_download_sprite(session, sprite_url: str):
-    """Return the content of a sprite if the get request is successfull.
 
-    Note that this function is noy asynchronous, so it may be inneficient to called it
-    withing an async function.
+def write_binary(filepath: str, content: bytes, fsync: bool = True):
+    """Write binary contents to a file atomically.
+
+    The contents go to a temporary file that is renamed over filepath, so a
+    crash never leaves a truncated file at the final path.
     """
-    content = None
-    with session.get(sprite_url) as response:
-        if response.status_code == 200:
-            content = response.content
-    return content
\ No newline at end of file
+    tmp_path = temp_path(filepath)
+    with open(tmp_path, mode="wb") as f:
+        f.write(content)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def is_png(content: bytes) -> bool:
+    """Check that some bytes start with the PNG signature."""
+    return content[:len(PNG_SIGNATURE)] == PNG_SIGNATURE